@@ -11,6 +11,10 @@ def create_app():
     def make_session_permanent():
         session.permanent = True
 
+    # Instrumentación (antes de las rutas, para que sus hooks midan todo)
+    from .metricas import instalar
+    instalar(app)
+
     # Importar y registrar rutas
     from .routes import init_routes
     init_routes(app)
@@ -0,0 +1,150 @@
+import atexit
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+
+
+class BitacoraAccesos:
+    """Bitácora de solo agregado de los resultados de validación, con resúmenes por hora y por día.
+
+    `registrar` sólo agrega el evento a un búfer en memoria y vuelve: un hilo
+    en segundo plano lo vacía en lotes (cada `vaciar_cada` segundos, o antes
+    si se juntan `lote` eventos) con una sola transacción que inserta los
+    eventos y suma sus conteos en las tablas `por_hora` y `por_dia`. Las
+    consultas leen sólo esos resúmenes, nunca la bitácora cruda, y llevan a lo
+    sumo `vaciar_cada` segundos de retraso. Los conteos se suman con UPSERT,
+    así que varios workers pueden escribir en la misma base.
+
+    Si el disco no da abasto y el búfer llega a `max_bufer`, los eventos
+    nuevos se descartan y se cuentan en `descartados`, antes que frenar la
+    validación en la puerta.
+    """
+
+    def __init__(self, path, vaciar_cada=1.0, lote=500, max_bufer=100_000):
+        self.path = path
+        self.vaciar_cada = vaciar_cada
+        self.lote = lote
+        self.max_bufer = max_bufer
+        self.descartados = 0
+        self._bufer = []
+        self._lock = threading.Lock()
+        self._escritura = threading.Lock()
+        self._hay_lote = threading.Event()
+        self._hilo = None
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS eventos (momento TEXT NOT NULL, id TEXT, resultado TEXT NOT NULL,"
+                     " motivo TEXT, usuario TEXT, puerta TEXT)")
+        for tabla, clave in (("por_hora", "hora"), ("por_dia", "dia")):
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {tabla} ({clave} TEXT NOT NULL, puerta TEXT NOT NULL,"
+                         f" resultado TEXT NOT NULL, motivo TEXT NOT NULL, conteo INTEGER NOT NULL,"
+                         f" PRIMARY KEY ({clave}, puerta, resultado, motivo))")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    # ----- Escritura -----
+
+    def registrar(self, id_, resultado, motivo=None, usuario=None, puerta=None, momento=None):
+        """Encola un evento; nunca toca el disco en el hilo de la petición."""
+        momento = (momento or datetime.now()).isoformat(timespec="seconds")
+        evento = (momento, None if id_ is None else str(id_), resultado, motivo, usuario, puerta or usuario or "")
+        with self._lock:
+            if len(self._bufer) >= self.max_bufer:
+                self.descartados += 1
+                return
+            self._bufer.append(evento)
+            lleno = len(self._bufer) >= self.lote
+        self._iniciar()
+        if lleno:
+            self._hay_lote.set()
+
+    def _iniciar(self):
+        if self._hilo is None:
+            with self._lock:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._bucle, name="bitacora-accesos", daemon=True)
+                    self._hilo.start()
+                    atexit.register(self.vaciar)
+
+    def _bucle(self):
+        while True:
+            self._hay_lote.wait(self.vaciar_cada)
+            self._hay_lote.clear()
+            try:
+                self.vaciar()
+            except sqlite3.Error:
+                # vaciar devolvió el lote al búfer: se reintenta en la próxima vuelta
+                pass
+
+    def vaciar(self):
+        """Escribe lo que haya en el búfer en una sola transacción. Devuelve cuántos eventos escribió."""
+        with self._escritura:
+            with self._lock:
+                eventos, self._bufer = self._bufer, []
+            if not eventos:
+                return 0
+            por_hora, por_dia = Counter(), Counter()
+            for momento, _, resultado, motivo, _, puerta in eventos:
+                por_hora[(momento[:13], puerta, resultado, motivo or "")] += 1
+                por_dia[(momento[:10], puerta, resultado, motivo or "")] += 1
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT INTO eventos VALUES (?, ?, ?, ?, ?, ?)", eventos)
+                for tabla, clave, conteos in (("por_hora", "hora", por_hora), ("por_dia", "dia", por_dia)):
+                    conn.executemany(f"INSERT INTO {tabla} VALUES (?, ?, ?, ?, ?) ON CONFLICT"
+                                     f" ({clave}, puerta, resultado, motivo) DO UPDATE SET conteo = conteo + excluded.conteo",
+                                     [clave_ + (n,) for clave_, n in conteos.items()])
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                with self._lock:
+                    self._bufer[:0] = eventos
+                raise
+            return len(eventos)
+
+    # ----- Consulta -----
+
+    def resumen(self, desde, hasta, por="hora", puerta=None, top_motivos=5):
+        """Ingresos por hora (o por día), tasa de denegación y principales motivos entre dos fechas.
+
+        `desde` y `hasta` son fechas (inclusive); se leen sólo las tablas de resumen.
+        """
+        tabla, clave = ("por_dia", "dia") if por == "dia" else ("por_hora", "hora")
+        condicion, parametros = f"{clave} >= ? AND {clave} < ?", [desde.isoformat(), hasta.isoformat() + "~"]
+        if puerta:
+            condicion += " AND puerta = ?"
+            parametros.append(puerta)
+        conn = self._connect()
+        filas = conn.execute(f"SELECT {clave}, SUM(CASE WHEN resultado = 'permitido' THEN conteo ELSE 0 END),"
+                             f" SUM(conteo) FROM {tabla} WHERE {condicion} GROUP BY {clave} ORDER BY {clave}",
+                             parametros).fetchall()
+        motivos = conn.execute(f"SELECT motivo, SUM(conteo) AS n FROM {tabla} WHERE {condicion}"
+                               f" AND resultado = 'denegado' GROUP BY motivo ORDER BY n DESC, motivo LIMIT ?",
+                               parametros + [top_motivos]).fetchall()
+        puertas = [p for (p,) in conn.execute(f"SELECT DISTINCT puerta FROM {tabla} WHERE {condicion} ORDER BY puerta",
+                                              parametros)]
+
+        def cifras(permitidos, total):
+            denegados = total - permitidos
+            return {"total": total, "permitidos": permitidos, "denegados": denegados,
+                    "tasa_denegacion": round(denegados / total, 4) if total else None}
+
+        periodos = [{clave: periodo + (":00" if clave == "hora" else ""), **cifras(permitidos, total)}
+                    for periodo, permitidos, total in filas]
+        return {
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "por": clave,
+            "puertas": puertas,
+            **cifras(sum(f[1] for f in filas), sum(f[2] for f in filas)),
+            "periodos": periodos,
+            "motivos": [{"motivo": m, "conteo": n} for m, n in motivos],
+        }
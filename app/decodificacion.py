@@ -0,0 +1,170 @@
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+try:
+    from pyzbar import pyzbar
+except (ImportError, OSError):  # falta el paquete o la librería zbar del sistema: se usa sólo OpenCV
+    pyzbar = None
+
+EXTENSIONES_IMAGEN = {"png", "jpg", "jpeg", "bmp", "webp"}
+EXTENSIONES_VIDEO = {"mp4", "webm", "avi", "mov", "gif"}
+LADO_MAXIMO = 1024  # Las imágenes más grandes se reducen antes de buscar el QR
+
+_detector = None
+
+
+def escala_de_grises(imagen):
+    """BGR (o BGRA) a gris con los pesos de BT.601, en aritmética entera de NumPy."""
+    if imagen.ndim == 2:
+        return imagen
+    bgr = imagen[..., :3].astype(np.uint16)
+    return ((bgr[..., 0] * 29 + bgr[..., 1] * 150 + bgr[..., 2] * 77) >> 8).astype(np.uint8)
+
+
+def reducir(gris, lado_maximo=LADO_MAXIMO):
+    """Reduce por un factor entero promediando bloques, hasta que el lado mayor quepa en `lado_maximo`."""
+    factor = math.ceil(max(gris.shape) / lado_maximo)
+    if factor <= 1:
+        return gris
+    alto, ancho = gris.shape[0] // factor, gris.shape[1] // factor
+    bloques = gris[:alto * factor, :ancho * factor].reshape(alto, factor, ancho, factor)
+    return bloques.mean(axis=(1, 3)).astype(np.uint8)
+
+
+def umbral_adaptativo(gris, bloque=31, c=7):
+    """Binariza contra la media local de cada píxel (ventana `bloque` x `bloque`), con una imagen integral.
+
+    Aguanta sombras y reflejos desparejos sobre el QR mejor que un umbral global.
+    """
+    radio = bloque // 2
+    alto, ancho = gris.shape
+    integral = np.zeros((alto + 1, ancho + 1), dtype=np.int64)
+    integral[1:, 1:] = gris.astype(np.int64).cumsum(axis=0).cumsum(axis=1)
+    filas, columnas = np.arange(alto), np.arange(ancho)
+    y0, y1 = np.clip(filas - radio, 0, alto), np.clip(filas + radio + 1, 0, alto)
+    x0, x1 = np.clip(columnas - radio, 0, ancho), np.clip(columnas + radio + 1, 0, ancho)
+    suma = (integral[np.ix_(y1, x1)] - integral[np.ix_(y0, x1)]
+            - integral[np.ix_(y1, x0)] + integral[np.ix_(y0, x0)])
+    area = (y1 - y0)[:, None] * (x1 - x0)[None, :]
+    return np.where(gris.astype(np.int64) * area > suma - c * area, 255, 0).astype(np.uint8)
+
+
+def _leer_qr(gris):
+    """Texto del primer QR que encuentre en la imagen, o None."""
+    global _detector
+    if pyzbar is not None:
+        for simbolo in pyzbar.decode(gris, symbols=[pyzbar.ZBarSymbol.QRCODE]):
+            return simbolo.data.decode("utf-8", errors="replace")
+        return None
+    if _detector is None:
+        _detector = cv2.QRCodeDetector()
+    texto, _, _ = _detector.detectAndDecode(gris)
+    return texto or None
+
+
+def decodificar_cuadro(imagen):
+    """Busca un QR en un cuadro (BGR o gris). Se ejecuta dentro del pool de procesos.
+
+    Se prueba primero la imagen reducida, luego binarizada y por último la
+    imagen completa, y se devuelve el primer texto que se lea (o None).
+    """
+    try:
+        gris = escala_de_grises(imagen)
+        reducida = reducir(gris)
+        for candidata in (reducida, umbral_adaptativo(reducida), gris if reducida is not gris else None):
+            if candidata is not None:
+                texto = _leer_qr(candidata)
+                if texto:
+                    return texto
+    except cv2.error:
+        pass
+    return None
+
+
+def extension(nombre):
+    return nombre.rsplit(".", 1)[1].lower() if "." in nombre else ""
+
+
+def cuadros(contenido, nombre, max_cuadros):
+    """Cuadros (arreglos BGR) de una imagen o de una secuencia corta de video, como máximo `max_cuadros`.
+
+    Si el video tiene más cuadros, se toman repartidos a lo largo de todo el clip.
+    """
+    if extension(nombre) in EXTENSIONES_IMAGEN:
+        imagen = cv2.imdecode(np.frombuffer(contenido, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        return [] if imagen is None else [imagen]
+
+    # OpenCV sólo abre videos desde un archivo
+    fd, path = tempfile.mkstemp(suffix="." + extension(nombre))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        captura = cv2.VideoCapture(path)
+        try:
+            total = int(captura.get(cv2.CAP_PROP_FRAME_COUNT)) or max_cuadros
+            paso = max(1, math.ceil(total / max_cuadros))
+            resultado, i = [], 0
+            while len(resultado) < max_cuadros:
+                leido, cuadro = captura.read()
+                if not leido:
+                    break
+                if i % paso == 0:
+                    resultado.append(cuadro)
+                i += 1
+            return resultado
+        finally:
+            captura.release()
+    finally:
+        os.remove(path)
+
+
+class Decodificador:
+    """Reparte la decodificación de cuadros en un pool de procesos creado al primer uso.
+
+    Si un proceso del pool muere (por ejemplo, el sistema lo mata por memoria
+    con un video grande), el pool queda roto para siempre: se descarta, se
+    crea otro y la decodificación se reintenta una vez.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _pool_procesos(self):
+        with self._lock:
+            if self._pool is None:
+                # "spawn" evita heredar locks de los hilos del servidor al crear los procesos
+                contexto = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=contexto)
+            return self._pool
+
+    def _descartar(self, pool):
+        with self._lock:
+            # Otra petición pudo haberlo reemplazado ya
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def decodificar(self, lista):
+        """Texto leído (o None) de cada cuadro, en el mismo orden."""
+        if len(lista) <= 1:
+            # Un solo cuadro no compensa el viaje al pool
+            return [decodificar_cuadro(cuadro) for cuadro in lista]
+        for intento in range(2):
+            pool = self._pool_procesos()
+            try:
+                return list(pool.map(decodificar_cuadro, lista))
+            except BrokenProcessPool:
+                self._descartar(pool)
+                if intento:
+                    # Se rompió dos veces seguidas: lo más probable es que sea por esta misma petición
+                    raise
@@ -0,0 +1,229 @@
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Tiempo que el escritor espera después de la primera escritura para juntar las que lleguen detrás
+VENTANA_GRUPO = 0.005
+
+
+class BloqueoArchivo:
+    """Lock exclusivo entre procesos sobre un archivo auxiliar (flock en POSIX, msvcrt en Windows).
+
+    Dentro del proceso se combina con un RLock, así que también sirve entre
+    hilos y admite reentrada.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._hilos = threading.RLock()
+        self._profundidad = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._hilos.acquire()
+        if self._profundidad == 0:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+            except Exception:
+                os.close(self._fd)
+                self._hilos.release()
+                raise
+        self._profundidad += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profundidad -= 1
+        if self._profundidad == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._hilos.release()
+        return False
+
+
+class Diario:
+    """Bitácora de mutaciones en JSON por líneas, sólo de agregado.
+
+    Cada línea es una entrada {"op": "insert" | "update" | "delete", ...}.
+    Las entradas son idempotentes (insertar con ID fijo, asignar campos,
+    borrar), de modo que volver a aplicar el diario sobre un libro ya
+    compactado da el mismo resultado.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def marca(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return 0, None
+
+    def leer(self):
+        """Entradas del diario en orden; una última línea cortada por un corte de luz se ignora."""
+        try:
+            with open(self.path, "rb") as f:
+                lineas = f.read().split(b"\n")
+        except FileNotFoundError:
+            return []
+        entradas = []
+        for linea in lineas:
+            if not linea.strip():
+                continue
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                break
+        return entradas
+
+    def agregar(self, entradas):
+        """Agrega las entradas con una sola escritura y un solo fsync."""
+        if not entradas:
+            return
+        datos = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entradas).encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def vaciar(self):
+        with open(self.path, "wb") as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class _Escritura:
+    def __init__(self, fn):
+        self.fn = fn
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.marcas = None
+
+
+class Lote:
+    """Contexto que recibe cada escritura del grupo mientras se tiene el lock entre procesos."""
+
+    def __init__(self):
+        self.entradas = []
+
+    def registrar(self, *entradas):
+        self.entradas.extend(entradas)
+
+    def descartar(self):
+        """Olvida las entradas anteriores del grupo (las reemplaza una reescritura completa)."""
+        self.entradas.clear()
+
+
+class CoordinadorEscrituras:
+    """Serializa las escrituras de todos los hilos y procesos y las confirma en grupo.
+
+    Cada escritura es una función que recibe el Lote y se ejecuta en el hilo
+    escritor con el lock entre procesos tomado. Las que llegan dentro de
+    VENTANA_GRUPO se ejecutan juntas y sus entradas se agregan al diario con
+    un único fsync; luego se despierta a cada llamador con su resultado o su
+    excepción. `antes` se llama con el lock tomado, antes del grupo (para
+    ponerse al día con lo que escribieron otros procesos), y `despues` con
+    las entradas ya confirmadas, o con None si el grupo no se pudo confirmar
+    (el estado en memoria que hayan tocado las escrituras ya no es confiable).
+    `marca`, si se indica, se lee con el lock tomado al empezar y al terminar
+    el grupo; cada llamador ve ese par en `ultima_escritura`.
+    """
+
+    def __init__(self, bloqueo, diario, antes=None, despues=None, marca=None, ventana=VENTANA_GRUPO):
+        self.bloqueo = bloqueo
+        self.diario = diario
+        self._antes = antes
+        self._despues = despues
+        self._marca = marca
+        self.ventana = ventana
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._arranque = threading.Lock()
+        self._local = threading.local()
+
+    def ejecutar(self, fn):
+        """Encola una escritura y espera a que su grupo quede confirmado en el diario."""
+        self._iniciar()
+        escritura = _Escritura(fn)
+        self._cola.put(escritura)
+        escritura.listo.wait()
+        if escritura.error is not None:
+            raise escritura.error
+        self._local.marcas = escritura.marcas
+        return escritura.resultado
+
+    def ultima_escritura(self):
+        """Marcas (antes, después) del grupo de la última escritura confirmada por este hilo."""
+        return getattr(self._local, "marcas", None)
+
+    def _iniciar(self):
+        if self._hilo is None:
+            with self._arranque:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._bucle, name="escritor", daemon=True)
+                    self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            grupo = [self._cola.get()]
+            # Se deja pasar un instante para juntar las escrituras concurrentes
+            time.sleep(self.ventana)
+            while True:
+                try:
+                    grupo.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            self._confirmar(grupo)
+
+    def _confirmar(self, grupo):
+        lote = Lote()
+        try:
+            with self.bloqueo:
+                # Lo que otro proceso escriba antes de tomar el lock queda fuera del par de marcas
+                antes = self._marca() if self._marca is not None else None
+                if self._antes is not None:
+                    self._antes()
+                for escritura in grupo:
+                    inicio = len(lote.entradas)
+                    try:
+                        escritura.resultado = escritura.fn(lote)
+                    except Exception as e:
+                        # Una escritura inválida no arrastra a las demás del grupo
+                        del lote.entradas[inicio:]
+                        escritura.error = e
+                self.diario.agregar(lote.entradas)
+                if self._marca is not None:
+                    marcas = (antes, self._marca())
+                    for escritura in grupo:
+                        escritura.marcas = marcas
+                if self._despues is not None:
+                    self._despues(lote.entradas)
+        except Exception as e:
+            for escritura in grupo:
+                if escritura.error is None:
+                    escritura.error = e
+            if self._despues is not None:
+                self._despues(None)
+        finally:
+            for escritura in grupo:
+                escritura.listo.set()
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Espejo columnar del libro: un .npz sin comprimir (ni pickle) con
+#   meta   JSON en UTF-8 (uint8): formato, marca del libro (mtime_ns, tamaño),
+#          hoja, columnas y cantidad de filas
+#   c<i>   códigos de la columna i (el entero con signo más chico que alcance;
+#          -1 = celda vacía)
+#   v<i>   valores distintos de la columna i en UTF-8 (uint8), separados por NUL
+# Es una codificación por diccionario: las columnas repetitivas (estado,
+# empresa, fechas) ocupan un byte por fila y se reconstruyen indexando.
+FORMATO = 1
+SEPARADOR = "\0"  # No puede aparecer en una celda de Excel (XML no lo admite)
+
+
+def marca_libro(path):
+    """(mtime_ns, tamaño) del libro, o None si no existe."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _codificar(serie):
+    codigos, valores = pd.factorize(serie, use_na_sentinel=True)
+    texto = SEPARADOR.join(str(v) for v in valores)
+    if valores.size and texto.count(SEPARADOR) != valores.size - 1:
+        raise ValueError("Celda con un separador del espejo.")
+    codigos = codigos.astype(np.min_scalar_type(-max(valores.size, 1)))
+    return codigos, np.frombuffer(texto.encode("utf-8"), dtype=np.uint8)
+
+
+def _decodificar(codigos, texto):
+    texto = texto.tobytes().decode("utf-8")
+    valores = texto.split(SEPARADOR) if codigos.size and codigos.max() >= 0 else []
+    # El último lugar queda en None: es adonde van a parar los códigos -1
+    tabla = np.empty(len(valores) + 1, dtype=object)
+    tabla[:-1] = valores
+    return tabla[codigos]
+
+
+class EspejoColumnar:
+    """Copia columnar del libro de Excel que se carga en milisegundos en vez de parsear el .xlsx.
+
+    Lleva la marca (mtime y tamaño) del libro del que salió: si no coincide
+    con la del libro actual, `leer` devuelve None y hay que volver a
+    parsearlo y guardar el espejo. Se reemplaza de forma atómica, así que
+    varios workers pueden escribirlo a la vez.
+    """
+
+    def __init__(self, libro_path, sheet_name="Sheet1"):
+        self.libro_path = libro_path
+        self.sheet_name = sheet_name
+        self.path = os.path.splitext(libro_path)[0] + ".columnas.npz"
+
+    def leer(self, marca):
+        """DataFrame (object, con None en las vacías) del libro con esa marca, o None si el espejo no sirve."""
+        if marca is None:
+            return None
+        try:
+            with np.load(self.path, allow_pickle=False) as datos:
+                meta = json.loads(datos["meta"].tobytes().decode("utf-8"))
+                if (meta.get("formato") != FORMATO or meta.get("marca") != marca
+                        or meta.get("hoja") != self.sheet_name):
+                    return None
+                columnas = {col: _decodificar(datos[f"c{i}"], datos[f"v{i}"])
+                            for i, col in enumerate(meta["columnas"])}
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Espejo ausente o dañado: se parsea el libro
+            return None
+        return pd.DataFrame(columnas, columns=meta["columnas"], dtype=object)
+
+    def guardar(self, df, marca):
+        """Escribe el espejo de `df` con la marca del libro. Devuelve False si no se pudo."""
+        if marca is None:
+            return False
+        meta = {"formato": FORMATO, "marca": marca, "hoja": self.sheet_name,
+                "columnas": [str(c) for c in df.columns], "filas": len(df)}
+        arreglos = {"meta": np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)}
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            for i, col in enumerate(df.columns):
+                arreglos[f"c{i}"], arreglos[f"v{i}"] = _codificar(df[col])
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arreglos)
+            os.replace(tmp_path, self.path)
+        except (OSError, ValueError):
+            # Sin espejo sólo se pierde velocidad: el próximo arranque parsea el libro
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        return True
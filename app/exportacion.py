@@ -0,0 +1,101 @@
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+
+class Salida(io.RawIOBase):
+    """Destino de escritura sin posición: acumula lo escrito hasta que se vacía."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _texto(valor):
+    return "" if valor is None else str(valor)
+
+
+def csv_en_streaming(encabezado, lotes):
+    """Genera un CSV en UTF-8 (con BOM, para que Excel respete las tildes) lote por lote."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(encabezado)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for filas in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows([_texto(v) for v in fila] for fila in filas)
+        yield buffer.getvalue().encode("utf-8")
+
+
+# Partes fijas de un libro de una sola hoja (SpreadsheetML mínimo)
+_TIPOS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+_RELACIONES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+_LIBRO = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+_RELACIONES_LIBRO = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+_INICIO_HOJA = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>"""
+_FIN_HOJA = "</sheetData></worksheet>"
+
+# Caracteres de control que XML no admite
+_NO_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _fila_xml(valores):
+    celdas = "".join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_NO_XML.sub("", texto))}</t></is></c>'
+        if texto else "<c/>"
+        for texto in map(_texto, valores)
+    )
+    return f"<row>{celdas}</row>"
+
+
+def xlsx_en_streaming(encabezado, lotes, hoja="Sheet1"):
+    """Genera un XLSX de una hoja lote por lote, sin armar el libro completo en memoria.
+
+    Las celdas se escriben como texto en línea (el registro guarda todo como
+    texto) y la hoja se comprime a medida que se escribe; el ZIP usa
+    descriptores de datos, así que no necesita volver atrás en la salida.
+    """
+    salida = Salida()
+    with zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr("[Content_Types].xml", _TIPOS)
+        libro.writestr("_rels/.rels", _RELACIONES)
+        libro.writestr("xl/workbook.xml", _LIBRO.format(hoja=escape(hoja, {'"': "&quot;"})))
+        libro.writestr("xl/_rels/workbook.xml.rels", _RELACIONES_LIBRO)
+        with libro.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as hoja_xml:
+            hoja_xml.write((_INICIO_HOJA + _fila_xml(encabezado)).encode("utf-8"))
+            yield salida.vaciar()
+            for filas in lotes:
+                hoja_xml.write("".join(_fila_xml(fila) for fila in filas).encode("utf-8"))
+                yield salida.vaciar()
+            hoja_xml.write(_FIN_HOJA.encode("utf-8"))
+    yield salida.vaciar()
@@ -0,0 +1,126 @@
+import base64
+import os
+import time
+from datetime import date
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+# Formato v1 del QR firmado: líneas "CLAVE: valor" y al final la firma Ed25519
+# (base64 url-safe) de todo el texto anterior. La primera línea sigue siendo
+# "ID: <número>", así que los lectores del formato antiguo siguen encontrando el ID.
+#
+#   ID: 8000123
+#   V: 1
+#   SOAT: 2025/06/30
+#   TECNOMECANICA: 2025/09/15
+#   EMITIDO: 1760000000
+#   FIRMA: <86 caracteres>
+VERSION_QR = "1"
+SEPARADOR_FIRMA = "\nFIRMA: "
+
+
+class QRInvalido(ValueError):
+    """El QR firmado está mal formado o su firma no corresponde a la clave del servidor."""
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _de_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _fecha(texto):
+    """AAAA/MM/DD → date, sin pasar por strptime (es la parte caliente de la verificación)."""
+    anio, mes, dia = texto.split("/")
+    return date(int(anio), int(mes), int(dia))
+
+
+def _fecha_valida(texto):
+    """La fecha tal cual si se puede leer como AAAA/MM/DD; si no, vacía (el QR queda no vigente)."""
+    try:
+        _fecha(str(texto))
+        return str(texto)
+    except (TypeError, ValueError):
+        return ""
+
+
+def es_firmado(texto):
+    return SEPARADOR_FIRMA in str(texto).replace("\r\n", "\n")
+
+
+class FirmaQR:
+    """Firma y verifica los QR con una clave Ed25519 del servidor.
+
+    La clave privada se guarda en `path` (PEM, sólo lectura para el dueño) y
+    se crea la primera vez. Verificar un QR no toca el registro: sólo parsea
+    el texto y comprueba la firma.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._privada = self._cargar_o_crear()
+        self._publica = self._privada.public_key()
+
+    def _cargar_o_crear(self):
+        try:
+            with open(self.path, "rb") as f:
+                return serialization.load_pem_private_key(f.read(), password=None)
+        except FileNotFoundError:
+            pass
+        privada = Ed25519PrivateKey.generate()
+        pem = privada.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+        try:
+            # O_EXCL: si otro worker la creó al mismo tiempo, se usa la suya
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(self.path, "rb") as f:
+                return serialization.load_pem_private_key(f.read(), password=None)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        return privada
+
+    def clave_publica_pem(self):
+        """Clave pública en PEM, para que los validadores sin conexión verifiquen los QR."""
+        return self._publica.public_bytes(serialization.Encoding.PEM,
+                                          serialization.PublicFormat.SubjectPublicKeyInfo).decode("ascii")
+
+    def firmar(self, id_, soat, tecnomecanica, emitido=None):
+        """Texto del QR v1 para un registro; las fechas van en AAAA/MM/DD como en el registro."""
+        emitido = int(time.time()) if emitido is None else int(emitido)
+        cuerpo = (f"ID: {id_}\nV: {VERSION_QR}\nSOAT: {_fecha_valida(soat)}\n"
+                  f"TECNOMECANICA: {_fecha_valida(tecnomecanica)}\nEMITIDO: {emitido}")
+        return cuerpo + SEPARADOR_FIRMA + _b64(self._privada.sign(cuerpo.encode("utf-8")))
+
+    def verificar(self, texto):
+        """Comprueba la firma y devuelve los campos del QR (ID, fechas como date o None, EMITIDO)."""
+        cuerpo, _, firma = str(texto).replace("\r\n", "\n").strip().rpartition(SEPARADOR_FIRMA)
+        try:
+            self._publica.verify(_de_b64(firma.strip()), cuerpo.encode("utf-8"))
+        except (InvalidSignature, ValueError) as e:
+            raise QRInvalido("La firma del QR no es válida.") from e
+        try:
+            campos = dict(linea.split(": ", 1) for linea in cuerpo.split("\n"))
+            version = campos["V"]
+        except (KeyError, ValueError) as e:
+            raise QRInvalido("El QR firmado está mal formado.") from e
+        if version != VERSION_QR:
+            raise QRInvalido(f"Versión de QR no soportada: {version}.")
+        try:
+            return {
+                "ID": campos["ID"].strip(),
+                "SOAT": _fecha(campos["SOAT"]) if campos["SOAT"] else None,
+                "TECNOMECANICA": _fecha(campos["TECNOMECANICA"]) if campos["TECNOMECANICA"] else None,
+                "EMITIDO": int(campos["EMITIDO"]),
+            }
+        except (KeyError, ValueError) as e:
+            raise QRInvalido("El QR firmado está mal formado.") from e
+
+    @staticmethod
+    def vigente(campos, hoy):
+        """Indica si las fechas firmadas siguen vigentes en `hoy` (sin consultar el registro)."""
+        return all(campos[col] is not None and campos[col] >= hoy for col in ("SOAT", "TECNOMECANICA"))
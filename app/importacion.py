@@ -0,0 +1,168 @@
+import io
+import pickle
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .normalizacion import normalizar_enteros, normalizar_fechas
+
+CLAVE = ["CEDULA", "TIPO DE TRANSPORTE"]
+MOTIVO_EN_REGISTRO = "Ya existe un vehículo de este tipo para esta cédula."
+
+# Columnas que se copian tal cual desde el archivo subido
+COLUMNAS_TEXTO = ["NOMBRES Y APELLIDOS", "EMPRESA", "TIPO DE TRANSPORTE", "PLACA",
+                  "CATEGORIA(S)", "FECHA DE VENCIMIENTO", "OBSERVACIONES"]
+
+
+def columna_estado(soat, tecnomecanica):
+    """Versión por columna de calcular_estado a partir de fechas ya normalizadas."""
+    hoy = pd.Timestamp(datetime.today().date())
+    soat = pd.to_datetime(soat, format="%Y/%m/%d", errors="coerce")
+    tecnomecanica = pd.to_datetime(tecnomecanica, format="%Y/%m/%d", errors="coerce")
+    activo = (soat >= hoy) & (tecnomecanica >= hoy)
+    return activo.map({True: "Activo", False: "Inactivo"})
+
+
+def normalizar_cargue(df_upload, columnas):
+    """Normaliza el archivo subido completo con operaciones por columna."""
+    df = pd.DataFrame(index=df_upload.index)
+    for col in COLUMNAS_TEXTO:
+        df[col] = df_upload[col] if col in df_upload.columns else ""
+    for col in ("CEDULA", "TARJETA DE PROPIEDAD"):
+        df[col] = normalizar_enteros(df_upload[col])[0] if col in df_upload.columns else ""
+    for col in ("SOAT", "TECNOMECANICA"):
+        df[col] = normalizar_fechas(df_upload[col])[0] if col in df_upload.columns else ""
+    df["ESTADO"] = columna_estado(df["SOAT"], df["TECNOMECANICA"])
+    df = df.astype(object).where(df.notna(), "")
+    return df[[c for c in columnas if c != "ID"]]
+
+
+class ArchivoDemasiadoGrande(ValueError):
+    """El archivo subido supera el límite de filas configurado."""
+
+
+def leer_excel_por_lotes(contenido, nombre, tamano_lote, max_filas):
+    """Itera el archivo subido en DataFrames de `tamano_lote` filas, sin escribirlo a disco.
+
+    Los .xlsx se recorren con el iterador de sólo lectura de openpyxl, así que
+    en memoria sólo vive el lote actual. El índice de cada lote es la fila de
+    Excel menos 2, igual que con pd.read_excel.
+    """
+    if nombre.lower().endswith(".xls"):
+        # openpyxl no lee el formato antiguo; se delega en pandas
+        df = pd.read_excel(io.BytesIO(contenido))
+        if len(df) > max_filas:
+            raise ArchivoDemasiadoGrande(f"El archivo tiene {len(df)} filas; el máximo es {max_filas}.")
+        for inicio in range(0, len(df), tamano_lote):
+            yield df.iloc[inicio:inicio + tamano_lote]
+        return
+
+    import openpyxl  # Se importa al primer cargue, no al arrancar el worker
+    libro = openpyxl.load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        # La dimensión declarada permite rechazar archivos enormes antes de recorrerlos
+        if hoja.max_row and hoja.max_row - 1 > max_filas:
+            raise ArchivoDemasiadoGrande(f"El archivo tiene {hoja.max_row - 1} filas; el máximo es {max_filas}.")
+        filas = hoja.iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        columnas = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(encabezado)]
+        lote, indices, leidas = [], [], 0
+        for numero, fila in enumerate(filas):
+            if all(v is None for v in fila):
+                continue
+            leidas += 1
+            if leidas > max_filas:
+                raise ArchivoDemasiadoGrande(f"El archivo supera el máximo de {max_filas} filas.")
+            lote.append(fila[:len(columnas)])
+            indices.append(numero)
+            if len(lote) == tamano_lote:
+                yield pd.DataFrame(lote, columns=columnas, index=indices)
+                lote, indices = [], []
+        if lote:
+            yield pd.DataFrame(lote, columns=columnas, index=indices)
+    finally:
+        libro.close()
+
+
+def clasificar_lote(df_upload, existentes, vistos, columnas):
+    """Clasifica un lote del archivo en filas aceptadas, duplicadas o inválidas.
+
+    Los duplicados contra el registro se detectan con un único anti-join
+    vectorizado sobre (CEDULA, TIPO DE TRANSPORTE); los repetidos dentro del
+    archivo, con `duplicated` en el lote y con `vistos`, el conjunto de claves
+    aceptadas en lotes anteriores (se actualiza aquí). Devuelve el DataFrame de
+    aceptadas y el reporte de las filas rechazadas.
+    """
+    df = normalizar_cargue(df_upload, columnas)
+
+    claves = pd.MultiIndex.from_frame(df[CLAVE].astype(str))
+    invalida = (df["CEDULA"] == "").to_numpy()
+    en_registro = claves.isin(existentes)
+    en_archivo = claves.duplicated(keep="first") | np.fromiter(
+        (clave in vistos for clave in claves), dtype=bool, count=len(claves))
+
+    duplicada = ~invalida & (en_registro | en_archivo)
+    aceptada = ~invalida & ~duplicada
+    vistos.update(claves[aceptada])
+
+    motivo = np.full(len(df), "", dtype=object)
+    motivo[duplicada & en_archivo] = "Repetido dentro del archivo."
+    motivo[duplicada & en_registro] = MOTIVO_EN_REGISTRO
+    motivo[invalida] = "CEDULA vacía o no numérica."
+    resultado = np.where(invalida, "invalido", "duplicado")
+
+    # Número de fila tal como lo ve el usuario en Excel (la fila 1 es el encabezado)
+    rechazadas = ~aceptada
+    reporte = pd.DataFrame({"fila": df.index[rechazadas] + 2, "resultado": resultado[rechazadas],
+                            "motivo": motivo[rechazadas], "CEDULA": df["CEDULA"].to_numpy()[rechazadas]})
+    return df[aceptada], reporte
+
+
+def revalidar_lote(df, existentes):
+    """Quita de un lote ya aceptado las filas cuya clave llegó al registro después de clasificarlo.
+
+    Se llama con la escritura bloqueada, con las claves leídas en ese momento.
+    Devuelve las filas que siguen aceptadas y el reporte de las que pasan a
+    ser duplicadas, con el mismo formato que `clasificar_lote`.
+    """
+    en_registro = pd.MultiIndex.from_frame(df[CLAVE].astype(str)).isin(existentes)
+    reporte = pd.DataFrame({"fila": df.index[en_registro] + 2, "resultado": "duplicado",
+                            "motivo": MOTIVO_EN_REGISTRO, "CEDULA": df["CEDULA"].to_numpy()[en_registro]})
+    return df[~en_registro], reporte
+
+
+class LotesEnDisco:
+    """Lotes aceptados del cargue guardados en un temporal hasta que se insertan.
+
+    Permite validar todo el archivo antes de bloquear la escritura sin tener
+    en memoria más que el lote actual. El temporal se borra al cerrarlo.
+    """
+
+    def __init__(self):
+        self._archivo = tempfile.TemporaryFile()
+
+    def agregar(self, df):
+        pickle.dump(df, self._archivo, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __iter__(self):
+        self._archivo.seek(0)
+        while True:
+            try:
+                yield pickle.load(self._archivo)
+            except EOFError:
+                return
+
+    def close(self):
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class JobManager:
+    """Ejecuta trabajos largos (como el cargue masivo) fuera de la petición HTTP.
+
+    El estado de cada trabajo se guarda además en un JSON dentro de `folder`,
+    para que cualquier worker pueda responder la consulta de progreso.
+    """
+
+    def __init__(self, folder, max_jobs=1):
+        self.folder = folder
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.folder, f"{job_id}.json")
+
+    def _persist(self, job):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = self._path(job["id"]) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    def submit(self, fn, *args):
+        """Encola `fn(job_id, *args)` y devuelve de inmediato el ID del trabajo."""
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "estado": "en_cola",
+            "creado": datetime.now().isoformat(timespec="seconds"),
+            "total_filas": None,
+            "filas_procesadas": 0,
+            "errores": [],
+            "resultado": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._persist(job)
+        self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        self.update(job_id, estado="procesando")
+        try:
+            resultado = fn(job_id, *args)
+            self.update(job_id, estado="completado", resultado=resultado)
+        except Exception as e:
+            self.add_error(job_id, str(e))
+            self.update(job_id, estado="error")
+
+    def update(self, job_id, **campos):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(campos)
+            self._persist(job)
+
+    def add_error(self, job_id, mensaje):
+        with self._lock:
+            self._jobs[job_id]["errores"].append(mensaje)
+
+    def status(self, job_id):
+        """Devuelve el estado del trabajo, o None si no existe."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job, errores=list(job["errores"]))
+        try:
+            with open(self._path(os.path.basename(job_id)), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,227 @@
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, before_render_template, current_app, request, session, template_rendered
+
+# Límites (en segundos) de los histogramas, los mismos para peticiones y tramos
+LIMITES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histograma:
+    """Conteos por límite, suma y total de las observaciones (como un histograma de Prometheus)."""
+
+    def __init__(self, limites=LIMITES):
+        self.limites = limites
+        self.conteos = [0] * (len(limites) + 1)
+        self.suma = 0.0
+
+    def observar(self, valor):
+        self.conteos[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+
+    def acumulados(self):
+        """Pares (límite, observaciones <= límite), terminando en +Inf."""
+        total, resultado = 0, []
+        for limite, conteo in zip(self.limites + (float("inf"),), self.conteos):
+            total += conteo
+            resultado.append((limite, total))
+        return resultado
+
+
+class _Nulo:
+    """Tramo que no mide nada: lo que se usa cuando las métricas están apagadas."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULO = _Nulo()
+
+
+class _Tramo:
+    def __init__(self, metricas, nombre):
+        self.metricas = metricas
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metricas.registrar_tramo(self.nombre, time.perf_counter() - self.inicio)
+        return False
+
+
+def _etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metricas:
+    """Histogramas de latencia por ruta y por tramo, con exportación en texto de Prometheus.
+
+    `tramo(nombre)` mide un bloque de código; dentro de una petición el tramo
+    también queda en el desglose que se escribe en el log de peticiones
+    lentas. Con las métricas apagadas `tramo` devuelve un contexto vacío
+    compartido y los hooks de petición no hacen nada.
+    """
+
+    def __init__(self, activas=True, lento=None):
+        self.activas = activas
+        self.lento = lento
+        self._lock = threading.Lock()
+        self._peticiones = {}
+        self._tramos = {}
+        self._local = threading.local()
+
+    def tramo(self, nombre):
+        return _Tramo(self, nombre) if self.activas else _NULO
+
+    def medir(self, nombre):
+        """Decorador: mide cada llamada de la función como un tramo."""
+        def decorador(fn):
+            @wraps(fn)
+            def envoltura(*args, **kwargs):
+                with self.tramo(nombre):
+                    return fn(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    @staticmethod
+    def _observar(histogramas, clave, segundos, lock):
+        with lock:
+            histograma = histogramas.get(clave)
+            if histograma is None:
+                histograma = histogramas[clave] = Histograma()
+            histograma.observar(segundos)
+
+    def registrar_tramo(self, nombre, segundos):
+        self._observar(self._tramos, nombre, segundos, self._lock)
+        tramos = getattr(self._local, "tramos", None)
+        if tramos is not None:
+            tramos.append((nombre, segundos))
+
+    def registrar_peticion(self, ruta, metodo, estado, segundos):
+        self._observar(self._peticiones, (ruta, metodo, str(estado)), segundos, self._lock)
+
+    def texto(self):
+        """Todas las métricas en el formato de texto de Prometheus."""
+        with self._lock:
+            peticiones = [(dict(ruta=r, metodo=m, estado=e), h.acumulados(), h.suma)
+                          for (r, m, e), h in sorted(self._peticiones.items())]
+            tramos = [(dict(tramo=t), h.acumulados(), h.suma) for t, h in sorted(self._tramos.items())]
+        lineas = []
+        for nombre, ayuda, series in (
+            ("soat_peticion_segundos", "Latencia de las peticiones HTTP por ruta, método y estado.", peticiones),
+            ("soat_tramo_segundos", "Duración de los tramos medidos dentro de la aplicación.", tramos),
+        ):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} histogram")
+            for etiquetas, acumulados, suma in series:
+                base = ",".join(f'{k}="{_etiqueta(v)}"' for k, v in etiquetas.items())
+                for limite, conteo in acumulados:
+                    le = "+Inf" if limite == float("inf") else repr(limite)
+                    lineas.append(f'{nombre}_bucket{{{base},le="{le}"}} {conteo}')
+                lineas.append(f"{nombre}_sum{{{base}}} {suma:.6f}")
+                lineas.append(f"{nombre}_count{{{base}}} {acumulados[-1][1]}")
+        return "\n".join(lineas) + "\n"
+
+    # Hooks de la petición
+    #
+    # La petición se registra al final (teardown_request), así que también
+    # cuentan las que terminan en una excepción. Una respuesta en streaming
+    # genera el cuerpo después de volver de la vista: se registra recién
+    # cuando el servidor la cierra.
+
+    def _antes(self):
+        self._local.inicio = time.perf_counter()
+        self._local.tramos = []
+        self._local.estado = None
+
+    def _despues(self, respuesta):
+        if getattr(self._local, "inicio", None) is None:
+            return respuesta
+        if not respuesta.is_streamed:
+            self._local.estado = respuesta.status_code
+            return respuesta
+        peticion = self._peticion_en_curso()
+        self._local.inicio = None  # teardown_request ya no la registra
+        tramos = self._local.tramos  # Los tramos del generador se siguen sumando a esta lista
+
+        def cerrar():
+            self._registrar(*peticion, respuesta.status_code, tramos)
+            if getattr(self._local, "tramos", None) is tramos:
+                self._local.tramos = None
+
+        respuesta.call_on_close(cerrar)
+        return respuesta
+
+    def _final(self, error):
+        if getattr(self._local, "inicio", None) is None:
+            return
+        peticion = self._peticion_en_curso()
+        estado = 500 if error is not None else self._local.estado or 500
+        tramos = self._local.tramos
+        self._local.inicio = self._local.tramos = None
+        self._registrar(*peticion, estado, tramos)
+
+    def _peticion_en_curso(self):
+        # Se agrupa por la regla de la ruta (/qr/<int:id>), no por la URL, para acotar las series
+        ruta = request.url_rule.rule if request.url_rule is not None else "<sin ruta>"
+        return self._local.inicio, ruta, request.method, request.path, current_app.logger
+
+    def _registrar(self, inicio, ruta, metodo, path, logger, estado, tramos):
+        duracion = time.perf_counter() - inicio
+        self.registrar_peticion(ruta, metodo, estado, duracion)
+        if self.lento is not None and duracion >= self.lento:
+            desglose = "; ".join(f"{nombre} {segundos * 1000:.1f} ms" for nombre, segundos in tramos)
+            logger.warning("Petición lenta: %s %s %d %.1f ms [%s]", metodo, path, estado, duracion * 1000,
+                           desglose or "sin tramos")
+
+    def _plantilla_inicio(self, sender, template, context, **extra):
+        self._local.plantillas = getattr(self._local, "plantillas", None) or []
+        self._local.plantillas.append(time.perf_counter())
+
+    def _plantilla_fin(self, sender, template, context, **extra):
+        plantillas = getattr(self._local, "plantillas", None)
+        if plantillas:
+            self.registrar_tramo("render_template", time.perf_counter() - plantillas.pop())
+
+
+metricas = Metricas()
+
+
+def instalar(app):
+    """Activa la instrumentación en la aplicación según el entorno.
+
+    METRICAS=0 la apaga. METRICAS_LENTO_MS escribe en el log las peticiones
+    que tarden al menos esos milisegundos, con el desglose de sus tramos.
+    /metrics nunca queda abierto: lo puede leer una sesión de administrador
+    o, si METRICAS_TOKEN está definido, quien lo mande como token Bearer
+    (el caso de un recolector como Prometheus).
+    """
+    metricas.activas = os.environ.get("METRICAS", "1") != "0"
+    lento_ms = os.environ.get("METRICAS_LENTO_MS")
+    metricas.lento = float(lento_ms) / 1000 if lento_ms else None
+    token = os.environ.get("METRICAS_TOKEN")
+
+    if metricas.activas:
+        app.before_request(metricas._antes)
+        app.after_request(metricas._despues)
+        app.teardown_request(metricas._final)
+        before_render_template.connect(metricas._plantilla_inicio, app)
+        template_rendered.connect(metricas._plantilla_fin, app)
+
+    @app.route("/metrics")
+    def metrics():
+        autorizado = session.get("role") == "admin" or (
+            token and hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()))
+        if not autorizado:
+            return Response("No autorizado.\n", status=401, mimetype="text/plain")
+        return Response(metricas.texto(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,153 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+FORMATO_SALIDA = "%Y/%m/%d"
+FORMATOS_FECHA = ("%d/%m/%Y", "%Y-%m-%d", "%Y/%m/%d")
+
+# Excel guarda las fechas como días desde 1899-12-30; fuera de este rango no es una fecha válida
+ORIGEN_EXCEL = pd.Timestamp("1899-12-30")
+SERIAL_MAXIMO = (date(2262, 4, 11) - ORIGEN_EXCEL.date()).days  # último día representable en datetime64[ns]
+# Cantidad de celdas con las que se decide el formato de fecha de una columna
+MUESTRA_FORMATO = 200
+
+
+# =======================
+# Versiones por celda (para valores sueltos, como los de un formulario)
+# =======================
+
+def convert_date(value):
+    """Convierte una fecha a formato AAAA/MM/DD asegurando que el input sea siempre una cadena."""
+    try:
+        if pd.notnull(value):
+            # Si ya es un Timestamp, lo formateamos directamente.
+            if isinstance(value, pd.Timestamp):
+                return value.strftime(FORMATO_SALIDA)
+            date_str = str(value).strip()
+            # Intentar primero con formato dd/mm/yyyy
+            for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+                try:
+                    return datetime.strptime(date_str, fmt).strftime(FORMATO_SALIDA)
+                except ValueError:
+                    pass
+    except Exception:
+        pass
+    return ""
+
+
+def convert_to_int_str(valor):
+    """Convierte un valor numérico a cadena sin decimales."""
+    try:
+        if pd.notnull(valor) and str(valor).strip() != '':
+            return str(int(float(valor)))
+    except Exception:
+        pass
+    return ''
+
+
+# =======================
+# Versiones por columna
+# =======================
+
+def _vacias(serie):
+    """Celdas nulas o con sólo espacios."""
+    vacias = serie.isna()
+    if serie.dtype == object or pd.api.types.is_string_dtype(serie):
+        # En columnas mixtas .str deja NaN en las celdas que no son texto
+        vacias |= serie.astype(object).str.strip().eq("").fillna(False).astype(bool)
+    return vacias
+
+
+def _formatear(fechas):
+    """Formatea una columna datetime64 como AAAA/MM/DD ('' para NaT).
+
+    Se formatea una vez cada día distinto y se expande con el índice inverso,
+    mucho más rápido que strftime celda por celda.
+    """
+    dias = fechas.to_numpy(dtype="datetime64[D]")
+    unicos, inverso = np.unique(dias, return_inverse=True)
+    textos = np.array([pd.Timestamp(d).strftime(FORMATO_SALIDA) if not np.isnat(d) else "" for d in unicos],
+                      dtype=object)
+    return pd.Series(textos[inverso.reshape(-1)], index=fechas.index, dtype=object)
+
+
+def normalizar_enteros(serie):
+    """Convierte una columna de números (o de IDs leídos como float) a texto sin decimales.
+
+    Devuelve la columna normalizada, con '' donde no hay un número, y la
+    máscara de celdas no vacías que no se pudieron convertir.
+    """
+    if serie.dtype == object or pd.api.types.is_string_dtype(serie):
+        serie = serie.astype(object).where(serie.isna(), serie.astype(str).str.strip())
+    numeros = pd.to_numeric(serie, errors="coerce")
+    validos = numeros.notna() & np.isfinite(numeros.astype(float))
+    resultado = np.full(len(serie), "", dtype=object)
+    resultado[validos.to_numpy()] = numeros[validos].to_numpy(dtype="int64").astype(str)
+    return pd.Series(resultado, index=serie.index, dtype=object), ~validos & ~_vacias(serie)
+
+
+def _detectar_formato(texto, formatos):
+    """Ordena los formatos según cuántas celdas de una muestra logra leer cada uno."""
+    muestra = texto.head(MUESTRA_FORMATO)
+    aciertos = [pd.to_datetime(muestra, format=fmt, errors="coerce").notna().sum() for fmt in formatos]
+    return [fmt for _, fmt in sorted(zip(aciertos, formatos), key=lambda par: -par[0])]
+
+
+def normalizar_fechas(serie, formatos=FORMATOS_FECHA):
+    """Convierte una columna de fechas a texto AAAA/MM/DD en una sola pasada por formato.
+
+    Acepta celdas que ya son fechas, seriales de Excel y texto. Para el texto
+    se detecta el formato dominante de la columna con una muestra y sólo las
+    celdas que ese formato no logra leer se reintentan con los demás. Devuelve
+    la columna normalizada ('' si no hay fecha) y la máscara de celdas no
+    vacías que no se pudieron leer.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        fechas = serie.dt.tz_localize(None) if serie.dt.tz is not None else serie
+        return _formatear(fechas), pd.Series(False, index=serie.index)
+
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    vacias = _vacias(serie)
+
+    # Sólo se inspecciona celda por celda si la columna mezcla tipos
+    tipo = pd.api.types.infer_dtype(serie, skipna=True)
+    if tipo in ("string", "empty"):
+        es_fecha = es_numero = pd.Series(False, index=serie.index)
+    elif tipo in ("datetime", "datetime64", "date"):
+        es_fecha, es_numero = ~vacias, pd.Series(False, index=serie.index)
+    elif tipo in ("integer", "floating", "mixed-integer-float"):
+        es_fecha, es_numero = pd.Series(False, index=serie.index), ~vacias
+    else:
+        tipos = serie.map(type)
+        distintos = tipos.unique()
+        es_fecha = tipos.isin([t for t in distintos if issubclass(t, (datetime, date))])
+        es_numero = tipos.isin([t for t in distintos if issubclass(t, (int, float, np.integer, np.floating))
+                                and not issubclass(t, (bool, np.bool_))]) & ~vacias
+
+    # Celdas que ya son fechas (openpyxl las entrega como datetime)
+    if es_fecha.any():
+        fechas[es_fecha] = pd.to_datetime(serie[es_fecha].astype(object), errors="coerce")
+
+    # Seriales de Excel guardados como número
+    if es_numero.any():
+        numeros = pd.to_numeric(serie[es_numero], errors="coerce")
+        rango = numeros.between(1, SERIAL_MAXIMO)
+        fechas[rango[rango].index] = ORIGEN_EXCEL + pd.to_timedelta(numeros[rango].astype("int64"), unit="D")
+
+    # Texto: se parsea cada valor distinto una vez, con el formato dominante
+    # primero y el resto sólo para lo que quede pendiente
+    pendientes = fechas.isna() & ~vacias & ~es_fecha & ~es_numero
+    if pendientes.any():
+        codigos, unicos = pd.factorize(serie[pendientes].astype(str).str.strip())
+        texto = pd.Series(unicos)
+        leidas_unicos = pd.Series(pd.NaT, index=texto.index, dtype="datetime64[ns]")
+        for fmt in _detectar_formato(texto, formatos):
+            leidas = pd.to_datetime(texto, format=fmt, errors="coerce")
+            leidas_unicos[leidas.index[leidas.notna()]] = leidas[leidas.notna()]
+            texto = texto[leidas.isna()]
+            if texto.empty:
+                break
+        fechas[pendientes] = leidas_unicos.to_numpy()[codigos]
+
+    return _formatear(fechas), fechas.isna() & ~vacias
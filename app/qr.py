@@ -0,0 +1,70 @@
+import hashlib
+import io
+import threading
+import zipfile
+from collections import OrderedDict
+
+from .exportacion import Salida
+from .metricas import metricas
+
+
+def render_png(contenido):
+    """Genera el PNG del QR con el contenido indicado."""
+    import qrcode  # Se importa con el primer QR, no al arrancar el worker
+
+    buffer = io.BytesIO()
+    with metricas.tramo("qrcode.make"):
+        qrcode.make(contenido).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def etag(contenido):
+    """ETag estable para un contenido de QR: cambia sólo si cambia lo que va codificado."""
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:20]
+
+
+class CacheQR:
+    """Caché LRU acotada de PNGs de QR, por ID de registro.
+
+    Cada entrada guarda también el contenido con que se generó, de modo que
+    si el registro cambia (fechas nuevas, nueva firma) la imagen se vuelve a
+    generar aunque el ID sea el mismo.
+    """
+
+    def __init__(self, max_items=512):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def png(self, id_, contenido):
+        with self._lock:
+            item = self._items.get(id_)
+            if item is not None and item[0] == contenido:
+                self._items.move_to_end(id_)
+                return item[1]
+        # Se genera fuera del lock para no frenar a las demás peticiones
+        png = render_png(contenido)
+        with self._lock:
+            self._items[id_] = (contenido, png)
+            self._items.move_to_end(id_)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return png
+
+    def descartar(self, ids):
+        with self._lock:
+            for id_ in ids:
+                self._items.pop(str(id_), None)
+
+
+def zip_en_streaming(archivos):
+    """Genera un ZIP por partes a partir de pares (nombre, bytes), sin tenerlo completo en memoria.
+
+    Los PNG ya vienen comprimidos, así que se guardan sin volver a comprimir.
+    """
+    salida = Salida()
+    with zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, datos in archivos:
+            archivo_zip.writestr(nombre, datos)
+            yield salida.vaciar()
+    yield salida.vaciar()
@@ -0,0 +1,450 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .normalizacion import normalizar_enteros
+
+
+def normalizar_registro(df):
+    """Deja todas las celdas como texto (o nulo), igual que al leer el Excel con dtype=str."""
+    df = df.astype(object).reset_index(drop=True)
+    for col in df.columns:
+        valores = df[col]
+        presentes = valores.notna()
+        if not presentes.all() or not valores.map(type).eq(str).all():
+            df[col] = valores.where(~presentes, valores[presentes].astype(str))
+    return df
+
+
+EPOCA = date(1970, 1, 1)
+SIN_DIA = np.iinfo(np.int64).min  # Fecha vacía o inválida en los arreglos de días
+
+
+def dia(fecha):
+    """Convierte una fecha a número de días desde 1970 (la unidad del índice de vencimientos)."""
+    return (fecha - EPOCA).days
+
+
+def fecha_de_dia(numero):
+    return EPOCA + timedelta(days=int(numero))
+
+
+def _hoy():
+    return dia(datetime.today().date())
+
+
+def dias_fecha(serie):
+    """Fechas AAAA/MM/DD en días desde 1970; las vacías o inválidas quedan en el mínimo de int64."""
+    return pd.to_datetime(serie, format="%Y/%m/%d", errors="coerce").to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+
+def placa_presente(serie):
+    """Filas con una placa utilizable (ni vacía, ni 'none', ni 'nan')."""
+    placas = serie.astype(object).where(serie.notna(), "").astype(str).str.strip().str.lower()
+    return ~placas.isin(["", "none", "nan"]).to_numpy()
+
+
+def _filas(columnas, posiciones):
+    """Arma los dicts de las filas indicadas a partir de las columnas en memoria."""
+    return [{col: valores[i] for col, valores in columnas.items()} for i in posiciones]
+
+
+class IndiceConsulta:
+    """Índices precalculados para paginar, buscar, filtrar y ordenar el registro.
+
+    Se construye una vez por versión del registro: búsquedas por prefijo con
+    arreglos ordenados de NumPy, filtros exactos con posiciones agrupadas por
+    valor, rangos de fechas sobre los días que ya calculó la caché (`dias`,
+    por columna) y órdenes calculados la primera vez que se piden.
+    """
+
+    PREFIJOS = ("CEDULA", "PLACA", "NOMBRES Y APELLIDOS")
+    FILTROS = ("ESTADO", "EMPRESA", "TIPO DE TRANSPORTE")
+    NUMERICAS = ("CEDULA", "TARJETA DE PROPIEDAD")
+
+    def __init__(self, df, dias=None):
+        df = df.fillna("")
+        # CEDULA y TARJETA se buscan, ordenan y muestran como enteros; al exportar
+        # y seleccionar salen tal como están guardadas (normalizar deja en blanco "LT99X")
+        normalizado = df.copy(deep=False)
+        for col in self.NUMERICAS:
+            if col in df.columns:
+                normalizado[col] = normalizar_enteros(df[col])[0]
+        self._df = df
+        self._normalizado = normalizado
+        self._columnas = {col: df[col].to_numpy(dtype=object) for col in df.columns}
+        self._vista = self._columnas | {col: normalizado[col].to_numpy(dtype=object)
+                                        for col in self.NUMERICAS if col in df.columns}
+        self._vacio = np.empty(0, dtype=np.intp)
+
+        self._prefijos = {}
+        for col in self.PREFIJOS:
+            valores = normalizado[col].astype(str).str.strip().str.upper()
+            # Se indexa el valor completo y cada palabra (para buscar nombres por apellido)
+            tokens = pd.concat([valores, valores.str.split().explode()]).dropna()
+            tokens = tokens[tokens != ""]
+            claves = tokens.to_numpy(dtype=str)
+            orden = np.argsort(claves, kind="stable")
+            self._prefijos[col] = (claves[orden], tokens.index.to_numpy(dtype=np.intp)[orden])
+
+        self._filtros = {
+            col: df.groupby(normalizado[col].astype(str).str.strip().str.upper()).indices
+            for col in self.FILTROS
+        }
+        self._dias = dias or {}
+        self._ordenes = {}
+
+    def __len__(self):
+        return len(self._df)
+
+    def _prefijo(self, col, texto):
+        claves, posiciones = self._prefijos[col]
+        inicio = np.searchsorted(claves, texto, side="left")
+        fin = np.searchsorted(claves, texto + "\uffff", side="left")
+        return posiciones[inicio:fin]
+
+    def _orden(self, col):
+        orden = self._ordenes.get(col)
+        if orden is None:
+            valores = self._normalizado[col]
+            if col == "ID":
+                valores = pd.to_numeric(valores, errors="coerce").fillna(-1).to_numpy()
+            else:
+                valores = valores.astype(str).str.upper().to_numpy(dtype=str)
+            orden = np.argsort(valores, kind="stable")
+            self._ordenes[col] = orden
+        return orden
+
+    def _posiciones(self, texto, filtros, rangos, orden, descendente):
+        """Posiciones de las filas que cumplen la búsqueda, en el orden pedido."""
+        n = len(self._df)
+        mascara = None
+        texto = (texto or "").strip().upper()
+        if texto:
+            mascara = np.zeros(n, dtype=bool)
+            for col in self.PREFIJOS:
+                mascara[self._prefijo(col, texto)] = True
+        for col, valor in (filtros or {}).items():
+            if not valor:
+                continue
+            coincide = np.zeros(n, dtype=bool)
+            coincide[self._filtros[col].get(valor.strip().upper(), self._vacio)] = True
+            mascara = coincide if mascara is None else mascara & coincide
+        for col, (desde, hasta) in (rangos or {}).items():
+            if desde is None and hasta is None:
+                continue
+            dias = self._dias[col]
+            coincide = dias != SIN_DIA
+            if desde is not None:
+                coincide &= dias >= dia(desde)
+            if hasta is not None:
+                coincide &= dias <= dia(hasta)
+            mascara = coincide if mascara is None else mascara & coincide
+
+        posiciones = self._orden(orden)
+        if descendente:
+            posiciones = posiciones[::-1]
+        if mascara is not None:
+            posiciones = posiciones[mascara[posiciones]]
+        return posiciones
+
+    def buscar(self, texto=None, filtros=None, orden="ID", descendente=False, offset=0, limit=50, rangos=None):
+        """Devuelve (total, filas de la página) para la búsqueda indicada."""
+        posiciones = self._posiciones(texto, filtros, rangos, orden, descendente)
+        pagina = posiciones[offset:offset + limit]
+        return len(posiciones), _filas(self._vista, pagina)
+
+    def seleccionar(self, ids=None, placas=None, texto=None, filtros=None, rangos=None):
+        """Filas (DataFrame) que cumplen la búsqueda y, si se indican, cuyo ID o PLACA está en la lista.
+
+        Las listas se resuelven con una sola pasada de pertenencia a un
+        conjunto sobre las filas que ya pasaron los filtros.
+        """
+        posiciones = self._posiciones(texto, filtros, rangos, "ID", False)
+        for col, valores in (("ID", ids), ("PLACA", placas)):
+            if valores is None:
+                continue
+            buscados = {str(v).strip().upper() for v in valores}
+            columna = pd.Series(self._columnas[col][posiciones]).astype(str).str.strip().str.upper()
+            posiciones = posiciones[columna.isin(buscados).to_numpy()]
+        return self._df.iloc[posiciones]
+
+    def recorrer(self, columnas, texto=None, filtros=None, rangos=None, orden="ID", descendente=False, lote=1000):
+        """(total, generador de lotes) con todas las filas de la búsqueda, para exportar.
+
+        Cada fila es una tupla con los valores de `columnas` en ese orden, tal
+        como están guardados. Las filas se arman recién cuando se pide cada
+        lote, así que la memoria no crece con el tamaño del resultado.
+        """
+        posiciones = self._posiciones(texto, filtros, rangos, orden, descendente)
+        vacia = np.full(len(self._df), "", dtype=object)
+        valores = [self._columnas.get(col, vacia) for col in columnas]
+
+        def lotes():
+            for inicio in range(0, len(posiciones), lote):
+                bloque = posiciones[inicio:inicio + lote]
+                yield list(zip(*(v[bloque] for v in valores)))
+
+        return len(posiciones), lotes()
+
+
+class RegistryCache:
+    """Caché en memoria del registro con un índice hash por ID.
+
+    El archivo se lee una sola vez por proceso y se vuelve a cargar sólo cuando
+    cambia su fecha de modificación (por ejemplo, si otro worker lo reescribe)
+    o cuando se marca como desactualizada. Las escrituras de este proceso se
+    aplican con `aplicar`, fila a fila, sin releer el registro. Si el
+    almacenamiento no cabe en un solo archivo, `marca` indica cuándo cambió.
+    """
+
+    def __init__(self, path, loader, marca=None):
+        self.path = path
+        self._loader = loader
+        self._marca = marca
+        self._lock = threading.Lock()
+        self._lock_consulta = threading.Lock()
+        self._generacion = 0  # Sube cada vez que cambian las filas o ESTADO
+        self._mtime = None
+        self._stale = True
+        self._df = None
+        self._columnas = {}
+        self._index = {}
+        self._consulta = None
+
+    def _file_mtime(self):
+        if self._marca is not None:
+            return self._marca()
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _is_fresh(self, mtime):
+        return not self._stale and mtime == self._mtime
+
+    def _load(self):
+        """Recarga el archivo si la caché está vacía o desactualizada."""
+        if self._is_fresh(self._file_mtime()):
+            return
+        with self._lock:
+            mtime = self._file_mtime()
+            if self._is_fresh(mtime):
+                return
+            self._set(normalizar_registro(self._loader()), mtime)
+
+    def _set(self, df, mtime, dias=None, index=None):
+        """Publica una versión nueva del registro; `dias` (SOAT, TECNOMECANICA) e `index` se recalculan si faltan."""
+        if index is None:
+            ids = df["ID"]
+            presentes = ids.notna().to_numpy()
+            index = dict(zip(ids[presentes].astype(str).str.strip(), np.flatnonzero(presentes).tolist()))
+        columnas = {col: df[col].to_numpy(dtype=object) for col in df.columns}
+
+        # Índice de vencimientos: ESTADO se deriva de las fechas al leer, no del valor guardado
+        soat, tecnomecanica = dias or (dias_fecha(df["SOAT"]), dias_fecha(df["TECNOMECANICA"]))
+        vence = np.minimum(soat, tecnomecanica)
+        orden_vence = np.argsort(vence, kind="stable")
+        hoy = _hoy()
+        columnas["ESTADO"] = np.where(vence >= hoy, "Activo", "Inactivo").astype(object)
+
+        # Se reemplazan las referencias completas para que los lectores nunca vean un estado a medias
+        self._df = df
+        self._columnas = columnas
+        self._index = index
+        self._vence = vence
+        self._soat = soat
+        self._tecnomecanica = tecnomecanica
+        self._orden_vence = orden_vence
+        self._vence_ordenado = vence[orden_vence]
+        self._dia = hoy
+        self._consulta = None
+        self._generacion += 1
+        self._mtime = mtime
+        self._stale = False
+
+    def _al_dia(self):
+        """Recarga si hace falta y pasa a Inactivo las filas que vencieron desde la última evaluación.
+
+        Sólo se tocan las k filas cuyo vencimiento cayó entre el día evaluado y
+        hoy, ubicadas por búsqueda binaria en el índice de vencimientos.
+        """
+        self._load()
+        hoy = _hoy()
+        if hoy == self._dia:
+            return
+        with self._lock:
+            if hoy > self._dia:
+                inicio = np.searchsorted(self._vence_ordenado, self._dia, side="left")
+                fin = np.searchsorted(self._vence_ordenado, hoy, side="left")
+                self._columnas["ESTADO"][self._orden_vence[inicio:fin]] = "Inactivo"
+            elif hoy < self._dia:
+                # El reloj retrocedió: se reevalúa todo
+                self._columnas["ESTADO"] = np.where(self._vence >= hoy, "Activo", "Inactivo").astype(object)
+            self._dia = hoy
+            self._consulta = None
+            self._generacion += 1
+
+    def _df_actual(self):
+        return self._df.assign(ESTADO=self._columnas["ESTADO"])
+
+    def dataframe(self):
+        """Devuelve una copia del registro completo, con ESTADO evaluado a la fecha de hoy."""
+        self._al_dia()
+        return self._df_actual()
+
+    def get(self, id_):
+        """Busca un registro por ID en O(1). Devuelve un dict o None."""
+        self._al_dia()
+        columnas, pos = self._columnas, self._index.get(str(id_).strip())
+        if pos is None:
+            return None
+        return {col: valores[pos] for col, valores in columnas.items()}
+
+    def get_many(self, ids, dias=None):
+        """Busca varios IDs en una sola pasada. Devuelve una lista alineada con `ids` (None si no existe).
+
+        Si se pasa `dias` (días desde 1970, uno por ID), ESTADO se evalúa a esa
+        fecha en lugar de hoy, con el índice de vencimientos.
+        """
+        self._al_dia()
+        columnas, index, vence = self._columnas, self._index, self._vence
+        resultado = []
+        for i, id_ in enumerate(ids):
+            pos = index.get(str(id_).strip())
+            if pos is None:
+                resultado.append(None)
+                continue
+            fila = {col: valores[pos] for col, valores in columnas.items()}
+            if dias is not None:
+                fila["ESTADO"] = "Activo" if vence[pos] >= dias[i] else "Inactivo"
+            resultado.append(fila)
+        return resultado
+
+    def vencimientos(self, desde, hasta):
+        """Filas cuya primera fecha de vencimiento cae entre `desde` y `hasta` (inclusive), en orden."""
+        self._al_dia()
+        inicio = np.searchsorted(self._vence_ordenado, dia(desde), side="left")
+        fin = np.searchsorted(self._vence_ordenado, dia(hasta), side="right")
+        posiciones = self._orden_vence[inicio:fin]
+        filas = _filas(self._columnas, posiciones)
+        for fila, vence in zip(filas, self._vence[posiciones]):
+            fila["VENCE"] = fecha_de_dia(vence).strftime("%Y/%m/%d")
+        return filas
+
+    def proyeccion(self, ids=None):
+        """Columnas que necesita un validador sin conexión: ID, días de SOAT y TECNOMECANICA y si hay placa.
+
+        Con `ids` se limita a esos registros; los que ya no existen se
+        devuelven en "borrados".
+        """
+        self._al_dia()
+        df = self._df
+        if ids is None:
+            posiciones = np.flatnonzero(df["ID"].notna().to_numpy())
+            borrados = []
+        else:
+            encontrados = [(id_, self._index.get(str(id_))) for id_ in ids]
+            posiciones = np.array([pos for _, pos in encontrados if pos is not None], dtype=np.intp)
+            borrados = [id_ for id_, pos in encontrados if pos is None]
+        return {
+            "ids": pd.to_numeric(df["ID"].iloc[posiciones]).to_numpy(dtype=np.int64),
+            "soat": self._soat[posiciones],
+            "tecnomecanica": self._tecnomecanica[posiciones],
+            "placa_presente": placa_presente(df["PLACA"].iloc[posiciones]),
+            "borrados": borrados,
+        }
+
+    def consulta(self):
+        """Índices de consulta de la versión actual del registro (se construyen al primer uso).
+
+        Se construyen fuera de `_lock`, sobre una copia de la versión actual,
+        para no frenar mientras tanto las lecturas por ID ni las escrituras; se
+        publican sólo si el registro no cambió en medio. Un solo hilo construye
+        a la vez y los demás esperan su resultado.
+        """
+        self._al_dia()
+        consulta = self._consulta
+        if consulta is not None:
+            return consulta
+        with self._lock_consulta:
+            with self._lock:
+                if self._consulta is not None:
+                    return self._consulta
+                generacion = self._generacion
+                # ESTADO se copia porque _al_dia lo modifica en su lugar
+                df = self._df.assign(ESTADO=self._columnas["ESTADO"].copy())
+                dias = {"SOAT": self._soat, "TECNOMECANICA": self._tecnomecanica, "VENCE": self._vence}
+            consulta = IndiceConsulta(df, dias)
+            with self._lock:
+                if generacion == self._generacion:
+                    self._consulta = consulta
+            return consulta
+
+    def refresh(self, df, marcas=None):
+        """Actualiza la caché con el DataFrame recién guardado, sin volver a leer el archivo.
+
+        `marcas` son las (antes, después) de la escritura; sin ellas se toma la marca actual.
+        """
+        with self._lock:
+            self._set(normalizar_registro(df), marcas[1] if marcas else self._file_mtime())
+
+    def aplicar(self, filas=(), eliminados=(), marcas=None):
+        """Aplica a la caché las filas insertadas o actualizadas y los IDs eliminados por este proceso.
+
+        `filas` son los registros completos tal como quedaron guardados. Sólo
+        se parsean las fechas de esas filas; el resto de las columnas, los días
+        y el índice por ID se copian de la versión actual. Si la caché todavía
+        no se cargó, no hay nada que actualizar: la primera consulta lee todo.
+
+        `marcas` son las (antes, después) que tomó el almacenamiento dentro de
+        la escritura. Si la de antes no es la de la caché, otro worker escribió
+        en medio y sus cambios no están aquí: la caché se marca desactualizada
+        en vez de quedar con la marca nueva y sin esos cambios.
+        """
+        with self._lock:
+            if self._df is None or self._stale or marcas is None or marcas[0] != self._mtime:
+                self._stale = True
+                return
+            df, index = self._df, self._index
+            nuevas = normalizar_registro(pd.DataFrame(list(filas), columns=df.columns))
+            posiciones = np.array([index.get(str(id_).strip(), -1) for id_ in nuevas["ID"]], dtype=np.intp)
+            existentes = posiciones >= 0
+            borrar = [index[i] for i in (str(id_).strip() for id_ in eliminados) if i in index]
+            conservar = None
+            if borrar:
+                conservar = np.ones(len(df), dtype=bool)
+                conservar[borrar] = False
+
+            def combinar(actuales, cambiados):
+                # Reemplaza las filas actualizadas, quita las eliminadas y agrega las nuevas al final
+                valores = actuales.copy()
+                valores[posiciones[existentes]] = cambiados[existentes]
+                if conservar is not None:
+                    valores = valores[conservar]
+                return np.concatenate([valores, cambiados[~existentes]])
+
+            # Se parte de las columnas ya extraídas (ESTADO se vuelve a derivar de las fechas en _set)
+            columnas = {col: combinar(self._columnas[col], nuevas[col].to_numpy(dtype=object)) for col in df.columns}
+            dias = (combinar(self._soat, dias_fecha(nuevas["SOAT"])),
+                    combinar(self._tecnomecanica, dias_fecha(nuevas["TECNOMECANICA"])))
+            if conservar is None:
+                index = dict(index)
+            else:
+                # Las filas que siguen a una eliminada se corren tantos lugares como eliminadas haya antes
+                claves = np.array(list(index), dtype=object)
+                previas = np.fromiter(index.values(), dtype=np.intp, count=len(index))
+                vivas = conservar[previas]
+                corridas = previas - np.cumsum(~conservar)[previas]
+                index = dict(zip(claves[vivas].tolist(), corridas[vivas].tolist()))
+            inicio = len(df) - len(borrar)
+            index.update(zip(nuevas["ID"][~existentes].astype(str).str.strip(),
+                             range(inicio, inicio + int((~existentes).sum()))))
+            self._set(pd.DataFrame(columnas, columns=df.columns, dtype=object), marcas[1], dias, index)
+
+    def invalidate(self):
+        """Marca la caché como desactualizada; se recarga en la próxima consulta."""
+        self._stale = True
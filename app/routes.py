@@ -1,20 +1,61 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
-from functools import wraps
+from flask import (Request, Response, render_template, request, redirect, url_for, flash, jsonify, session,
+                   stream_template, stream_with_context)
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, wraps
 import pandas as pd
-import qrcode
+import io
 import os
-from datetime import datetime
-import bcrypt
+import time
+from datetime import datetime, timedelta
+import threading
 from werkzeug.utils import secure_filename
+from .registry import RegistryCache, dia
+from .storage import open_storage
+from .importacion import (ArchivoDemasiadoGrande, LotesEnDisco, clasificar_lote, columna_estado, leer_excel_por_lotes,
+                          revalidar_lote)
+from .jobs import JobManager
+from .normalizacion import convert_date
+from .sincronizacion import VersionLog, codificar
+from .firma import FirmaQR, QRInvalido, es_firmado
+from .qr import CacheQR, etag, render_png, zip_en_streaming
+from .exportacion import csv_en_streaming, xlsx_en_streaming
+from .metricas import metricas
+from .usuarios import AlmacenUsuarios, Saturado, VerificadorContrasenas
+from .accesos import BitacoraAccesos
 
 # =======================
 # Configuraciones y Constantes
 # =======================
-DATABASE_FILE = "BASE SOAT.xlsx"
+DATABASE_FILE = "BASE SOAT.xlsx"  # Sólo para importar/exportar cuando se usa SQLite
+DATABASE_DB = "registro.db"
+VERSIONES_DB = "versiones.db"  # Versión del registro y bitácora de cambios para los validadores sin conexión
+ACCESOS_DB = "accesos.db"  # Bitácora de validaciones en las puertas y sus resúmenes por hora y por día
+ACCESOS_VACIAR_CADA = 1  # Segundos máximos que un evento de acceso espera en memoria antes de escribirse
+STORAGE_BACKEND = os.environ.get("REGISTRO_BACKEND", "sqlite")  # "sqlite" o "excel"
 USUARIOS = "ul.xlsx"
 SHEET_NAME = "Sheet1"  # Hoja para la base de datos principal
-QR_FOLDER = os.path.join(os.getcwd(), 'static', 'qr_codes')
 ALLOWED_EXTENSIONS = ['xls', 'xlsx']
+TEMP_FOLDER = 'temp'
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+MAX_UPLOAD_ROWS = int(os.environ.get("MAX_UPLOAD_ROWS", 200000))
+UPLOAD_CHUNK_ROWS = 5000
+JOBS_FOLDER = os.path.join(TEMP_FOLDER, 'jobs')
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+QR_CACHE_ITEMS = int(os.environ.get("QR_CACHE_ITEMS", 512))  # PNGs de QR recientes que se guardan en memoria
+QR_MAX_AGE = 300  # Segundos que el navegador puede reutilizar un QR sin volver a preguntar
+MAX_QR_EXPORT = 5000  # Registros por exportación de QR (ZIP o impresión)
+EXPORT_CHUNK_ROWS = 2000  # Filas por bloque enviado al exportar el registro
+MAX_ESCANEOS_LOTE = 500  # Escaneos por petición en /procesar_qr/lote
+MAX_CUADROS_VIDEO = int(os.environ.get("MAX_CUADROS_VIDEO", 30))  # Cuadros que se toman de cada video subido
+MAX_CUADROS_PETICION = 120  # Cuadros por petición en /procesar_qr/imagenes, sumando todos los archivos
+QR_DECODIFICADORES = int(os.environ.get("QR_DECODIFICADORES", 0)) or None  # Procesos que leen QR de fotos (None = núcleos)
+LOGIN_WORKERS = int(os.environ.get("LOGIN_WORKERS", os.cpu_count() or 2))  # Hilos que verifican contraseñas con bcrypt
+LOGIN_MAX_PENDIENTES = int(os.environ.get("LOGIN_MAX_PENDIENTES", 64))  # Inicios de sesión en curso o en cola; más allá, 503
+USUARIOS_REVISAR_CADA = 2  # Segundos entre revisiones de cambios en el archivo de usuarios
+QR_KEY_FILE = os.environ.get("QR_KEY_FILE", "qr_firma.pem")  # Clave privada con la que se firman los QR
+# Los QR antiguos ("ID: <número>") no llevan firma; se pueden rechazar con QR_ACEPTAR_LEGADO=0
+QR_ACEPTAR_LEGADO = os.environ.get("QR_ACEPTAR_LEGADO", "1") != "0"
 
 # Columnas estandarizadas para el Excel
 COLUMNS = [
@@ -24,6 +65,10 @@ COLUMNS = [
     "TECNOMECANICA", "OBSERVACIONES"
 ]
 
+# Campos que admite la actualización masiva: la clave (CEDULA, TIPO DE TRANSPORTE)
+# es única por fila y ESTADO se deriva de las fechas
+CAMPOS_LOTE = [c for c in COLUMNS if c not in ("ID", "ESTADO", "CEDULA", "TIPO DE TRANSPORTE")]
+
 # Formato de fechas
 INPUT_DATE_FORMAT = "%Y-%m-%d"
 OUTPUT_DATE_FORMAT = "%Y/%m/%d"
@@ -54,55 +99,43 @@ def roles_required(*roles):
         return decorated_function
     return decorator
 
-def convert_date(value):
-    """Convierte una fecha a formato AAAA/MM/DD asegurando que el input sea siempre una cadena."""
-    try:
-        if pd.notnull(value):
-            # Si ya es un Timestamp, lo formateamos directamente.
-            if isinstance(value, pd.Timestamp):
-                return value.strftime("%Y/%m/%d")
-            date_str = str(value).strip()
-            # Intentar primero con formato dd/mm/yyyy
-            for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
-                try:
-                    return datetime.strptime(date_str, fmt).strftime("%Y/%m/%d")
-                except ValueError:
-                    pass
-    except Exception:
-        pass
-    return ""
-
-def convert_to_int_str(valor):
-    """Convierte un valor numérico a cadena sin decimales."""
-    try:
-        if pd.notnull(valor) and str(valor).strip() != '':
-            return str(int(float(valor)))
-    except Exception:
-        pass
-    return ''
-
+# Almacenamiento del registro y caché compartida por todo el proceso
+storage = open_storage(STORAGE_BACKEND, DATABASE_DB, DATABASE_FILE, SHEET_NAME)
+# La lectura completa del almacenamiento (el parseo del Excel, con ese backend) se mide como tramo aparte
+registry = RegistryCache(storage.path, metricas.medir("storage.load")(storage.load), getattr(storage, "marca", None))
+jobs = JobManager(JOBS_FOLDER)
+versiones = VersionLog(VERSIONES_DB)
+if hasattr(storage, "al_compactar"):
+    # Compactar el diario del Excel cambia la marca sin cambiar el registro: se anota como una versión vacía
+    storage.al_compactar = lambda marcas: versiones.registrar(marcas=marcas)
+accesos = BitacoraAccesos(ACCESOS_DB, ACCESOS_VACIAR_CADA)
+firma = FirmaQR(QR_KEY_FILE)
+cache_qr = CacheQR(QR_CACHE_ITEMS)
+usuarios = AlmacenUsuarios(USUARIOS, VerificadorContrasenas(LOGIN_WORKERS, LOGIN_MAX_PENDIENTES), USUARIOS_REVISAR_CADA)
+
+# Última proyección de validación codificada, por (versión, marca del almacenamiento, día)
+_proyeccion = {"clave": None, "datos": None}
+_proyeccion_lock = threading.Lock()
+
+@metricas.medir("load_database")
 def load_database():
-    """Carga la base de datos del Excel usando el formato y hoja definidos."""
-    try:
-        df = pd.read_excel(DATABASE_FILE, sheet_name=SHEET_NAME, dtype=str)
-    except Exception:
-        df = pd.DataFrame(columns=COLUMNS)
-    return df
+    """Carga la base de datos desde la caché en memoria (se relee el almacenamiento sólo si cambió)."""
+    return registry.dataframe()
 
+@metricas.medir("save_database")
 def save_database(df):
-    """Guarda el DataFrame en el archivo Excel usando la hoja definida."""
-    with pd.ExcelWriter(DATABASE_FILE, engine="openpyxl", mode="w") as writer:
-        df.to_excel(writer, sheet_name=SHEET_NAME, index=False)
+    """Reemplaza el registro completo y actualiza la caché."""
+    storage.replace_all(df)
+    registry.refresh(df, storage.ultima_escritura())
+    versiones.reiniciar(storage.ultima_escritura())
 
-def obtener_nuevo_id(df):
-    """Genera un ID auto-incrementable, iniciando en 8000000."""
-    if "ID" in df.columns and not df.empty:
-        try:
-            max_id = df["ID"].dropna().astype(int).max()
-            return max(max_id + 1, 8000000)
-        except:
-            return 8000000
-    return 8000000
+def aplicar_escritura(ids=(), eliminados=()):
+    """Lleva a la caché las filas recién insertadas o actualizadas (releídas por ID) y las eliminadas.
+
+    Se llama justo después de la escritura, en el mismo hilo, para usar sus marcas.
+    """
+    marcas = storage.ultima_escritura()
+    registry.aplicar(storage.get_many(ids).values() if ids else (), eliminados, marcas)
 
 def allowed_file(filename):
     """Verifica que el archivo tenga extensión Excel permitida."""
@@ -118,11 +151,256 @@ def calcular_estado(soat, tecnomecanica):
     except ValueError:
         return "Inactivo"  # Si hay un error con la fecha, se marca como "Inactivo"
 
+def extraer_id_qr(qr_data):
+    """Obtiene el ID de un código QR con formato 'ID: <número>'. Devuelve None si no lo tiene."""
+    for line in str(qr_data).split("\n"):
+        if "ID:" in line:
+            return line.split("ID:", 1)[1].strip() or None
+    return None
+
+def leer_qr(qr_data):
+    """Devuelve el ID del QR y, si viene firmado, sus campos verificados (o None para el formato antiguo).
+
+    La firma se comprueba sin consultar el registro; lanza QRInvalido si no
+    corresponde o si el QR no tiene firma y los QR antiguos están deshabilitados.
+    """
+    if es_firmado(qr_data):
+        campos = firma.verificar(qr_data)
+        return campos["ID"], campos
+    if not QR_ACEPTAR_LEGADO:
+        raise QRInvalido("Los QR sin firma no están permitidos.")
+    return extraer_id_qr(qr_data), None
+
+def resultado_acceso(id_usuario, usuario):
+    """Arma la respuesta de validación de un escaneo a partir del registro encontrado."""
+    if usuario is None:
+        return {"message": "Usuario no encontrado.", "motivo": "no_encontrado"}
+
+    # Se valida si la placa es una cadena vacía, "none" o "nan"
+    placa = usuario["PLACA"]
+    placa_str = str(placa).strip().lower() if placa is not None else ""
+    if placa_str in ["", "none", "nan"]:
+        return {"message": "❌ Acceso denegado: Datos incompletos", "motivo": "datos_incompletos"}
+
+    estado = usuario["ESTADO"]
+    mensaje = "✅ Acceso permitido" if estado == "Activo" else "❌ Acceso denegado"
+    datos = {
+        "ID": id_usuario,
+        "Cédula": usuario["CEDULA"],
+        "Nombre": usuario["NOMBRES Y APELLIDOS"],
+        "Placa": usuario["PLACA"],
+        "Estado": estado
+    }
+    if estado != "Activo":
+        return {"message": mensaje, "data": datos, "motivo": "vencido"}
+    return {"message": mensaje, "data": datos}
+
+@lru_cache(maxsize=1)
+def decodificador():
+    """Decodificador de QR en fotos; OpenCV se importa con la primera foto, no al arrancar el worker."""
+    from .decodificacion import Decodificador
+    return Decodificador(QR_DECODIFICADORES)
+
+def validar_escaneos(escaneos):
+    """(ID, resultado) de cada escaneo (texto del QR, fecha en que se hizo); lo usan todas las rutas de validación.
+
+    Las fechas firmadas en el QR se comprueban sin consultar el registro: un
+    QR vencido no sigue adelante. Para el resto se consulta el índice en
+    memoria, en una sola pasada, por revocaciones (registro borrado o con
+    fechas cambiadas) y por los datos; ESTADO se evalúa a la fecha del escaneo.
+    """
+    salida = [None] * len(escaneos)
+    pendientes, ids, dias = [], [], []
+    for i, (qr_data, fecha) in enumerate(escaneos):
+        # Extraer el ID del QR (y verificar la firma si la trae)
+        try:
+            id_usuario, campos = leer_qr(qr_data)
+        except QRInvalido:
+            salida[i] = None, {"message": "❌ Acceso denegado: QR inválido", "motivo": "qr_invalido"}
+            continue
+        if not id_usuario:
+            salida[i] = None, {"message": "No se encontró el ID en el QR.", "motivo": "sin_id"}
+            continue
+        if campos is not None and not firma.vigente(campos, fecha):
+            salida[i] = id_usuario, {"message": "❌ Acceso denegado: QR vencido", "motivo": "vencido"}
+            continue
+        pendientes.append((i, campos is not None))
+        ids.append(id_usuario)
+        dias.append(dia(fecha))
+
+    for (i, firmado), id_usuario, usuario in zip(pendientes, ids, registry.get_many(ids, dias)):
+        if firmado and usuario is None:
+            salida[i] = id_usuario, {"message": "❌ Acceso denegado: QR revocado", "motivo": "qr_revocado"}
+        else:
+            salida[i] = id_usuario, resultado_acceso(id_usuario, usuario)
+    return salida
+
+def validar_escaneo(qr_data):
+    """(ID, resultado) de validar el texto de un QR escaneado, a la fecha de hoy."""
+    return validar_escaneos([(qr_data, datetime.today().date())])[0]
+
+def registrar_acceso(id_usuario, resultado, puerta=None, momento=None):
+    """Anota una validación en la bitácora de accesos; sólo la encola, no espera al disco."""
+    motivo = resultado.get("motivo")
+    accesos.registrar(id_usuario, "denegado" if motivo else "permitido", motivo, session.get("username"),
+                      str(puerta)[:64] if puerta else None, momento)
+
+def momento_escaneo(valor):
+    """Fecha y hora local de un escaneo: texto ISO 8601 o milisegundos desde 1970 (Date.now() en el navegador)."""
+    if valor is None or valor == "":
+        return datetime.now()
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return datetime.fromtimestamp(valor / 1000)
+    momento = datetime.fromisoformat(str(valor).strip())
+    # Con zona horaria se pasa a la hora local del servidor, que es la que usa el registro
+    return momento.astimezone().replace(tzinfo=None) if momento.tzinfo else momento
+
+def respuesta_proyeccion(datos, version):
+    """Respuesta binaria de la proyección de validación con la versión en las cabeceras."""
+    respuesta = Response(datos, mimetype="application/octet-stream")
+    respuesta.headers["X-Registro-Version"] = str(version)
+    return respuesta
+
+def proyeccion_completa():
+    """Proyección de validación de todo el registro; se codifica una vez por versión y día."""
+    # La versión se lee antes que el registro: si hay una escritura en medio, el
+    # cliente la vuelve a recibir en el próximo delta en lugar de perderla. La marca
+    # del almacenamiento entra en la clave por las escrituras que no llegaron a la bitácora
+    version = versiones.actual()
+    clave = (version, storage.marca(), dia(datetime.today().date()))
+    with _proyeccion_lock:
+        if _proyeccion["clave"] != clave:
+            columnas = registry.proyeccion()
+            _proyeccion["datos"] = codificar(version, clave[2], columnas["ids"], columnas["soat"],
+                                             columnas["tecnomecanica"], columnas["placa_presente"])
+            _proyeccion["clave"] = clave
+        return version, _proyeccion["datos"]
+
+def contenido_qr(usuario):
+    """Texto firmado del QR de un registro.
+
+    Se firma con la hora de inicio del día: durante el día el contenido (y
+    con él la imagen y su ETag) sólo cambia si cambian el ID o las fechas.
+    """
+    emitido = int(time.time()) // 86400 * 86400
+    return firma.firmar(usuario["ID"], usuario["SOAT"], usuario["TECNOMECANICA"], emitido=emitido)
+
+def ids_seleccionados():
+    """IDs enviados en el formulario (selected_ids), sin repetir y en el orden recibido."""
+    return list(dict.fromkeys(i.strip() for i in request.form.getlist('selected_ids') if i.strip()))
+
+def qrs_exportados(usuarios):
+    """Pares (nombre de archivo, PNG) de los registros, generados uno a uno al recorrerlos."""
+    for usuario in usuarios:
+        # No pasan por la caché LRU: una exportación grande la vaciaría
+        yield f"{usuario['ID']}_{usuario['CEDULA']}.png", render_png(contenido_qr(usuario))
+
+def rango_fechas(prefijo, origen=None):
+    """Rango (desde, hasta) de los parámetros <prefijo>_desde y <prefijo>_hasta (AAAA-MM-DD, opcionales).
+
+    Se leen de la query string o, si se pasa `origen`, de ese diccionario.
+    """
+    origen = request.args if origen is None else origen
+    return tuple(
+        datetime.strptime(valor, INPUT_DATE_FORMAT).date() if valor else None
+        for valor in (str(origen.get(f"{prefijo}_{lado}") or "").strip() for lado in ("desde", "hasta"))
+    )
+
+def campos_lote(campos):
+    """Valida y normaliza el parche de una mutación masiva. Lanza ValueError con el mensaje para el usuario."""
+    if not isinstance(campos, dict) or not campos:
+        raise ValueError("Indica los campos a actualizar.")
+    no_permitidos = [col for col in campos if col not in CAMPOS_LOTE]
+    if no_permitidos:
+        raise ValueError(f"No se pueden actualizar en lote: {', '.join(map(str, no_permitidos))}.")
+    normalizados = {}
+    for col, valor in campos.items():
+        valor = "" if valor is None else str(valor).strip()
+        if col in ("SOAT", "TECNOMECANICA"):
+            try:
+                # Se acepta también la fecha ya en el formato del registro
+                valor = datetime.strptime(valor, OUTPUT_DATE_FORMAT).strftime(OUTPUT_DATE_FORMAT)
+            except ValueError:
+                valor = convert_date(valor)
+            if not valor:
+                raise ValueError(f"Fecha inválida en {col}.")
+        normalizados[col] = valor
+    return normalizados
+
+def cambios_por_fila(objetivo, campos):
+    """ID -> campos a escribir; ESTADO se recalcula sólo en las filas tocadas y sólo si cambian sus fechas."""
+    ids = objetivo["ID"].tolist()
+    if "SOAT" not in campos and "TECNOMECANICA" not in campos:
+        return {id_: campos for id_ in ids}
+    soat = pd.Series(campos["SOAT"], index=objetivo.index) if "SOAT" in campos else objetivo["SOAT"]
+    tecnomecanica = (pd.Series(campos["TECNOMECANICA"], index=objetivo.index)
+                     if "TECNOMECANICA" in campos else objetivo["TECNOMECANICA"])
+    estados = columna_estado(soat, tecnomecanica)
+    return {id_: dict(campos, ESTADO=estado) for id_, estado in zip(ids, estados)}
+
+def procesar_cargue(job_id, contenido, nombre):
+    """Trabajo en segundo plano del cargue masivo: valida por lotes e inserta en una sola transacción.
+
+    El archivo se lee, normaliza y clasifica sin bloquear la escritura; los
+    lotes aceptados esperan en un temporal. Después se abre la transacción
+    sólo para insertarlos, volviendo a comprobar las claves que otro worker
+    haya registrado mientras tanto.
+    """
+    vistos = set()
+    rechazadas = []
+    procesadas = 0
+
+    def lotes_aceptados(pendientes):
+        # Corre dentro de la transacción de insert_chunks: las claves se leen ya con la escritura bloqueada
+        existentes = storage.claves()
+        for aceptados in pendientes:
+            aceptados, reporte = revalidar_lote(aceptados, existentes)
+            rechazadas.extend(reporte.to_dict(orient='records'))
+            yield aceptados.to_dict(orient='records')
+
+    try:
+        with LotesEnDisco() as pendientes:
+            existentes = storage.claves()
+            for lote in leer_excel_por_lotes(contenido, nombre, UPLOAD_CHUNK_ROWS, MAX_UPLOAD_ROWS):
+                aceptados, reporte = clasificar_lote(lote, existentes, vistos, COLUMNS)
+                rechazadas.extend(reporte.to_dict(orient='records'))
+                pendientes.agregar(aceptados)
+                procesadas += len(lote)
+                jobs.update(job_id, filas_procesadas=procesadas)
+            # Todo queda en una sola transacción: si falla antes de confirmar, no queda ninguna fila guardada
+            nuevos_ids = storage.insert_chunks(lotes_aceptados(pendientes))
+    except ArchivoDemasiadoGrande:
+        raise
+    except Exception as e:
+        raise ValueError(f'Error al procesar el archivo: {e}')
+    aplicar_escritura(nuevos_ids)
+    if nuevos_ids:
+        versiones.registrar(desde=nuevos_ids[0], hasta=nuevos_ids[-1], marcas=storage.ultima_escritura())
+    jobs.update(job_id, total_filas=procesadas)
+
+    return {
+        "agregados": len(nuevos_ids),
+        "duplicados": sum(1 for r in rechazadas if r['resultado'] == 'duplicado'),
+        "invalidos": sum(1 for r in rechazadas if r['resultado'] == 'invalido'),
+        # Los IDs se asignan en bloque contiguo, en el mismo orden de las filas aceptadas
+        "ids": {"desde": nuevos_ids[0], "hasta": nuevos_ids[-1]} if nuevos_ids else None,
+        "filas": rechazadas
+    }
+
 # =======================
 # Rutas de la Aplicación
 # =======================
 
+class UploadRequest(Request):
+    """Request que mantiene los archivos subidos en memoria en lugar de volcarlos a un temporal."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 def init_routes(app):
+    app.request_class = UploadRequest
+    # Flask rechaza con 413 cualquier petición más grande, antes de leer el cuerpo
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
 
     @app.route('/index')
     def index():
@@ -152,22 +430,15 @@ def init_routes(app):
             soat = convert_date(soat_input)
             tecnomecanica = convert_date(tecnomecanica_input)
 
-            # Cargar la base de datos
-            df = load_database()
-
             # Validar que no exista ya un registro para esa cédula y ese tipo de transporte
-            if not df[(df["CEDULA"].astype(str) == cedula) & (df["TIPO DE TRANSPORTE"] == transporte)].empty:
+            if storage.exists(cedula, transporte):
                 flash("Error: Ya se ha registrado un vehículo de este tipo para esta cédula.", "danger")
                 return jsonify({"error": "Ya se ha registrado un vehículo de este tipo para esta cédula."})
 
-
-            # Generar un nuevo ID y calcular el estado
-            nuevo_id = obtener_nuevo_id(df)
             estado = calcular_estado(soat, tecnomecanica)
 
-            # Crear el registro del nuevo usuario
-            nuevo_usuario = pd.DataFrame([{
-                "ID": nuevo_id,
+            # Insertar el registro del nuevo usuario; el almacenamiento asigna el ID
+            nuevo_usuario = {
                 "ESTADO": estado,
                 "CEDULA": cedula,
                 "NOMBRES Y APELLIDOS": nombre,
@@ -180,18 +451,13 @@ def init_routes(app):
                 "SOAT": soat,
                 "TECNOMECANICA": tecnomecanica,
                 "OBSERVACIONES": observaciones
-            }])
-            df = pd.concat([df, nuevo_usuario], ignore_index=True)
-            save_database(df)
-
-            # Generar y guardar el código QR
-            qr_data = f"ID: {nuevo_id}"
-            qr = qrcode.make(qr_data)
-            qr_path = os.path.join(QR_FOLDER, f"{cedula}.png")
-            qr.save(qr_path)
-            relative_qr_path = f"/static/qr_codes/{cedula}.png"
-
-            return jsonify({"qr_path": relative_qr_path, "cedula": cedula})
+            }
+            nuevo_id, = storage.insert([nuevo_usuario])
+            aplicar_escritura([nuevo_id])
+            versiones.registrar([nuevo_id], marcas=storage.ultima_escritura())
+
+            # El QR se genera al pedirlo, por ID
+            return jsonify({"qr_path": url_for('qr_usuario', id=nuevo_id), "id": nuevo_id, "cedula": cedula})
         return render_template('register.html', qr_path=None)
 
     @app.route('/validar_qr')
@@ -209,42 +475,183 @@ def init_routes(app):
             qr_data = data.get("qr_data")
             if not qr_data:
                 return jsonify({"message": "No se recibió código QR."})
-            
-            # Extraer el ID del QR
-            id_usuario = None
-            for line in qr_data.split("\n"):
-                if "ID:" in line:
-                    id_usuario = line.split(": ")[1].strip()
-                    break
-            if not id_usuario:
-                return jsonify({"message": "No se encontró el ID en el QR."})
-            
-            # Buscar el usuario en la base de datos
-            df = load_database()
-            usuario = df[df["ID"] == id_usuario]
-            if usuario.empty:
-                return jsonify({"message": "Usuario no encontrado."})
-            
-            # Extraer y "limpiar" la placa
-            placa = usuario["PLACA"].values[0]
-            placa_str = str(placa).strip().lower() if placa is not None else ""
-            # Se valida si la placa es una cadena vacía, "none" o "nan"
-            if placa_str in ["", "none", "nan"]:
-                return jsonify({"message": "❌ Acceso denegado: Datos incompletos"})
-            
-            estado = usuario["ESTADO"].values[0]
-            mensaje = "✅ Acceso permitido" if estado == "Activo" else "❌ Acceso denegado"
-            datos = {
-                "ID": id_usuario,
-                "Cédula": usuario["CEDULA"].values[0],
-                "Nombre": usuario["NOMBRES Y APELLIDOS"].values[0],
-                "Placa": usuario["PLACA"].values[0],
-                "Estado": estado
-            }
-            return jsonify({"message": mensaje, "data": datos})
+
+            id_usuario, resultado = validar_escaneo(qr_data)
+            registrar_acceso(id_usuario, resultado, data.get("puerta"))
+            return jsonify(resultado)
         except Exception as e:
             return jsonify({"message": f"Error: {str(e)}"})
 
+    @app.route('/procesar_qr/imagenes', methods=['POST'])
+    @login_required
+    @roles_required('admin', 'validador')
+    def procesar_qr_imagenes():
+        """Lee en el servidor los QR de fotos o videos cortos subidos, con un resultado por cuadro.
+
+        Un archivo con formato no permitido o que no se puede leer no frena a
+        los demás: queda en los resultados con su error, en el lugar que ocupaba.
+        """
+        from .decodificacion import EXTENSIONES_IMAGEN, EXTENSIONES_VIDEO, cuadros, extension
+
+        archivos = [a for a in request.files.getlist("imagenes") if a and a.filename]
+        if not archivos:
+            return jsonify({"message": "No se recibieron imágenes."}), 400
+        permitidas = EXTENSIONES_IMAGEN | EXTENSIONES_VIDEO
+        # origen: (archivo, cuadro) de cada cuadro a decodificar, o (archivo, error) de un archivo descartado
+        origen, lista = [], []
+        for archivo in archivos:
+            if extension(archivo.filename) not in permitidas:
+                origen.append((archivo.filename, {"error": "formato_no_permitido",
+                                                  "message": f"Formato no permitido: {archivo.filename}"}))
+                continue
+            with metricas.tramo("qr.cuadros"):
+                extraidos = cuadros(archivo.read(), archivo.filename, MAX_CUADROS_VIDEO)
+            if not extraidos:
+                origen.append((archivo.filename, {"error": "archivo_ilegible",
+                                                  "message": f"No se pudo leer el archivo {archivo.filename}."}))
+                continue
+            origen += [(archivo.filename, i) for i in range(len(extraidos))]
+            lista += extraidos
+            if len(lista) > MAX_CUADROS_PETICION:
+                return jsonify({"message": f"Máximo {MAX_CUADROS_PETICION} cuadros por petición."}), 400
+
+        try:
+            with metricas.tramo("qr.decodificar"):
+                textos = decodificador().decodificar(lista)
+        except BrokenProcessPool:
+            return jsonify({"message": "No se pudieron procesar las imágenes. Intente de nuevo."}), 503
+        resultados, anotados, textos = [], set(), iter(textos)
+        for nombre, cuadro in origen:
+            if isinstance(cuadro, dict):
+                resultados.append({"archivo": nombre, "cuadro": None, "qr_data": None, **cuadro})
+                continue
+            qr_data = next(textos)
+            if not qr_data:
+                resultados.append({"archivo": nombre, "cuadro": cuadro, "qr_data": None,
+                                   "message": "No se encontró un código QR en la imagen."})
+                continue
+            id_usuario, resultado = validar_escaneo(qr_data)
+            # Un video trae el mismo QR en muchos cuadros: a la bitácora va una vez por archivo
+            if (nombre, qr_data) not in anotados:
+                anotados.add((nombre, qr_data))
+                registrar_acceso(id_usuario, resultado, request.form.get("puerta"))
+            resultados.append({"archivo": nombre, "cuadro": cuadro, "qr_data": qr_data, **resultado})
+        return jsonify({"resultados": resultados})
+
+    @app.route('/procesar_qr/lote', methods=['POST'])
+    @login_required
+    @roles_required('admin', 'validador')
+    def procesar_qr_lote():
+        """Valida escaneos acumulados sin conexión; cada uno se juzga a la fecha en que se hizo."""
+        data = request.get_json(silent=True) or {}
+        escaneos = data.get("escaneos")
+        if not isinstance(escaneos, list) or not escaneos:
+            return jsonify({"message": "No se recibieron escaneos."}), 400
+        if len(escaneos) > MAX_ESCANEOS_LOTE:
+            return jsonify({"message": f"Máximo {MAX_ESCANEOS_LOTE} escaneos por petición."}), 400
+
+        resultados = [None] * len(escaneos)
+        ids_escaneo, momentos = [None] * len(escaneos), [None] * len(escaneos)
+        pendientes, validos = [], []
+        for i, escaneo in enumerate(escaneos):
+            escaneo = escaneo if isinstance(escaneo, dict) else {}
+            try:
+                momentos[i] = momento_escaneo(escaneo.get("fecha"))
+            except (TypeError, ValueError, OverflowError, OSError):
+                resultados[i] = {"message": "Fecha de escaneo inválida.", "motivo": "fecha_invalida"}
+                continue
+            pendientes.append(i)
+            validos.append((escaneo.get("qr_data") or "", momentos[i].date()))
+
+        # El mismo veredicto que /procesar_qr, con una sola pasada por el índice en memoria para todo el lote
+        for i, (id_usuario, resultado) in zip(pendientes, validar_escaneos(validos)):
+            ids_escaneo[i], resultados[i] = id_usuario, resultado
+        # Cada escaneo va a la bitácora con la hora en que se hizo, no con la de sincronización
+        for id_usuario, resultado, momento in zip(ids_escaneo, resultados, momentos):
+            registrar_acceso(id_usuario, resultado, data.get("puerta"), momento)
+        for escaneo, resultado in zip(escaneos, resultados):
+            if isinstance(escaneo, dict) and "fecha" in escaneo:
+                resultado["fecha"] = escaneo["fecha"]
+        return jsonify({"resultados": resultados})
+
+    @app.route('/api/validacion')
+    @login_required
+    @roles_required('admin', 'validador')
+    def api_validacion():
+        """Proyección binaria ID → (SOAT, TECNOMECANICA, placa, estado) para validar sin conexión."""
+        version, datos = proyeccion_completa()
+        respuesta = respuesta_proyeccion(datos, version)
+        respuesta.set_etag(f"{version}-{dia(datetime.today().date())}")
+        return respuesta.make_conditional(request)
+
+    @app.route('/api/validacion/clave')
+    @login_required
+    @roles_required('admin', 'validador')
+    def api_validacion_clave():
+        """Clave pública con la que los validadores sin conexión verifican la firma de los QR."""
+        return Response(firma.clave_publica_pem(), mimetype="application/x-pem-file")
+
+    @app.route('/api/validacion/delta')
+    @login_required
+    @roles_required('admin', 'validador')
+    def api_validacion_delta():
+        """Filas cambiadas y IDs borrados desde la versión `desde`, en el mismo formato binario."""
+        try:
+            desde = int(request.args['desde'])
+        except (KeyError, ValueError):
+            return jsonify({"error": "desde debe ser un número de versión."}), 400
+        cambios = versiones.cambios_desde(desde, storage.marca())
+        if cambios is None:
+            # Versión desconocida, posterior a un reemplazo completo del registro o con escrituras sin anotar
+            return jsonify({"error": "Hay que descargar la proyección completa.",
+                            "version": versiones.actual()}), 410
+        version, ids = cambios
+        columnas = registry.proyeccion(ids.tolist())
+        datos = codificar(version, dia(datetime.today().date()), columnas["ids"], columnas["soat"],
+                          columnas["tecnomecanica"], columnas["placa_presente"], columnas["borrados"])
+        return respuesta_proyeccion(datos, version)
+
+    @app.route('/qr/<int:id>')
+    @login_required
+    def qr_usuario(id):
+        """PNG del QR de un registro, generado al pedirlo y guardado en la caché LRU."""
+        usuario = registry.get(id)
+        if usuario is None:
+            return jsonify({"error": "Usuario no encontrado."}), 404
+        contenido = contenido_qr(usuario)
+        etiqueta = etag(contenido)
+        respuesta = Response(mimetype="image/png")
+        respuesta.set_etag(etiqueta)
+        respuesta.headers["Cache-Control"] = f"private, max-age={QR_MAX_AGE}"
+        if etiqueta in request.if_none_match:
+            # El navegador ya tiene esta imagen: ni siquiera se genera el PNG
+            return respuesta.make_conditional(request)
+        respuesta.set_data(cache_qr.png(str(id), contenido))
+        return respuesta.make_conditional(request)
+
+    @app.route('/qr/exportar', methods=['POST'])
+    @login_required
+    def exportar_qr():
+        """QR de los registros seleccionados, en un ZIP o en una hoja para imprimir, enviados por partes."""
+        selected_ids = ids_seleccionados()
+        if not selected_ids:
+            flash("No se seleccionaron usuarios para exportar.", "warning")
+            return redirect(url_for('mostrar_usuarios'))
+        if len(selected_ids) > MAX_QR_EXPORT:
+            flash(f"Máximo {MAX_QR_EXPORT} usuarios por exportación.", "warning")
+            return redirect(url_for('mostrar_usuarios'))
+        usuarios = [u for u in registry.get_many(selected_ids) if u is not None]
+
+        if request.form.get('formato') == 'impresion':
+            # Las imágenes las pide el navegador a /qr/<id>, que usa la caché
+            return Response(stream_with_context(stream_template('qr_impresion.html', usuarios=usuarios)))
+
+        fecha = datetime.today().strftime("%Y%m%d")
+        respuesta = Response(stream_with_context(zip_en_streaming(qrs_exportados(usuarios))),
+                             mimetype="application/zip")
+        respuesta.headers["Content-Disposition"] = f'attachment; filename="qr_{fecha}.zip"'
+        return respuesta
+
     @app.route('/cargue_masivo', methods=['POST'])
     @login_required
     @roles_required('admin')
@@ -260,150 +667,169 @@ def init_routes(app):
             flash('Solo se permiten archivos Excel (.xls, .xlsx).')
             return redirect(url_for('index'))
 
-        # Guardar el archivo temporalmente
-        filename = secure_filename(file.filename)
-        temp_folder = 'temp'
-        os.makedirs(temp_folder, exist_ok=True)
-        temp_path = os.path.join(temp_folder, filename)
-        file.save(temp_path)
-
-        # Intentar leer el archivo Excel subido
-        try:
-            df_upload = pd.read_excel(temp_path)
-        except Exception as e:
-            flash(f'Error al leer el archivo: {e}')
-            os.remove(temp_path)
+        # El archivo se lee completo en memoria (acotado por MAX_UPLOAD_BYTES) y nunca se escribe a disco
+        contenido = file.stream.read(MAX_UPLOAD_BYTES + 1)
+        if len(contenido) > MAX_UPLOAD_BYTES:
+            flash(f'El archivo supera el tamaño máximo de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.')
             return redirect(url_for('index'))
 
-        df = load_database()
-        usuarios_agregados = 0
-
-        for index, row in df_upload.iterrows():
-            cedula = convert_to_int_str(row.get('CEDULA'))
-            transporte = row.get('TIPO DE TRANSPORTE', '')
-            # Validar que no exista ya un registro para la misma combinación (CEDULA y TIPO DE TRANSPORTE)
-            if not df[(df["CEDULA"].astype(str) == cedula) & (df["TIPO DE TRANSPORTE"] == transporte)].empty:
-                continue
-
-            nombre = row.get('NOMBRES Y APELLIDOS', '')
-            empresa = row.get('EMPRESA', '')
-            placa = row.get('PLACA', '')
-            tarjeta = convert_to_int_str(row.get('TARJETA DE PROPIEDAD'))
-            categoria = row.get('CATEGORIA(S)', '')
-            vencimiento = row.get('FECHA DE VENCIMIENTO', '')
-            soat_val = row.get('SOAT', '')
-            tecnomecanica_val = row.get('TECNOMECANICA', '')
-            observaciones = row.get('OBSERVACIONES', '')
-
-            soat = convert_date(soat_val)
-            tecnomecanica = convert_date(tecnomecanica_val)
-            nuevo_id = obtener_nuevo_id(df)
-            estado = calcular_estado(soat, tecnomecanica)
-
-            new_row = pd.DataFrame([{
-                "ID": nuevo_id,
-                "ESTADO": estado,
-                "CEDULA": cedula,
-                "NOMBRES Y APELLIDOS": nombre,
-                "EMPRESA": empresa,
-                "TIPO DE TRANSPORTE": transporte,
-                "PLACA": placa,
-                "TARJETA DE PROPIEDAD": tarjeta,
-                "CATEGORIA(S)": categoria,
-                "FECHA DE VENCIMIENTO": vencimiento,
-                "SOAT": soat,
-                "TECNOMECANICA": tecnomecanica,
-                "OBSERVACIONES": observaciones
-            }])
-            df = pd.concat([df, new_row], ignore_index=True)
-
-            # Generar y guardar código QR
-            qr_data = f"ID: {nuevo_id}"
-            qr = qrcode.make(qr_data)
-            qr_file_path = os.path.join(QR_FOLDER, f"{cedula}.png")
-            qr.save(qr_file_path)
-            usuarios_agregados += 1
-
-        save_database(df)
-        os.remove(temp_path)
-        flash(f'Cargue completado exitosamente. Se agregaron {usuarios_agregados} usuarios.', 'Success')
+        # El procesamiento continúa en segundo plano; se responde de inmediato con el ID del trabajo
+        job_id = jobs.submit(procesar_cargue, contenido, secure_filename(file.filename))
+        if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+            return jsonify({"job_id": job_id, "estado_url": url_for('estado_cargue', job_id=job_id)}), 202
+        flash(f'Cargue en proceso (trabajo {job_id}).', 'Success')
         return redirect(url_for('index'))
 
+    @app.route('/cargue_masivo/<job_id>')
+    @login_required
+    @roles_required('admin')
+    def estado_cargue(job_id):
+        estado = jobs.status(job_id)
+        if estado is None:
+            return jsonify({"error": "Trabajo no encontrado."}), 404
+        return jsonify(estado)
+
     @app.route('/usuarios')
     @login_required
     def mostrar_usuarios():
         try:
-            df = load_database()
-            df = df.fillna('')
-            for col in ['CEDULA', 'TARJETA DE PROPIEDAD']:
-                if col in df.columns:
-                    df[col] = df[col].apply(convert_to_int_str)
-            usuarios = df.to_dict(orient='records')
-            total_usuarios = len(usuarios)  # Contador de usuarios
-            COLUMNAS_DESEADAS = [
-                'ID', 'ESTADO', 'CEDULA', 'NOMBRES Y APELLIDOS', 'EMPRESA',
-                'TIPO DE TRANSPORTE', 'PLACA', 'TARJETA DE PROPIEDAD',
-                'CATEGORIA(S)', 'FECHA DE VENCIMIENTO', 'SOAT',
-                'TECNOMECANICA', 'OBSERVACIONES'
-            ]
-            usuarios_filtrados = [
-                {col: usuario.get(col, '') for col in COLUMNAS_DESEADAS}
-                for usuario in usuarios
-            ]
-            return render_template('usuarios.html', usuarios=usuarios_filtrados, columnas=COLUMNAS_DESEADAS, total=total_usuarios)
+            # La tabla se llena por páginas desde /api/usuarios
+            total_usuarios = len(registry.consulta())
+            return render_template('usuarios.html', columnas=COLUMNS, total=total_usuarios)
         except Exception as e:
             return f"Error al leer el archivo: {str(e)}"
 
+    @app.route('/api/usuarios')
+    @login_required
+    def api_usuarios():
+        """Página de usuarios con búsqueda por prefijo, filtros y orden del lado del servidor."""
+        orden = request.args.get('orden', 'ID')
+        if orden not in COLUMNS:
+            return jsonify({"error": f"No se puede ordenar por {orden}."}), 400
+        try:
+            offset = max(int(request.args.get('offset', 0)), 0)
+            limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({"error": "offset y limit deben ser números enteros."}), 400
+        total, filas = registry.consulta().buscar(
+            texto=request.args.get('q'),
+            filtros={'ESTADO': request.args.get('estado'), 'EMPRESA': request.args.get('empresa')},
+            orden=orden,
+            descendente=request.args.get('dir') == 'desc',
+            offset=offset,
+            limit=limit,
+        )
+        return jsonify({
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "filas": [{col: fila.get(col, '') for col in COLUMNS} for fila in filas]
+        })
+
+    @app.route('/exportar')
+    @login_required
+    def exportar_registro():
+        """Exporta el registro filtrado a CSV o XLSX, enviando las filas a medida que se generan."""
+        formato = request.args.get('formato', 'csv')
+        if formato not in ('csv', 'xlsx'):
+            return jsonify({"error": "formato debe ser csv o xlsx."}), 400
+        orden = request.args.get('orden', 'ID')
+        if orden not in COLUMNS:
+            return jsonify({"error": f"No se puede ordenar por {orden}."}), 400
+        try:
+            rangos = {col: rango_fechas(prefijo) for col, prefijo in
+                      (('VENCE', 'vence'), ('SOAT', 'soat'), ('TECNOMECANICA', 'tecnomecanica'))}
+        except ValueError:
+            return jsonify({"error": "Las fechas deben tener el formato AAAA-MM-DD."}), 400
+
+        # Las columnas salen en el orden de COLUMNS
+        total, lotes = registry.consulta().recorrer(
+            COLUMNS,
+            texto=request.args.get('q'),
+            filtros={'ESTADO': request.args.get('estado'), 'EMPRESA': request.args.get('empresa'),
+                     'TIPO DE TRANSPORTE': request.args.get('transporte')},
+            rangos=rangos,
+            orden=orden,
+            descendente=request.args.get('dir') == 'desc',
+            lote=EXPORT_CHUNK_ROWS,
+        )
+        if formato == 'xlsx':
+            cuerpo = xlsx_en_streaming(COLUMNS, lotes, hoja=SHEET_NAME)
+            mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        else:
+            cuerpo = csv_en_streaming(COLUMNS, lotes)
+            mimetype = "text/csv"
+        respuesta = Response(cuerpo, mimetype=mimetype)
+        nombre = f"registro_{datetime.today().strftime('%Y%m%d')}.{formato}"
+        respuesta.headers["Content-Disposition"] = f'attachment; filename="{nombre}"'
+        respuesta.headers["X-Total-Filas"] = str(total)
+        return respuesta
+
+    @app.route('/api/vencimientos')
+    @login_required
+    def api_vencimientos():
+        """Vehículos cuyo SOAT o tecnomecánica vence entre hoy y los próximos `dias` días."""
+        try:
+            dias = max(int(request.args.get('dias', 7)), 1)
+        except ValueError:
+            return jsonify({"error": "dias debe ser un número entero."}), 400
+        hoy = datetime.today().date()
+        hasta = hoy + timedelta(days=dias - 1)
+        filas = registry.vencimientos(hoy, hasta)
+        return jsonify({
+            "desde": hoy.strftime(OUTPUT_DATE_FORMAT),
+            "hasta": hasta.strftime(OUTPUT_DATE_FORMAT),
+            "total": len(filas),
+            "filas": [{col: fila.get(col, '') for col in COLUMNS + ['VENCE']} for fila in filas]
+        })
+
+    @app.route('/api/accesos/resumen')
+    @login_required
+    @roles_required('admin')
+    def api_accesos_resumen():
+        """Ingresos por hora o por día, tasa de denegación y principales motivos, desde los resúmenes."""
+        try:
+            desde, hasta = rango_fechas("fecha")
+        except ValueError:
+            return jsonify({"error": "Las fechas deben tener el formato AAAA-MM-DD."}), 400
+        por = request.args.get("por", "hora")
+        if por not in ("hora", "dia"):
+            return jsonify({"error": "por debe ser 'hora' o 'dia'."}), 400
+        hasta = hasta or datetime.today().date()
+        desde = desde or hasta
+        if desde > hasta:
+            return jsonify({"error": "fecha_desde no puede ser posterior a fecha_hasta."}), 400
+        return jsonify(accesos.resumen(desde, hasta, por, request.args.get("puerta") or None))
+
     @app.route('/eliminar_usuario/<int:id>', methods=['POST'])
     @login_required
     @roles_required('admin')
     def eliminar_usuario(id):
         try:
-            df = load_database()
-            # Convertir la columna "ID" a cadena para asegurar la comparación
-            df['ID'] = df['ID'].astype(str)
-            
-            # Buscar el usuario usando la comparación de strings
-            usuario = df[df['ID'] == str(id)]
-            if not usuario.empty:
-                cedula = usuario.iloc[0]['CEDULA']
-                qr_path = os.path.join(QR_FOLDER, f"{cedula}.png")
-                if os.path.exists(qr_path):
-                    os.remove(qr_path)
-            # Filtrar para eliminar el usuario
-            df = df[df['ID'] != str(id)]
-            save_database(df)
+            storage.delete([id])
+            aplicar_escritura(eliminados=[id])
+            cache_qr.descartar([id])
+            versiones.registrar([id], marcas=storage.ultima_escritura())
             flash("Usuario eliminado correctamente.", "Success")
             return redirect(url_for('mostrar_usuarios'))
         except Exception as e:
-            return f"Error al eliminar el usuario y su código QR: {str(e)}"
-
-    def load_users(ul):
-        """Carga usuarios y contraseñas encriptadas desde el Excel."""
-        try:
-            df = pd.read_excel(ul)
-            users = {row["username"]: {"password": row["password"], "role": row["role"]} for _, row in df.iterrows()}
-            return users
-        except FileNotFoundError:
-            return {}
-
-    users = load_users(USUARIOS)
+            return f"Error al eliminar el usuario: {str(e)}"
 
     @app.route('/', methods=['GET', 'POST'])
     def login():
         if request.method == 'POST':
             username_input = request.form.get('username').strip()
-            password_input = request.form.get('password').strip().encode()
-            if username_input in users:
-                stored_password = users[username_input]['password'].encode()
-                if bcrypt.checkpw(password_input, stored_password):
-                    session['username'] = username_input
-                    session['role'] = users[username_input]['role']
-                    return redirect(url_for('index'))
-                else:
-                    flash("Usuario o contraseña incorrectos.")
-            else:
-                flash("Usuario o contraseña incorrectos.")
+            password_input = request.form.get('password').strip()
+            try:
+                rol = usuarios.autenticar(username_input, password_input)
+            except Saturado:
+                flash("Hay demasiados inicios de sesión en este momento. Intente de nuevo en unos segundos.")
+                return render_template('login.html'), 503
+            if rol is not None:
+                session['username'] = username_input
+                session['role'] = rol
+                return redirect(url_for('index'))
+            flash("Usuario o contraseña incorrectos.")
         return render_template('login.html')
 
     @app.route('/logout')
@@ -421,22 +847,19 @@ def init_routes(app):
         if not user_id:
             flash("ID del usuario no proporcionado.", "error")
             return redirect(url_for('index'))
-        try:
-            df = load_database()
-            df['ID'] = df['ID'].astype(int)
-        except Exception as e:
-            flash("Error al leer el archivo Excel: " + str(e), "error")
-            return redirect(url_for('index'))
         try:
             user_id_int = int(float(user_id))
         except ValueError:
             flash("ID inválido.", "error")
             return redirect(url_for('index'))
-        matching_rows = df[df['ID'] == user_id_int]
-        if matching_rows.empty:
+        try:
+            usuario = storage.get(user_id_int)
+        except Exception as e:
+            flash("Error al leer el registro: " + str(e), "error")
+            return redirect(url_for('index'))
+        if usuario is None:
             flash("Usuario no encontrado.", "error")
             return redirect(url_for('index'))
-        idx = matching_rows.index[0]
         cedula_input = request.form.get('cedula')
         try:
             cedula_int = int(float(cedula_input)) if cedula_input else ''
@@ -446,37 +869,90 @@ def init_routes(app):
         transporte_input = request.form.get('transporte', '')
     
         # Validar que no exista otro registro con la misma combinación de CEDULA y TIPO DE TRANSPORTE
-        duplicate = df[(df["CEDULA"].astype(str) == cedula_int) & 
-                    (df["TIPO DE TRANSPORTE"] == transporte_input) & 
-                    (df["ID"] != user_id_int)]
-        if not duplicate.empty:
+        if storage.exists(cedula_int, transporte_input, exclude_id=user_id_int):
             flash("Error: Ya se ha registrado un vehículo de este tipo para esta cédula.", "danger")
             return redirect(url_for('mostrar_usuarios'))
 
         # Actualizamos los campos; aplicamos conversión de fechas para soat y tecnomecánica
-        df.at[idx, 'CEDULA'] = cedula_int
-        df.at[idx, 'NOMBRES Y APELLIDOS'] = request.form.get('nombres')
-        df.at[idx, 'EMPRESA'] = request.form.get('empresa')
-        df.at[idx, 'TIPO DE TRANSPORTE'] = transporte_input
-        df.at[idx, 'PLACA'] = request.form.get('placa')
-        df.at[idx, 'TARJETA DE PROPIEDAD'] = request.form.get('tarjeta')
-        df.at[idx, 'CATEGORIA(S)'] = request.form.get('categoria')
-        df.at[idx, 'FECHA DE VENCIMIENTO'] = request.form.get('vencimiento')
         soat_str = request.form.get('soat')
         tecnomecanica_str = request.form.get('tecnomecanica')
-        df.at[idx, 'SOAT'] = soat_str
-        df.at[idx, 'TECNOMECANICA'] = tecnomecanica_str
-        df.at[idx, 'OBSERVACIONES'] = request.form.get('observaciones')
-        df.at[idx, 'ESTADO'] = calcular_estado(soat_str, tecnomecanica_str)
+        cambios = {
+            'CEDULA': cedula_int,
+            'NOMBRES Y APELLIDOS': request.form.get('nombres'),
+            'EMPRESA': request.form.get('empresa'),
+            'TIPO DE TRANSPORTE': transporte_input,
+            'PLACA': request.form.get('placa'),
+            'TARJETA DE PROPIEDAD': request.form.get('tarjeta'),
+            'CATEGORIA(S)': request.form.get('categoria'),
+            'FECHA DE VENCIMIENTO': request.form.get('vencimiento'),
+            'SOAT': soat_str,
+            'TECNOMECANICA': tecnomecanica_str,
+            'OBSERVACIONES': request.form.get('observaciones'),
+            'ESTADO': calcular_estado(soat_str, tecnomecanica_str),
+        }
         
         try:
-            save_database(df)
+            storage.update(user_id_int, cambios)
+            aplicar_escritura([user_id_int])
+            versiones.registrar([user_id_int], marcas=storage.ultima_escritura())
             flash("Usuario actualizado correctamente.", "Success")
         except Exception as e:
             flash("Error al guardar los cambios en el Excel: " + str(e), "error")
             return redirect(url_for('mostrar_usuarios'))
         return redirect(url_for('mostrar_usuarios'))
     
+    @app.route('/api/usuarios/lote', methods=['POST'])
+    @login_required
+    @roles_required('admin')
+    def mutar_usuarios():
+        """Actualiza o elimina en una sola escritura los registros elegidos por IDs o por filtro.
+
+        Cuerpo JSON: {"accion": "actualizar" | "eliminar", "ids": [...],
+        "filtro": {"estado", "empresa", "transporte", "placas": [...], "q",
+        "vence_desde", "vence_hasta"}, "campos": {...}, "simular": false}.
+        Con IDs y filtro a la vez se toman los IDs que además cumplan el filtro.
+        """
+        data = request.get_json(silent=True) or {}
+        accion = data.get('accion')
+        if accion not in ('actualizar', 'eliminar'):
+            return jsonify({"error": "accion debe ser actualizar o eliminar."}), 400
+        ids, filtro = data.get('ids'), data.get('filtro') or {}
+        placas = filtro.get('placas') if isinstance(filtro, dict) else None
+        if (ids is not None and not isinstance(ids, list)) or not isinstance(filtro, dict) \
+                or (placas is not None and not isinstance(placas, list)):
+            return jsonify({"error": "ids y filtro.placas deben ser listas y filtro un objeto."}), 400
+        try:
+            rangos = {'VENCE': rango_fechas('vence', filtro)}
+        except ValueError:
+            return jsonify({"error": "Las fechas deben tener el formato AAAA-MM-DD."}), 400
+        try:
+            campos = campos_lote(data.get('campos')) if accion == 'actualizar' else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        filtros = {'ESTADO': filtro.get('estado'), 'EMPRESA': filtro.get('empresa'),
+                   'TIPO DE TRANSPORTE': filtro.get('transporte')}
+        # Sin IDs ni filtro se tocaría todo el registro: se exige al menos uno de los dos
+        if ids is None and placas is None and not filtro.get('q') and not any(filtros.values()) \
+                and rangos['VENCE'] == (None, None):
+            return jsonify({"error": "Indica los IDs o un filtro."}), 400
+
+        objetivo = registry.consulta().seleccionar(ids=ids, placas=placas, texto=filtro.get('q'),
+                                                   filtros=filtros, rangos=rangos)
+        ids_objetivo = objetivo["ID"].tolist()
+        if data.get('simular') or not ids_objetivo:
+            return jsonify({"accion": accion, "total": len(ids_objetivo), "ids": ids_objetivo,
+                            "simulado": bool(data.get('simular'))})
+
+        if accion == 'eliminar':
+            total = storage.delete(ids_objetivo)
+            aplicar_escritura(eliminados=ids_objetivo)
+        else:
+            total = storage.update_many(cambios_por_fila(objetivo, campos))
+            aplicar_escritura(ids_objetivo)
+        cache_qr.descartar(ids_objetivo)
+        versiones.registrar(ids_objetivo, marcas=storage.ultima_escritura())
+        return jsonify({"accion": accion, "total": total, "ids": ids_objetivo, "simulado": False})
+
     @app.route('/eliminar_varios', methods=['POST'])
     @login_required
     @roles_required('admin')
@@ -488,21 +964,14 @@ def init_routes(app):
                 flash("No se seleccionaron usuarios para eliminar.", "warning")
                 return redirect(url_for('mostrar_usuarios'))
             
-            df = load_database()  # Función para cargar el DataFrame con tus datos
-            
-            # Iterar sobre cada ID seleccionado
-            for id_sel in selected_ids:
-                # Buscar el usuario en el DataFrame (aseguramos comparar cadenas)
-                usuario = df[df['ID'] == str(id_sel)]
-                if not usuario.empty:
-                    cedula = usuario.iloc[0]['CEDULA']
-                    qr_path = os.path.join(QR_FOLDER, f"{cedula}.png")
-                    if os.path.exists(qr_path):
-                        os.remove(qr_path)
-            
-            # Filtrar el DataFrame eliminando todos los registros cuyos IDs estén en selected_ids
-            df = df[~df['ID'].isin(selected_ids)]
-            save_database(df)  # Función para guardar el DataFrame actualizado
+            # Buscar todos los usuarios seleccionados en una sola consulta
+            usuarios = storage.get_many(selected_ids)
+
+            # Eliminar todos los registros cuyos IDs estén en selected_ids
+            storage.delete(selected_ids)
+            aplicar_escritura(eliminados=usuarios.keys())
+            cache_qr.descartar(usuarios.keys())
+            versiones.registrar(usuarios.keys(), marcas=storage.ultima_escritura())
             
             flash("Usuarios eliminados correctamente.", "Success")
             return redirect(url_for('mostrar_usuarios'))
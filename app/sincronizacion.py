@@ -0,0 +1,194 @@
+import json
+import sqlite3
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+# Formato binario de la proyección de validación (todo en little-endian):
+#   cabecera  MAGIA, formato (uint16), versión del registro (uint64), día de
+#             generación (int32), filas (uint32), IDs borrados (uint32)
+#   cuerpo    comprimido con zlib, por columnas:
+#             IDs ordenados codificados como diferencias (uint32),
+#             SOAT y TECNOMECANICA en días desde 1970 (int32, SIN_FECHA si falta),
+#             banderas (uint8: bit 0 = placa presente, bit 1 = activo el día de generación),
+#             IDs borrados codificados como diferencias (uint32, sólo en deltas)
+MAGIA = b"SOAT"
+FORMATO = 1
+CABECERA = struct.Struct("<4sHQiII")
+SIN_FECHA = np.iinfo(np.int32).min
+PLACA_PRESENTE = 1
+ACTIVO = 2
+
+# Valor con el que registry.dias_fecha marca las fechas vacías o inválidas
+SIN_FECHA_INT64 = np.iinfo(np.int64).min
+
+
+def _diferencias(ids):
+    return np.diff(np.asarray(ids, dtype=np.int64), prepend=0).astype("<u4")
+
+
+def _dias_int32(valores):
+    return np.where(valores == SIN_FECHA_INT64, SIN_FECHA, valores).astype("<i4")
+
+
+def codificar(version, dia, ids, soat, tecnomecanica, placa_presente, borrados=()):
+    """Codifica la proyección ID → (fechas, placa, estado) en el formato binario descrito arriba."""
+    orden = np.argsort(ids, kind="stable")
+    ids = np.asarray(ids, dtype=np.int64)[orden]
+    soat = np.asarray(soat, dtype=np.int64)[orden]
+    tecnomecanica = np.asarray(tecnomecanica, dtype=np.int64)[orden]
+    banderas = np.where(np.asarray(placa_presente, dtype=bool)[orden], PLACA_PRESENTE, 0)
+    banderas |= np.where(np.minimum(soat, tecnomecanica) >= dia, ACTIVO, 0)
+    borrados = np.sort(np.asarray(list(borrados), dtype=np.int64))
+
+    cuerpo = b"".join([
+        _diferencias(ids).tobytes(),
+        _dias_int32(soat).tobytes(),
+        _dias_int32(tecnomecanica).tobytes(),
+        banderas.astype(np.uint8).tobytes(),
+        _diferencias(borrados).tobytes(),
+    ])
+    cabecera = CABECERA.pack(MAGIA, FORMATO, version, dia, len(ids), len(borrados))
+    return cabecera + zlib.compress(cuerpo, 6)
+
+
+def decodificar(datos):
+    """Inverso de codificar; lo usan los clientes de referencia y las pruebas de humo."""
+    magia, formato, version, dia, filas, n_borrados = CABECERA.unpack_from(datos)
+    if magia != MAGIA or formato != FORMATO:
+        raise ValueError("Formato de proyección desconocido.")
+    cuerpo = memoryview(zlib.decompress(datos[CABECERA.size:]))
+    partes, inicio = [], 0
+    for dtype, n in (("<u4", filas), ("<i4", filas), ("<i4", filas), ("u1", filas), ("<u4", n_borrados)):
+        fin = inicio + np.dtype(dtype).itemsize * n
+        partes.append(np.frombuffer(cuerpo[inicio:fin], dtype=dtype))
+        inicio = fin
+    ids, soat, tecnomecanica, banderas, borrados = partes
+    return {
+        "version": version,
+        "dia": dia,
+        "ids": np.cumsum(ids, dtype=np.int64),
+        "soat": soat,
+        "tecnomecanica": tecnomecanica,
+        "banderas": banderas,
+        "borrados": np.cumsum(borrados, dtype=np.int64),
+    }
+
+
+class VersionLog:
+    """Número de versión del registro y bitácora de los IDs tocados en cada versión.
+
+    Vive en su propio archivo SQLite para que todos los workers compartan la
+    misma secuencia, sea cual sea el backend del registro. Cada registro,
+    edición o eliminación agrega una versión con los IDs afectados (los
+    bloques contiguos se guardan como un solo rango); un reemplazo completo
+    del registro agrega una versión marcada como completa, a partir de la
+    cual ya no se pueden calcular deltas anteriores.
+
+    La bitácora no comparte transacción con el almacenamiento, así que cada
+    versión guarda además las marcas (antes, después) de su escritura. Si la
+    de antes no es la de después de la versión anterior, hubo una escritura
+    que no llegó a anotarse (el worker se cayó en medio) y la versión nueva
+    se marca como completa.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS versiones (version INTEGER PRIMARY KEY AUTOINCREMENT, completa INTEGER NOT NULL DEFAULT 0)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cambios (version INTEGER NOT NULL, desde INTEGER NOT NULL, hasta INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cambios_version ON cambios (version)")
+        columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(versiones)")}
+        for columna in ("antes", "despues"):
+            if columna not in columnas:
+                # Bitácoras de antes de las marcas: sus versiones quedan sin marca y no se comparan
+                conn.execute(f"ALTER TABLE versiones ADD COLUMN {columna} TEXT")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def actual(self):
+        """Versión vigente del registro (0 si nunca ha cambiado)."""
+        return self._connect().execute("SELECT COALESCE(MAX(version), 0) FROM versiones").fetchone()[0]
+
+    @staticmethod
+    def _rangos(ids):
+        """Agrupa los IDs en rangos contiguos [desde, hasta]."""
+        ids = np.unique(np.asarray([int(i) for i in ids], dtype=np.int64))
+        if not len(ids):
+            return []
+        cortes = np.flatnonzero(np.diff(ids) != 1) + 1
+        inicios = np.concatenate(([0], cortes))
+        finales = np.concatenate((cortes - 1, [len(ids) - 1]))
+        return list(zip(ids[inicios].tolist(), ids[finales].tolist()))
+
+    @staticmethod
+    def _marca(marca):
+        return None if marca is None else json.dumps(marca)
+
+    def _ultima_marca(self, conn):
+        """Marca de después de la última versión, o None si no hay versiones o no tiene marca."""
+        fila = conn.execute("SELECT despues FROM versiones ORDER BY version DESC LIMIT 1").fetchone()
+        return fila[0] if fila else None
+
+    def registrar(self, ids=(), desde=None, hasta=None, marcas=None):
+        """Abre una versión nueva con los IDs (o el rango) modificados. Devuelve el número de versión.
+
+        `marcas` son las (antes, después) de la escritura en el almacenamiento.
+        """
+        rangos = self._rangos(ids)
+        if desde is not None:
+            rangos.append((int(desde), int(hasta)))
+        antes, despues = (None, None) if marcas is None else map(self._marca, marcas)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ultima = self._ultima_marca(conn)
+            # Si falta una escritura en la bitácora, los deltas que la cruzan no se pueden calcular
+            completa = int(None not in (ultima, antes) and ultima != antes)
+            version = conn.execute("INSERT INTO versiones (completa, antes, despues) VALUES (?, ?, ?)",
+                                   (completa, antes, despues)).lastrowid
+            conn.executemany("INSERT INTO cambios VALUES (?, ?, ?)", [(version, d, h) for d, h in rangos])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return version
+
+    def reiniciar(self, marcas=None):
+        """Abre una versión que reemplaza todo el registro: los clientes deben bajar la proyección completa."""
+        antes, despues = (None, None) if marcas is None else map(self._marca, marcas)
+        return self._connect().execute("INSERT INTO versiones (completa, antes, despues) VALUES (1, ?, ?)",
+                                       (antes, despues)).lastrowid
+
+    def cambios_desde(self, version, marca=None):
+        """(versión actual, IDs tocados después de `version`), o None si hace falta la proyección completa.
+
+        Con `marca`, la actual del almacenamiento, también se pide la proyección
+        completa si no coincide con la de la última versión: hay una escritura
+        confirmada que todavía no está (o nunca estará) en la bitácora.
+        """
+        conn = self._connect()
+        actual = self.actual()
+        if version > actual:
+            return None
+        ultima = self._ultima_marca(conn)
+        if None not in (marca, ultima) and ultima != self._marca(marca):
+            return None
+        completa = conn.execute("SELECT 1 FROM versiones WHERE version > ? AND completa = 1 LIMIT 1",
+                                (version,)).fetchone()
+        if completa is not None:
+            return None
+        rangos = conn.execute("SELECT desde, hasta FROM cambios WHERE version > ? AND version <= ?",
+                              (version, actual)).fetchall()
+        if not rangos:
+            return actual, np.empty(0, dtype=np.int64)
+        ids = np.concatenate([np.arange(d, h + 1, dtype=np.int64) for d, h in rangos])
+        return actual, np.unique(ids)
@@ -0,0 +1,716 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .diario import BloqueoArchivo, CoordinadorEscrituras, Diario
+from .espejo import EspejoColumnar, marca_libro
+
+# Columna del Excel -> columna en SQLite (en el mismo orden de COLUMNS)
+SQL_COLUMNS = {
+    "ID": "id",
+    "ESTADO": "estado",
+    "CEDULA": "cedula",
+    "NOMBRES Y APELLIDOS": "nombres",
+    "EMPRESA": "empresa",
+    "TIPO DE TRANSPORTE": "transporte",
+    "PLACA": "placa",
+    "TARJETA DE PROPIEDAD": "tarjeta",
+    "CATEGORIA(S)": "categoria",
+    "FECHA DE VENCIMIENTO": "vencimiento",
+    "SOAT": "soat",
+    "TECNOMECANICA": "tecnomecanica",
+    "OBSERVACIONES": "observaciones",
+}
+EXCEL_COLUMNS = list(SQL_COLUMNS)
+PRIMER_ID = 8000000
+MIGRADO_EXCEL = "migrado_excel"  # Clave de la tabla meta
+MAX_DUPLICADOS_REPORTE = 20  # Claves repetidas que se listan en el log al importar
+
+logger = logging.getLogger(__name__)
+
+
+def _texto(valor):
+    """Normaliza un valor de celda a texto, dejando los vacíos como None."""
+    if valor is None or pd.isna(valor):
+        return None
+    return str(valor)
+
+
+def _clave(cedula, transporte):
+    return (_texto(cedula), _texto(transporte))
+
+
+class IndiceUnicidad:
+    """Índice en memoria de la regla (CEDULA, TIPO DE TRANSPORTE) única, en ambos sentidos.
+
+    Se construye una vez desde el almacenamiento y luego se mantiene con cada
+    inserción, edición y eliminación, de modo que comprobar la regla cuesta
+    O(1) sin importar el tamaño del registro. Si el archivo trae duplicados
+    de antes de la regla, la clave apunta a todos sus IDs.
+    """
+
+    def __init__(self, filas=()):
+        self._por_clave = {}
+        self._por_id = {}
+        for id_, cedula, transporte in filas:
+            self.agregar(id_, cedula, transporte)
+
+    def agregar(self, id_, cedula, transporte):
+        id_, clave = int(id_), _clave(cedula, transporte)
+        self._por_id[id_] = clave
+        self._por_clave.setdefault(clave, set()).add(id_)
+
+    def quitar(self, id_):
+        clave = self._por_id.pop(int(id_), None)
+        ids = self._por_clave.get(clave)
+        if ids is not None:
+            ids.discard(int(id_))
+            if not ids:
+                del self._por_clave[clave]
+
+    def cambiar(self, id_, cedula=None, transporte=None):
+        """Actualiza la clave de un ID; los campos en None conservan el valor anterior."""
+        anterior = self._por_id.get(int(id_))
+        if anterior is None:
+            return
+        self.quitar(id_)
+        self.agregar(id_, anterior[0] if cedula is None else cedula,
+                     anterior[1] if transporte is None else transporte)
+
+    def contiene(self, id_):
+        return str(id_).strip().isdigit() and int(id_) in self._por_id
+
+    def existe(self, cedula, transporte, exclude_id=None):
+        ids = self._por_clave.get(_clave(cedula, transporte), ())
+        if exclude_id is None:
+            return bool(ids)
+        return any(i != int(exclude_id) for i in ids)
+
+    def claves(self):
+        """Todas las claves registradas, como texto (los vacíos como ''), para el anti-join del cargue."""
+        return pd.MultiIndex.from_tuples([(c or "", t or "") for c, t in self._por_clave],
+                                         names=["CEDULA", "TIPO DE TRANSPORTE"])
+
+
+def aplicar_diario(df, entradas):
+    """Aplica las entradas del diario (en orden) sobre el registro leído del libro."""
+    if not entradas:
+        return df
+    completas = {}  # ID -> fila completa, o None si se borró
+    parciales = {}  # ID del libro -> campos actualizados
+    for entrada in entradas:
+        op = entrada["op"]
+        if op == "insert":
+            for fila in entrada["filas"]:
+                completas[fila["ID"]] = dict(fila)
+                parciales.pop(fila["ID"], None)
+        elif op == "update":
+            id_ = entrada["id"]
+            if completas.get(id_) is not None:
+                completas[id_].update(entrada["campos"])
+            elif id_ not in completas:
+                parciales.setdefault(id_, {}).update(entrada["campos"])
+        elif op == "delete":
+            for id_ in entrada["ids"]:
+                completas[id_] = None
+                parciales.pop(id_, None)
+
+    df = df[~df["ID"].isin(completas.keys())].reset_index(drop=True)
+    if parciales:
+        df = df.astype(object)
+        posiciones = {id_: i for i, id_ in enumerate(df["ID"]) if id_ in parciales}
+        for id_, campos in parciales.items():
+            if id_ in posiciones:
+                for col, valor in campos.items():
+                    df.at[posiciones[id_], col] = valor
+    nuevas = [fila for fila in completas.values() if fila is not None]
+    if nuevas:
+        df = pd.concat([df, pd.DataFrame(nuevas, columns=EXCEL_COLUMNS)], ignore_index=True)
+    return df
+
+
+class ExcelStorage:
+    """Backend original: todo el registro vive en un único libro de Excel.
+
+    Se mantiene para instalaciones que todavía no migran a SQLite y es seguro
+    con varios workers: las escrituras no reescriben el libro, sino que se
+    agregan a un diario (`<libro>.diario`) con un lock entre procesos, y las
+    que llegan casi juntas se confirman en grupo con un solo fsync. Un hilo en
+    segundo plano compacta el diario dentro del libro; mientras tanto las
+    lecturas aplican el diario pendiente sobre el libro.
+
+    El índice de unicidad y la secuencia de IDs se mantienen en memoria y se
+    reconstruyen sólo si otro proceso escribió; la secuencia se guarda junto
+    al libro para no reutilizar los IDs de filas eliminadas.
+
+    Parsear el .xlsx es lo más lento de arrancar un worker, así que el libro
+    se guarda además como espejo columnar (`<libro>.columnas.npz`), que se
+    regenera cada vez que el libro cambia. Con `espejo=False` no se usa.
+    """
+
+    COMPACTAR_CADA = 30  # segundos
+    COMPACTAR_BYTES = 1024 * 1024
+
+    def __init__(self, path, sheet_name="Sheet1", espejo=True):
+        self.path = path
+        self.sheet_name = sheet_name
+        self._espejo = EspejoColumnar(path, sheet_name) if espejo else None
+        base = os.path.splitext(path)[0]
+        self._secuencia_path = f"{base}.secuencia"
+        self._bloqueo = BloqueoArchivo(f"{base}.lock")
+        self._diario = Diario(f"{base}.diario")
+        self._escritor = CoordinadorEscrituras(self._bloqueo, self._diario, antes=self._sincronizar,
+                                               despues=self._confirmado, marca=self.marca)
+        self._libro = (None, None)  # (mtime, DataFrame) del último libro leído
+        self._carga = (None, None)  # (marca, DataFrame con el diario aplicado)
+        self._indice = None
+        self._siguiente = PRIMER_ID
+        self._marca = None
+        # Se llama con las marcas (antes, después) de cada compactación, que cambia la marca sin cambiar el registro
+        self.al_compactar = None
+        self._compactar = threading.Event()
+        self._compactador = None
+
+    # ----- Lectura -----
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def marca(self):
+        """Cambia cada vez que cambia el libro o el diario, en este o en otro proceso."""
+        return (self._file_mtime(),) + self._diario.marca()
+
+    def _leer_libro(self):
+        mtime = self._file_mtime()
+        if self._libro[0] != mtime or mtime is None:
+            # La marca se toma antes de leer: si el libro cambia en medio, el espejo
+            # queda con una marca vieja y el próximo arranque lo vuelve a generar
+            marca = marca_libro(self.path)
+            df = self._espejo.leer(marca) if self._espejo is not None else None
+            if df is None:
+                try:
+                    df = pd.read_excel(self.path, sheet_name=self.sheet_name, dtype=str)
+                except Exception:
+                    df = pd.DataFrame(columns=EXCEL_COLUMNS)
+                else:
+                    self._guardar_espejo(df, marca)
+            self._libro = (mtime, df)
+        return self._libro[1]
+
+    def _guardar_espejo(self, df, marca):
+        if self._espejo is not None:
+            self._espejo.guardar(df, marca)
+
+    def load(self):
+        """Lee el registro completo como DataFrame de texto, con el diario pendiente aplicado."""
+        marca = self.marca()
+        if self._carga[0] != marca:
+            # El diario se lee antes que el libro: si una compactación ocurre en medio,
+            # se vuelven a aplicar entradas ya compactadas, lo cual no cambia nada
+            entradas = self._diario.leer()
+            self._carga = (marca, aplicar_diario(self._leer_libro(), entradas))
+        return self._carga[1].copy()
+
+    def get(self, id_):
+        return self.get_many([id_]).get(str(id_))
+
+    def get_many(self, ids):
+        df = self.load()
+        ids = {str(i) for i in ids}
+        return {r["ID"]: r for r in df[df["ID"].isin(ids)].to_dict(orient="records")}
+
+    def exists(self, cedula, transporte, exclude_id=None):
+        """Indica si ya hay un registro con esa CEDULA y TIPO DE TRANSPORTE, en O(1) con el índice."""
+        with self._bloqueo:
+            self._sincronizar()
+            return self._indice.existe(cedula, transporte, exclude_id)
+
+    def claves(self):
+        """Claves (CEDULA, TIPO DE TRANSPORTE) registradas, para el anti-join del cargue masivo."""
+        with self._bloqueo:
+            self._sincronizar()
+            return self._indice.claves()
+
+    # ----- Estado en memoria -----
+
+    def _leer_secuencia(self):
+        try:
+            with open(self._secuencia_path) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return PRIMER_ID
+
+    def _guardar_secuencia(self):
+        tmp_path = self._secuencia_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(self._siguiente))
+        os.replace(tmp_path, self._secuencia_path)
+
+    def _indexar(self, df):
+        ids = pd.to_numeric(df["ID"], errors="coerce")
+        validos = ids.notna()
+        self._indice = IndiceUnicidad(zip(ids[validos].astype("int64"), df["CEDULA"][validos],
+                                          df["TIPO DE TRANSPORTE"][validos]))
+        maximo = int(ids.max()) + 1 if validos.any() else PRIMER_ID
+        self._siguiente = max(maximo, PRIMER_ID, self._leer_secuencia())
+
+    def _sincronizar(self):
+        """Reconstruye el índice y la secuencia si el libro o el diario cambiaron fuera de este proceso."""
+        marca = self.marca()
+        if self._indice is None or marca != self._marca:
+            self._indexar(self.load())
+            self._marca = marca
+
+    def _confirmado(self, entradas):
+        if entradas is None:
+            self._indice = None  # el grupo falló: se reconstruye en la próxima escritura
+            return
+        # Con el lock aún tomado: lo único que cambió desde _sincronizar es lo de este grupo
+        self._marca = self.marca()
+        if self._diario.marca()[0] > self.COMPACTAR_BYTES:
+            self._compactar.set()
+
+    # ----- Escritura -----
+
+    def _escribir(self, df):
+        """Escribe el libro en un archivo temporal y lo reemplaza de forma atómica."""
+        base, ext = os.path.splitext(self.path)
+        tmp_path = f"{base}.tmp{ext}"
+        with pd.ExcelWriter(tmp_path, engine="openpyxl", mode="w") as writer:
+            df.to_excel(writer, sheet_name=self.sheet_name, index=False)
+        os.replace(tmp_path, self.path)
+
+    def ultima_escritura(self):
+        """Marcas (antes, después) del grupo de la última escritura de este hilo, tomadas con el lock."""
+        return self._escritor.ultima_escritura()
+
+    def _ejecutar(self, fn):
+        self._iniciar_compactador()
+        return self._escritor.ejecutar(fn)
+
+    def replace_all(self, df):
+        """Reescribe el registro completo; reemplaza también lo que hubiera en el diario."""
+        def reemplazar(lote):
+            lote.descartar()
+            self._escribir(df)
+            self._diario.vaciar()
+            self._indexar(df)
+        self._ejecutar(reemplazar)
+
+    def insert(self, rows):
+        """Agrega filas asignándoles IDs consecutivos. Devuelve los IDs asignados."""
+        return self.insert_chunks([rows])
+
+    def insert_chunks(self, chunks):
+        """Agrega varios lotes en un solo grupo del diario, con un bloque de IDs contiguo.
+
+        `chunks` puede ser un generador: cada lote se valida y se pasa a texto
+        apenas se produce, sin juntar antes todas las filas. Si un lote falla,
+        no queda ninguno en el diario ni en el índice.
+        """
+        def insertar(lote):
+            inicio = siguiente = self._siguiente
+            try:
+                for rows in chunks:
+                    nuevos = [{col: _texto(row.get(col)) for col in EXCEL_COLUMNS[1:]} | {"ID": str(siguiente + i)}
+                              for i, row in enumerate(rows)]
+                    # La regla de unicidad se revalida aquí, con el lock entre procesos tomado;
+                    # las filas de lotes anteriores ya están en el índice
+                    claves = [(row["CEDULA"], row["TIPO DE TRANSPORTE"]) for row in nuevos]
+                    if len(set(claves)) < len(claves) or any(self._indice.existe(*clave) for clave in claves):
+                        raise ValueError("Ya existe un registro con esa CEDULA y TIPO DE TRANSPORTE.")
+                    if nuevos:
+                        lote.registrar({"op": "insert", "filas": nuevos})
+                    for row in nuevos:
+                        self._indice.agregar(row["ID"], row["CEDULA"], row["TIPO DE TRANSPORTE"])
+                    siguiente += len(nuevos)
+            except Exception:
+                for id_ in range(inicio, siguiente):
+                    self._indice.quitar(id_)
+                raise
+            if siguiente > inicio:
+                self._siguiente = siguiente
+                self._guardar_secuencia()
+            return list(range(inicio, siguiente))
+        return self._ejecutar(insertar)
+
+    def update(self, id_, fields):
+        return self.update_many({id_: fields}) > 0
+
+    def update_many(self, cambios):
+        """Actualiza varias filas (ID -> campos) en un solo grupo del diario. Devuelve cuántas existían."""
+        def actualizar(lote):
+            existentes = [(str(id_), fields) for id_, fields in cambios.items() if self._indice.contiene(id_)]
+            for id_, fields in existentes:
+                lote.registrar({"op": "update", "id": id_, "campos": {col: _texto(v) for col, v in fields.items()}})
+                self._indice.cambiar(id_, fields.get("CEDULA"), fields.get("TIPO DE TRANSPORTE"))
+            return len(existentes)
+        return self._ejecutar(actualizar)
+
+    def delete(self, ids):
+        def eliminar(lote):
+            existentes = [str(i) for i in ids if self._indice.contiene(i)]
+            if existentes:
+                lote.registrar({"op": "delete", "ids": existentes})
+                for id_ in existentes:
+                    self._indice.quitar(id_)
+            return len(existentes)
+        return self._ejecutar(eliminar)
+
+    # ----- Compactación -----
+
+    def _iniciar_compactador(self):
+        if self._compactador is None:
+            self._compactador = threading.Thread(target=self._bucle_compactacion, name="compactador", daemon=True)
+            self._compactador.start()
+
+    def _bucle_compactacion(self):
+        while True:
+            self._compactar.wait(self.COMPACTAR_CADA)
+            self._compactar.clear()
+            try:
+                self.compactar()
+            except Exception:
+                # Se reintenta en la próxima vuelta; mientras tanto el diario sigue siendo válido
+                pass
+
+    def compactar(self):
+        """Vuelca el diario pendiente dentro del libro y lo vacía."""
+        with self._bloqueo:
+            if self._diario.marca()[0] == 0:
+                return False
+            antes = self.marca()
+            df = self.load()
+            self._escribir(df)
+            self._diario.vaciar()
+            self._libro = (self._file_mtime(), df)
+            # Los demás workers leen el libro compactado del espejo en vez de parsearlo
+            self._guardar_espejo(df, marca_libro(self.path))
+            self._marca = self.marca()
+            if self.al_compactar is not None:
+                self.al_compactar((antes, self._marca))
+            return True
+
+
+class SQLiteStorage:
+    """Backend transaccional sobre SQLite con escrituras fila a fila.
+
+    ID es la clave primaria, (CEDULA, TIPO DE TRANSPORTE) tiene un índice
+    único y PLACA uno normal, de modo que registrar, editar o eliminar un
+    vehículo no toca el resto del registro. El Excel queda sólo como formato
+    de importación y exportación.
+
+    Las lecturas usan una conexión por hilo; las escrituras pasan todas por
+    una sola conexión protegida por un lock. Así `PRAGMA data_version` en esa
+    conexión sólo cambia cuando escribe otro proceso, y es lo que indica
+    cuándo reconstruir el índice de unicidad en memoria.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._escritor = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._escritor.row_factory = sqlite3.Row
+        self._indice = None
+        self._data_version = None
+        self._create_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        columnas = ", ".join(f"{sql} TEXT" for sql in list(SQL_COLUMNS.values())[1:])
+        conn = self._escritor
+        conn.execute(f"CREATE TABLE IF NOT EXISTS registro (id INTEGER PRIMARY KEY, {columnas})")
+        try:
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_registro_clave ON registro (cedula, transporte)")
+            conn.execute("DROP INDEX IF EXISTS ix_registro_cedula")
+        except sqlite3.IntegrityError:
+            # Registros antiguos con la clave repetida: se conserva el índice no único
+            self._indice_no_unico(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_registro_placa ON registro (placa)")
+        # Siguiente ID a asignar; nunca retrocede, así que los IDs eliminados no se reutilizan
+        conn.execute("CREATE TABLE IF NOT EXISTS secuencia (nombre TEXT PRIMARY KEY, siguiente INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO secuencia SELECT 'registro', MAX(COALESCE(MAX(id) + 1, 0), ?) FROM registro",
+                     (PRIMER_ID,))
+        # Versión del registro: sube con cada escritura confirmada, de este o de otro proceso
+        conn.execute("INSERT OR IGNORE INTO secuencia VALUES ('version', 0)")
+        # Marcas de una sola vez, como la migración desde el Excel. Una base de antes
+        # de esta tabla que ya tiene registros se da por migrada
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta SELECT ?, datetime('now') FROM registro LIMIT 1", (MIGRADO_EXCEL,))
+
+    @staticmethod
+    def _indice_no_unico(conn):
+        conn.execute("DROP INDEX IF EXISTS ux_registro_clave")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_registro_cedula ON registro (cedula, transporte)")
+
+    @contextmanager
+    def _transaction(self):
+        """Abre una transacción de escritura que bloquea desde el inicio (BEGIN IMMEDIATE).
+
+        Al confirmar sube la versión del registro, si se modificó alguna fila,
+        y deja en `ultima_escritura` la versión que había al empezar y la que quedó.
+        """
+        with _Transaction(self._escritor, self._lock) as conn:
+            version = conn.execute("SELECT siguiente FROM secuencia WHERE nombre = 'version'").fetchone()[0]
+            cambios = conn.total_changes
+            yield conn
+            # Una escritura que no tocó ninguna fila no cambia la versión
+            despues = version + 1 if conn.total_changes != cambios else version
+            if despues != version:
+                conn.execute("UPDATE secuencia SET siguiente = ? WHERE nombre = 'version'", (despues,))
+        self._local.escritura = (version, despues)
+
+    def marca(self):
+        """Versión del registro; cambia con cada escritura confirmada, en este o en otro proceso."""
+        return self._connect().execute("SELECT siguiente FROM secuencia WHERE nombre = 'version'").fetchone()[0]
+
+    def ultima_escritura(self):
+        """Marcas (antes, después) de la última escritura confirmada por este hilo.
+
+        Si la de antes no es la que tiene la caché, otro worker escribió en
+        medio y la caché no puede limitarse a aplicar las filas propias.
+        """
+        return getattr(self._local, "escritura", None)
+
+    def _sincronizar(self):
+        """Reconstruye el índice de unicidad si es la primera vez o si otro proceso escribió en la base."""
+        version = self._escritor.execute("PRAGMA data_version").fetchone()[0]
+        if self._indice is None or version != self._data_version:
+            filas = self._escritor.execute("SELECT id, cedula, transporte FROM registro").fetchall()
+            self._indice = IndiceUnicidad(tuple(f) for f in filas)
+            self._data_version = version
+
+    @staticmethod
+    def _to_record(row):
+        record = {col: row[sql] for col, sql in SQL_COLUMNS.items()}
+        record["ID"] = str(record["ID"])
+        return record
+
+    def migrado(self):
+        """Si la migración desde el Excel ya se hizo (aunque después se hayan borrado todos los registros)."""
+        return self._connect().execute("SELECT 1 FROM meta WHERE clave = ?", (MIGRADO_EXCEL,)).fetchone() is not None
+
+    def migrar(self, df):
+        """Copia el registro del Excel y deja la marca de migración en la misma transacción.
+
+        La marca se vuelve a mirar ya con la escritura bloqueada: si otro
+        worker migró mientras este leía el Excel, no se copia nada y se
+        devuelve False.
+        """
+        registros = [self._params(row) for row in df.to_dict(orient="records")]
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE clave = ?", (MIGRADO_EXCEL,)).fetchone() is not None:
+                return False
+            self._reemplazar(conn, df, registros)
+            conn.execute("INSERT INTO meta VALUES (?, datetime('now'))", (MIGRADO_EXCEL,))
+        return True
+
+    def load(self):
+        """Lee el registro completo como DataFrame de texto, con los nombres de columna del Excel."""
+        cursor = self._connect().cursor()
+        cursor.row_factory = None  # tuplas simples: mucho más rápido para tablas grandes
+        columnas = ", ".join(SQL_COLUMNS.values())
+        rows = cursor.execute(f"SELECT {columnas} FROM registro ORDER BY id").fetchall()
+        df = pd.DataFrame(rows, columns=EXCEL_COLUMNS, dtype=object)
+        df["ID"] = df["ID"].astype(str)
+        return df
+
+    def replace_all(self, df):
+        """Reemplaza el contenido completo de la tabla (usado por importaciones y save_database).
+
+        Si el registro trae claves (CEDULA, TIPO DE TRANSPORTE) repetidas, de
+        antes de que existiera la regla, se guarda igual: el índice único pasa
+        a ser uno normal y las claves repetidas quedan en el log.
+        """
+        registros = [self._params(row) for row in df.to_dict(orient="records")]
+        with self._transaction() as conn:
+            self._reemplazar(conn, df, registros)
+
+    def _reemplazar(self, conn, df, registros):
+        """Cuerpo de replace_all, dentro de una transacción ya abierta."""
+        conn.execute("DELETE FROM registro")
+        try:
+            conn.executemany(self._insert_sql(), registros)
+        except sqlite3.IntegrityError:
+            duplicados = df[df.duplicated(["CEDULA", "TIPO DE TRANSPORTE"], keep=False)]
+            if duplicados.empty:
+                raise  # No es la clave: un ID repetido, por ejemplo
+            claves = sorted({_clave(c, t) for c, t in zip(duplicados["CEDULA"], duplicados["TIPO DE TRANSPORTE"])},
+                            key=str)
+            logger.warning("El registro trae %d claves (CEDULA, TIPO DE TRANSPORTE) repetidas en %d filas; "
+                           "se usa un índice no único hasta corregirlas. Primeras: %s", len(claves),
+                           len(duplicados), claves[:MAX_DUPLICADOS_REPORTE])
+            # Las filas de antes del error siguen en la transacción: se vuelve a empezar
+            conn.execute("DELETE FROM registro")
+            self._indice_no_unico(conn)
+            conn.executemany(self._insert_sql(), registros)
+        conn.execute("UPDATE secuencia SET siguiente = MAX(siguiente, (SELECT COALESCE(MAX(id) + 1, 0) FROM registro))"
+                     " WHERE nombre = 'registro'")
+        self._indice = None
+
+    def get(self, id_):
+        return self.get_many([id_]).get(str(id_))
+
+    def get_many(self, ids):
+        """Busca varios IDs con una sola consulta sobre la clave primaria."""
+        ids = [int(i) for i in ids if str(i).strip().isdigit()]
+        if not ids:
+            return {}
+        conn = self._connect()
+        encontrados = {}
+        # SQLite limita la cantidad de parámetros por consulta
+        for i in range(0, len(ids), 500):
+            lote = ids[i:i + 500]
+            marcas = ",".join("?" * len(lote))
+            for row in conn.execute(f"SELECT * FROM registro WHERE id IN ({marcas})", lote):
+                record = self._to_record(row)
+                encontrados[record["ID"]] = record
+        return encontrados
+
+    def exists(self, cedula, transporte, exclude_id=None):
+        """Indica si ya hay un registro con esa CEDULA y TIPO DE TRANSPORTE, en O(1) con el índice en memoria."""
+        with self._lock:
+            self._sincronizar()
+            return self._indice.existe(cedula, transporte, exclude_id)
+
+    def claves(self):
+        """Claves (CEDULA, TIPO DE TRANSPORTE) registradas, para el anti-join del cargue masivo."""
+        with self._lock:
+            self._sincronizar()
+            return self._indice.claves()
+
+    @staticmethod
+    def _insert_sql():
+        columnas = ", ".join(SQL_COLUMNS.values())
+        marcas = ", ".join("?" * len(SQL_COLUMNS))
+        return f"INSERT INTO registro ({columnas}) VALUES ({marcas})"
+
+    @staticmethod
+    def _params(row):
+        params = [_texto(row.get(col)) for col in EXCEL_COLUMNS]
+        params[0] = int(float(params[0]))
+        return params
+
+    def insert(self, rows):
+        """Agrega filas asignándoles IDs consecutivos dentro de la misma transacción."""
+        return self.insert_chunks([rows])
+
+    def insert_chunks(self, chunks):
+        """Inserta lotes sucesivos de filas en una sola transacción con un bloque de IDs contiguo.
+
+        `chunks` puede ser un generador: cada lote se escribe apenas se produce,
+        sin acumular el archivo completo en memoria. Si algo falla, no queda
+        ninguna fila guardada.
+        """
+        ids, claves = [], []
+        # El lock envuelve la transacción para que el índice quede al día antes de que escriba otro hilo
+        with self._lock:
+            with self._transaction() as conn:
+                self._sincronizar()
+                siguiente = conn.execute("SELECT siguiente FROM secuencia WHERE nombre = 'registro'").fetchone()[0]
+                for rows in chunks:
+                    lote = range(siguiente, siguiente + len(rows))
+                    conn.executemany(self._insert_sql(), [self._params(dict(row, ID=i)) for row, i in zip(rows, lote)])
+                    ids.extend(lote)
+                    claves.extend((row.get("CEDULA"), row.get("TIPO DE TRANSPORTE")) for row in rows)
+                    siguiente += len(rows)
+                if ids:
+                    conn.execute("UPDATE secuencia SET siguiente = ? WHERE nombre = 'registro'", (siguiente,))
+            # Sólo se llega aquí si la transacción se confirmó
+            for id_, (cedula, transporte) in zip(ids, claves):
+                self._indice.agregar(id_, cedula, transporte)
+        return ids
+
+    def update(self, id_, fields):
+        """Actualiza sólo los campos indicados de una fila."""
+        return self.update_many({id_: fields}) > 0
+
+    def update_many(self, cambios):
+        """Actualiza varias filas (ID -> campos) en una sola transacción. Devuelve cuántas existían.
+
+        Las filas que cambian las mismas columnas se escriben con un solo
+        executemany.
+        """
+        grupos = {}
+        for id_, fields in cambios.items():
+            grupos.setdefault(tuple(fields), []).append([_texto(v) for v in fields.values()] + [int(id_)])
+        actualizadas = 0
+        with self._lock:
+            with self._transaction() as conn:
+                self._sincronizar()
+                for columnas, params in grupos.items():
+                    asignaciones = ", ".join(f"{SQL_COLUMNS[col]} = ?" for col in columnas)
+                    actualizadas += conn.executemany(f"UPDATE registro SET {asignaciones} WHERE id = ?", params).rowcount
+            for id_, fields in cambios.items():
+                self._indice.cambiar(id_, fields.get("CEDULA"), fields.get("TIPO DE TRANSPORTE"))
+        return actualizadas
+
+    def delete(self, ids):
+        ids = [int(i) for i in ids if str(i).strip().isdigit()]
+        with self._lock:
+            with self._transaction() as conn:
+                self._sincronizar()
+                cursor = conn.executemany("DELETE FROM registro WHERE id = ?", [(i,) for i in ids])
+            for id_ in ids:
+                self._indice.quitar(id_)
+        return cursor.rowcount
+
+
+class _Transaction:
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+def migrate_from_excel(storage, excel_path, sheet_name="Sheet1"):
+    """Migración única: copia el Excel existente a SQLite y deja la marca en la tabla meta.
+
+    El Excel se lee fuera de la transacción; la copia y la marca van juntas
+    en `SQLiteStorage.migrar`, que vuelve a comprobar la marca por si otro
+    worker migró mientras tanto. Devuelve cuántas filas copió este worker.
+    """
+    if not os.path.exists(excel_path) or storage.migrado():
+        return 0
+    df = ExcelStorage(excel_path, sheet_name, espejo=False).load()
+    df = df[pd.to_numeric(df["ID"], errors="coerce").notna()]
+    return len(df) if storage.migrar(df) else 0
+
+
+def open_storage(backend, db_path, excel_path, sheet_name="Sheet1"):
+    """Crea el backend configurado. Con SQLite se migra el Excel la primera vez."""
+    if backend == "excel":
+        return ExcelStorage(excel_path, sheet_name)
+    storage = SQLiteStorage(db_path)
+    migrate_from_excel(storage, excel_path, sheet_name)
+    return storage
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import pandas as pd
+
+from .metricas import metricas
+
+RONDAS_POR_DEFECTO = 12
+
+
+class Saturado(Exception):
+    """Hay demasiadas verificaciones de contraseña en curso o en cola."""
+
+
+def rondas(hash_):
+    """Costo de un hash de bcrypt ("$2b$12$..." -> 12), o None si no tiene ese formato."""
+    partes = str(hash_).split("$")
+    return int(partes[2]) if len(partes) > 3 and partes[2].isdigit() else None
+
+
+class VerificadorContrasenas:
+    """Corre bcrypt.checkpw en un pool acotado de hilos en vez del hilo de la petición.
+
+    bcrypt suelta el GIL mientras calcula, así que `workers` verificaciones
+    corren en paralelo sin frenar las demás peticiones. Como mucho
+    `max_pendientes` esperan o corren a la vez; pasado ese límite se lanza
+    Saturado de inmediato en lugar de encolar más. El tiempo en cola y el de
+    bcrypt quedan como tramos de las métricas.
+    """
+
+    def __init__(self, workers=2, max_pendientes=32):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+
+    def verificar(self, password, hash_):
+        if not self._cupos.acquire(blocking=False):
+            raise Saturado("Demasiados inicios de sesión en curso.")
+        encolado = time.perf_counter()
+
+        def tarea():
+            inicio = time.perf_counter()
+            try:
+                valida = bcrypt.checkpw(password, hash_)
+            except ValueError:
+                valida = False  # Hash guardado con un formato que bcrypt no reconoce
+            return valida, inicio - encolado, time.perf_counter() - inicio
+
+        try:
+            valida, espera, duracion = self._pool.submit(tarea).result()
+        finally:
+            self._cupos.release()
+        # Se registran desde el hilo de la petición para que entren en su desglose de tramos
+        if metricas.activas:
+            metricas.registrar_tramo("bcrypt.espera", espera)
+            metricas.registrar_tramo("bcrypt.checkpw", duracion)
+        return valida
+
+
+class AlmacenUsuarios:
+    """Usuarios del inicio de sesión, leídos de `ul.xlsx` y recargados cuando el archivo cambia.
+
+    La primera lectura se hace con el primer inicio de sesión, no al arrancar.
+    Después se revisa la fecha de modificación a lo sumo cada `revisar_cada`
+    segundos; si el archivo cambió se vuelve a leer y el diccionario se
+    reemplaza entero, de modo que nunca se ve a medio cargar. Si la lectura
+    falla (por ejemplo, el archivo se está escribiendo) se siguen usando los
+    usuarios anteriores.
+    """
+
+    def __init__(self, path, verificador, revisar_cada=2.0):
+        self.path = path
+        self.verificador = verificador
+        self.revisar_cada = revisar_cada
+        self._lock = threading.Lock()
+        self._usuarios = {}
+        self._mtime = None
+        self._leido = False
+        self._revisado = None
+        self._ficticio = None  # Hash contra el que se verifican los usuarios que no existen
+
+    def _file_mtime(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _leer(self):
+        df = pd.read_excel(self.path, dtype=str)
+        df = df.dropna(subset=["username", "password"])
+        return {str(u).strip(): {"password": p, "role": r}
+                for u, p, r in zip(df["username"], df["password"], df["role"])}
+
+    def _al_dia(self):
+        ahora = time.monotonic()
+        if self._revisado is not None and ahora - self._revisado < self.revisar_cada:
+            return
+        with self._lock:
+            if self._revisado is not None and ahora - self._revisado < self.revisar_cada:
+                return
+            mtime = self._file_mtime()
+            if not self._leido or mtime != self._mtime:
+                try:
+                    usuarios = self._leer() if mtime is not None else {}
+                except Exception:
+                    usuarios = None  # Se reintenta en la próxima revisión
+                if usuarios is not None:
+                    self._actualizar_ficticio(usuarios)
+                    self._usuarios = usuarios
+                    self._mtime = mtime
+                    self._leido = True
+            self._revisado = time.monotonic()
+
+    def _actualizar_ficticio(self, usuarios):
+        # Mismo costo que los hashes guardados: un usuario inexistente tarda lo mismo que una clave errada
+        costo = next((r for r in map(rondas, (u["password"] for u in usuarios.values())) if r), RONDAS_POR_DEFECTO)
+        if self._ficticio is None or rondas(self._ficticio) != costo:
+            self._ficticio = bcrypt.hashpw(os.urandom(16), bcrypt.gensalt(costo)).decode()
+
+    def get(self, username):
+        self._al_dia()
+        return self._usuarios.get(username)
+
+    def autenticar(self, username, password):
+        """Rol del usuario si la contraseña es correcta, o None.
+
+        Siempre se corre bcrypt, también si el usuario no existe, para que el
+        tiempo de respuesta no revele qué nombres de usuario son válidos.
+        Lanza Saturado si el pool de verificación está lleno.
+        """
+        usuario = self.get(username)
+        hash_ = usuario["password"] if usuario is not None else self._ficticio
+        valida = self.verificador.verificar(password.encode(), str(hash_).encode())
+        return usuario["role"] if usuario is not None and valida else None
@@ -1,6 +1,15 @@
 from app import create_app
 
-app = create_app()
+
+def __getattr__(nombre):
+    # "gunicorn run:app" pide la aplicación por nombre y se crea recién entonces. Los procesos
+    # que decodifican QR ("spawn") vuelven a importar este archivo como __mp_main__ y no la crean
+    if nombre == "app":
+        globals()["app"] = app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 
 if __name__ == '__main__':
+    app = create_app()
     app.run(host="0.0.0.0", port=5000,debug=True,ssl_context=("cert.crt","cert.key"))
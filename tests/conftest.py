@@ -0,0 +1,28 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# Los tests importan `app` y `utils` desde la raíz del repositorio, como los benchmarks
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+HOY = date(2025, 6, 15)
+
+
+def fila(id_, cedula, transporte="CARRO", **campos):
+    """Fila completa del registro; las columnas que no se indican quedan vacías (None).
+
+    Las columnas con espacios van como diccionario: fila(1, "101", **{"NOMBRES Y APELLIDOS": "ANA"}).
+    """
+    from app.storage import EXCEL_COLUMNS
+    base = {col: None for col in EXCEL_COLUMNS}
+    return base | {"ID": str(id_), "CEDULA": cedula, "TIPO DE TRANSPORTE": transporte} | campos
+
+
+@pytest.fixture
+def registro():
+    """Registro sintético chico (todo texto, IDs desde 8000000), con fechas alrededor de HOY."""
+    from utils.sintetico import registro_sintetico
+    return registro_sintetico(40, hoy=HOY)
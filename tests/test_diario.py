@@ -0,0 +1,122 @@
+import json
+
+import pandas as pd
+import pytest
+
+from app.diario import Diario
+from app.storage import EXCEL_COLUMNS, ExcelStorage, aplicar_diario
+from conftest import fila
+
+
+def libro(*filas):
+    return pd.DataFrame(list(filas), columns=EXCEL_COLUMNS)
+
+
+def test_leer_ignora_la_ultima_linea_cortada(tmp_path):
+    diario = Diario(str(tmp_path / "r.diario"))
+    diario.agregar([{"op": "delete", "ids": ["1"]}, {"op": "delete", "ids": ["2"]}])
+    with open(diario.path, "ab") as f:
+        f.write(b'{"op": "delete", "ids": ["3"')  # corte de luz a mitad de la escritura
+    assert [e["ids"] for e in diario.leer()] == [["1"], ["2"]]
+
+
+def test_leer_sin_diario(tmp_path):
+    assert Diario(str(tmp_path / "no_existe.diario")).leer() == []
+
+
+def test_aplicar_diario_en_orden():
+    df = libro(fila(1, "111", PLACA="AAA111"), fila(2, "222"), fila(3, "333"))
+    entradas = [
+        {"op": "update", "id": "1", "campos": {"PLACA": "BBB222"}},
+        {"op": "insert", "filas": [fila(4, "444")]},
+        {"op": "update", "id": "4", "campos": {"PLACA": "CCC333"}},
+        {"op": "delete", "ids": ["2", "4"]},
+        {"op": "insert", "filas": [fila(5, "555")]},
+        {"op": "update", "id": "9", "campos": {"PLACA": "NO EXISTE"}},
+    ]
+    resultado = aplicar_diario(df, entradas)
+    assert resultado["ID"].tolist() == ["1", "3", "5"]
+    assert resultado.set_index("ID").at["1", "PLACA"] == "BBB222"
+
+
+def test_aplicar_diario_es_idempotente():
+    df = libro(fila(1, "111"), fila(2, "222"))
+    entradas = [{"op": "insert", "filas": [fila(3, "333")]},
+                {"op": "update", "id": "1", "campos": {"PLACA": "XYZ123"}},
+                {"op": "delete", "ids": ["2"]}]
+    una_vez = aplicar_diario(df, entradas)
+    # Una compactación a medias deja el libro ya actualizado y el diario sin vaciar
+    dos_veces = aplicar_diario(una_vez, entradas)
+    pd.testing.assert_frame_equal(una_vez.astype(object), dos_veces.astype(object))
+
+
+def test_escrituras_se_leen_del_diario_desde_otra_instancia(tmp_path, registro):
+    path = str(tmp_path / "BASE SOAT.xlsx")
+    almacen = ExcelStorage(path, espejo=False)
+    almacen.replace_all(registro)
+
+    nuevo, = almacen.insert([{"CEDULA": "999", "TIPO DE TRANSPORTE": "MOTO", "PLACA": "QQQ999"}])
+    almacen.update("8000001", {"PLACA": "ZZZ000"})
+    almacen.delete(["8000002"])
+
+    diario = Diario(str(tmp_path / "BASE SOAT.diario")).leer()
+    assert [e["op"] for e in diario] == ["insert", "update", "delete"]
+
+    # Otro worker: lee el libro sin las escrituras y les aplica el diario
+    otro = ExcelStorage(path, espejo=False).load().set_index("ID")
+    assert otro.at[str(nuevo), "PLACA"] == "QQQ999"
+    assert otro.at["8000001", "PLACA"] == "ZZZ000"
+    assert "8000002" not in otro.index
+    assert len(otro) == len(registro)
+
+
+def test_compactar_vuelca_el_diario_en_el_libro(tmp_path, registro):
+    path = str(tmp_path / "BASE SOAT.xlsx")
+    almacen = ExcelStorage(path, espejo=False)
+    almacen.replace_all(registro)
+    almacen.update("8000003", {"OBSERVACIONES": "COMPACTADO"})
+    almacen.delete(["8000004"])
+    antes = almacen.load()
+
+    assert almacen.compactar() is True
+    assert (tmp_path / "BASE SOAT.diario").stat().st_size == 0
+    assert almacen.compactar() is False  # Nada pendiente
+
+    releido = pd.read_excel(path, dtype=str)
+    pd.testing.assert_frame_equal(releido.fillna("").astype(object), antes.fillna("").astype(object),
+                                  check_dtype=False)
+
+
+def test_ids_eliminados_no_se_reutilizan_tras_compactar(tmp_path, registro):
+    path = str(tmp_path / "BASE SOAT.xlsx")
+    almacen = ExcelStorage(path, espejo=False)
+    almacen.replace_all(registro)
+    ultimo = int(registro["ID"].iloc[-1])
+    nuevo, = almacen.insert([{"CEDULA": "999", "TIPO DE TRANSPORTE": "MOTO"}])
+    almacen.delete([nuevo])
+    almacen.compactar()
+
+    otro = ExcelStorage(path, espejo=False)
+    assert otro.insert([{"CEDULA": "998", "TIPO DE TRANSPORTE": "MOTO"}]) == [ultimo + 2]
+
+
+def test_unicidad_se_valida_contra_el_diario(tmp_path, registro):
+    path = str(tmp_path / "BASE SOAT.xlsx")
+    ExcelStorage(path, espejo=False).replace_all(registro)
+    ExcelStorage(path, espejo=False).insert([{"CEDULA": "999", "TIPO DE TRANSPORTE": "MOTO"}])
+    # La otra instancia todavía no compactó: la clave sólo está en el diario
+    assert ExcelStorage(path, espejo=False).exists("999", "MOTO")
+    assert json.loads((tmp_path / "BASE SOAT.diario").read_text().splitlines()[0])["op"] == "insert"
+
+
+def test_insert_chunks_fallido_no_deja_lotes_anteriores(tmp_path, registro):
+    path = str(tmp_path / "BASE SOAT.xlsx")
+    almacen = ExcelStorage(path, espejo=False)
+    almacen.replace_all(registro)
+    lotes = [[{"CEDULA": "901", "TIPO DE TRANSPORTE": "MOTO"}],
+             [{"CEDULA": "902", "TIPO DE TRANSPORTE": "MOTO"}, {"CEDULA": "902", "TIPO DE TRANSPORTE": "MOTO"}]]
+    with pytest.raises(ValueError):
+        almacen.insert_chunks(iter(lotes))
+    assert not almacen.exists("901", "MOTO")
+    assert almacen.insert_chunks(iter(lotes[:1])) == [int(registro["ID"].astype(int).max()) + 1]
+    assert len(almacen.load()) == len(registro) + 1
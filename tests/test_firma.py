@@ -0,0 +1,75 @@
+import os
+from datetime import date
+
+import pytest
+
+from app.firma import FirmaQR, QRInvalido, es_firmado
+
+
+@pytest.fixture
+def firma(tmp_path):
+    return FirmaQR(str(tmp_path / "qr.key"))
+
+
+def test_firmar_y_verificar(firma):
+    texto = firma.firmar(8000123, "2025/06/30", "2025/09/15", emitido=1760000000)
+    assert texto.startswith("ID: 8000123\n")
+    assert es_firmado(texto)
+    assert firma.verificar(texto) == {"ID": "8000123", "SOAT": date(2025, 6, 30),
+                                      "TECNOMECANICA": date(2025, 9, 15), "EMITIDO": 1760000000}
+
+
+def test_acepta_fin_de_linea_de_windows(firma):
+    texto = firma.firmar(8000123, "2025/06/30", "2025/09/15")
+    assert firma.verificar(texto.replace("\n", "\r\n"))["ID"] == "8000123"
+
+
+@pytest.mark.parametrize("cambio", [
+    ("ID: 8000123", "ID: 8000124"),
+    ("SOAT: 2025/06/30", "SOAT: 2099/06/30"),
+    ("V: 1", "V: 2"),
+])
+def test_rechaza_el_texto_alterado(firma, cambio):
+    texto = firma.firmar(8000123, "2025/06/30", "2025/09/15")
+    with pytest.raises(QRInvalido):
+        firma.verificar(texto.replace(*cambio))
+
+
+def test_rechaza_firma_alterada_o_ausente(firma):
+    texto = firma.firmar(8000123, "2025/06/30", "2025/09/15")
+    cuerpo, _, valor = texto.rpartition("\nFIRMA: ")
+    alterada = valor[:10] + ("A" if valor[10] != "A" else "B") + valor[11:]
+    for falso in (f"{cuerpo}\nFIRMA: {alterada}", f"{cuerpo}\nFIRMA: ", f"{cuerpo}\nFIRMA: no-es-base64!"):
+        with pytest.raises(QRInvalido):
+            firma.verificar(falso)
+
+
+def test_rechaza_qr_firmado_con_otra_clave(firma, tmp_path):
+    ajeno = FirmaQR(str(tmp_path / "otra.key")).firmar(8000123, "2099/01/01", "2099/01/01")
+    with pytest.raises(QRInvalido):
+        firma.verificar(ajeno)
+
+
+def test_la_clave_se_conserva_entre_instancias(firma, tmp_path):
+    texto = firma.firmar(8000123, "2025/06/30", "2025/09/15")
+    otra = FirmaQR(firma.path)
+    assert otra.verificar(texto)["ID"] == "8000123"
+    assert otra.clave_publica_pem() == firma.clave_publica_pem()
+    if os.name == "posix":
+        assert os.stat(firma.path).st_mode & 0o777 == 0o600
+
+
+def test_vigente_segun_las_fechas_firmadas(firma):
+    campos = firma.verificar(firma.firmar(8000123, "2025/06/30", "2025/09/15"))
+    assert FirmaQR.vigente(campos, date(2025, 6, 30))
+    assert not FirmaQR.vigente(campos, date(2025, 7, 1))
+
+
+def test_fecha_invalida_queda_no_vigente(firma):
+    campos = firma.verificar(firma.firmar(8000123, "2099/01/01", "no es fecha"))
+    assert campos["TECNOMECANICA"] is None
+    assert not FirmaQR.vigente(campos, date(2025, 1, 1))
+
+
+def test_formato_antiguo_no_es_firmado():
+    assert not es_firmado("ID: 8000123")
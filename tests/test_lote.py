@@ -0,0 +1,81 @@
+"""Selección de registros de la edición y eliminación en bloque (/api/usuarios/lote)."""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from app.registry import RegistryCache
+from app.storage import EXCEL_COLUMNS, SQLiteStorage
+from conftest import fila
+
+VIGENTE, VENCIDA = "2099/01/01", "2000/01/01"
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    almacen = SQLiteStorage(str(tmp_path / "registro.db"))
+    almacen.replace_all(pd.DataFrame([
+        fila(1, "101", EMPRESA="EMPRESA A", PLACA="AAA111", SOAT=VIGENTE, TECNOMECANICA=VIGENTE),
+        fila(2, "102", EMPRESA="EMPRESA A", PLACA="BBB222", SOAT=VENCIDA, TECNOMECANICA=VIGENTE),
+        fila(3, "103", EMPRESA="EMPRESA B", PLACA="CCC333", SOAT=VIGENTE, TECNOMECANICA=VIGENTE,
+             **{"NOMBRES Y APELLIDOS": "LUISA PEREZ"}),
+        fila(4, "104", EMPRESA="EMPRESA B", PLACA="DDD444", SOAT="2099/03/15", TECNOMECANICA="2099/06/01"),
+        fila(5, "105", EMPRESA="EMPRESA C", PLACA="EEE555", SOAT=VENCIDA, TECNOMECANICA=VIGENTE,
+             **{"NOMBRES Y APELLIDOS": "LUISA DIAZ"}),
+    ], columns=EXCEL_COLUMNS))
+    return almacen
+
+
+@pytest.fixture
+def cache(almacen):
+    return RegistryCache(almacen.path, almacen.load, almacen.marca)
+
+
+def ids(df):
+    return sorted(df["ID"].astype(int).tolist())
+
+
+def test_por_ids_ignora_los_que_no_existen(cache):
+    assert ids(cache.consulta().seleccionar(ids=[1, "3", " 4 ", 99])) == [1, 3, 4]
+
+
+def test_por_placas_sin_importar_mayusculas_ni_espacios(cache):
+    assert ids(cache.consulta().seleccionar(placas=["aaa111", " CCC333 ", "ZZZ999"])) == [1, 3]
+
+
+def test_por_estado_y_empresa(cache):
+    consulta = cache.consulta()
+    assert ids(consulta.seleccionar(filtros={"ESTADO": "Inactivo"})) == [2, 5]
+    assert ids(consulta.seleccionar(filtros={"ESTADO": "activo", "EMPRESA": "empresa b"})) == [3, 4]
+
+
+def test_por_rango_de_vencimiento(cache):
+    assert ids(cache.consulta().seleccionar(rangos={"VENCE": (date(2099, 2, 1), date(2099, 12, 31))})) == [4]
+    assert ids(cache.consulta().seleccionar(rangos={"VENCE": (None, date(2001, 1, 1))})) == [2, 5]
+
+
+def test_por_texto(cache):
+    assert ids(cache.consulta().seleccionar(texto="luisa")) == [3, 5]
+
+
+def test_ids_y_filtro_se_intersectan(cache):
+    assert ids(cache.consulta().seleccionar(ids=[1, 2, 3, 5], filtros={"EMPRESA": "EMPRESA A"})) == [1, 2]
+
+
+def test_la_seleccion_refleja_las_escrituras_aplicadas(almacen, cache):
+    cache.consulta()  # Caché cargada antes de escribir
+    almacen.update_many({"1": {"EMPRESA": "EMPRESA C"}, "2": {"SOAT": VIGENTE}})
+    cache.aplicar(almacen.get_many(["1", "2"]).values(), marcas=almacen.ultima_escritura())
+    almacen.delete(["3"])
+    cache.aplicar(eliminados=["3"], marcas=almacen.ultima_escritura())
+    nuevo, = almacen.insert([fila(0, "106", EMPRESA="EMPRESA C", PLACA="FFF666", SOAT=VIGENTE,
+                                  TECNOMECANICA=VIGENTE)])
+    cache.aplicar(almacen.get_many([nuevo]).values(), marcas=almacen.ultima_escritura())
+    assert not cache._stale  # Se aplicó fila a fila, sin recargar
+
+    consulta = cache.consulta()
+    assert ids(consulta.seleccionar(filtros={"EMPRESA": "EMPRESA C"})) == [1, 5, nuevo]
+    assert ids(consulta.seleccionar(filtros={"ESTADO": "Inactivo"})) == [5]
+    assert ids(consulta.seleccionar(ids=[3])) == []
+    # Igual que releer todo el almacenamiento
+    pd.testing.assert_frame_equal(cache.dataframe(), RegistryCache(almacen.path, almacen.load).dataframe())
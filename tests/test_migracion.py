@@ -0,0 +1,84 @@
+import logging
+import sqlite3
+
+import pytest
+
+from app.storage import MIGRADO_EXCEL, SQLiteStorage, open_storage
+from utils.sintetico import escribir_registro_xlsx
+
+
+def indices(path):
+    with sqlite3.connect(path) as conn:
+        return {nombre for (nombre,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    return str(tmp_path / "registro.db"), str(tmp_path / "BASE SOAT.xlsx")
+
+
+def test_migra_el_excel_la_primera_vez(rutas, registro):
+    db, excel = rutas
+    escribir_registro_xlsx(registro, excel)
+    almacen = open_storage("sqlite", db, excel)
+    assert almacen.load()["ID"].tolist() == registro["ID"].tolist()
+    assert almacen.migrado()
+    assert "ux_registro_clave" in indices(db)
+    # El índice único sigue vigente para las altas posteriores
+    cedula, transporte = registro.loc[0, ["CEDULA", "TIPO DE TRANSPORTE"]]
+    assert almacen.exists(cedula, transporte)
+
+
+def test_migra_claves_repetidas_con_indice_no_unico(rutas, registro, caplog):
+    db, excel = rutas
+    registro.loc[5, ["CEDULA", "TIPO DE TRANSPORTE"]] = registro.loc[4, ["CEDULA", "TIPO DE TRANSPORTE"]].to_numpy()
+    escribir_registro_xlsx(registro, excel)
+
+    with caplog.at_level(logging.WARNING, logger="app.storage"):
+        almacen = open_storage("sqlite", db, excel)
+
+    assert len(almacen.load()) == len(registro)  # No se pierde ninguna fila
+    assert "ux_registro_clave" not in indices(db)
+    assert "ix_registro_cedula" in indices(db)
+    assert registro.loc[4, "CEDULA"] in caplog.text
+
+    # Al reabrir no se vuelve a crear el índice único ni falla el arranque
+    assert len(open_storage("sqlite", db, excel).load()) == len(registro)
+
+
+def test_no_vuelve_a_migrar_si_se_borra_todo(rutas, registro):
+    db, excel = rutas
+    escribir_registro_xlsx(registro, excel)
+    almacen = open_storage("sqlite", db, excel)
+    almacen.delete(registro["ID"].tolist())
+    assert open_storage("sqlite", db, excel).load().empty
+
+
+def test_base_anterior_con_registros_se_da_por_migrada(rutas, registro):
+    db, excel = rutas
+    SQLiteStorage(db).replace_all(registro.iloc[:3])
+    with sqlite3.connect(db) as conn:
+        conn.execute("DROP TABLE meta")  # Base creada antes de la tabla meta
+    escribir_registro_xlsx(registro, excel)
+
+    almacen = open_storage("sqlite", db, excel)
+    assert almacen.migrado()
+    assert len(almacen.load()) == 3
+
+
+def test_sin_excel_no_marca_la_migracion(rutas):
+    db, excel = rutas
+    almacen = open_storage("sqlite", db, excel)
+    assert not almacen.migrado()
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM meta WHERE clave = ?", (MIGRADO_EXCEL,)).fetchone()[0] == 0
+
+
+def test_no_copia_si_otro_worker_migro_mientras_leia_el_excel(rutas, registro):
+    db, _ = rutas
+    almacen = SQLiteStorage(db)
+    assert almacen.migrar(registro.iloc[:3])
+    almacen.delete([registro.loc[0, "ID"]])  # Cambios hechos después de la migración
+    # Otro worker que leyó el Excel antes de la marca no pisa el registro
+    assert not SQLiteStorage(db).migrar(registro)
+    assert len(almacen.load()) == 2
@@ -0,0 +1,82 @@
+"""Caché del registro con varios workers escribiendo sobre el mismo almacenamiento."""
+import threading
+
+import pandas as pd
+import pytest
+
+from app import registry
+from app.registry import IndiceConsulta, RegistryCache
+from app.storage import EXCEL_COLUMNS, ExcelStorage, SQLiteStorage
+from conftest import fila
+
+
+BACKENDS = {
+    "sqlite": ("registro.db", SQLiteStorage),
+    "excel": ("registro.xlsx", lambda path: ExcelStorage(path, espejo=False)),
+}
+
+
+@pytest.fixture(params=BACKENDS)
+def workers(request, tmp_path):
+    """Dos workers sobre el mismo registro, cada uno con su almacenamiento y su caché."""
+    nombre, abrir = BACKENDS[request.param]
+    path = str(tmp_path / nombre)
+    abrir(path).replace_all(pd.DataFrame([fila(1, "101")], columns=EXCEL_COLUMNS))
+    workers = []
+    for _ in range(2):
+        almacen = abrir(path)
+        cache = RegistryCache(almacen.path, almacen.load, almacen.marca)
+        cache.dataframe()
+        workers.append((almacen, cache))
+    return workers
+
+
+def insertar(almacen, cache, cedula):
+    id_, = almacen.insert([fila(0, cedula)])
+    cache.aplicar(almacen.get_many([id_]).values(), marcas=almacen.ultima_escritura())
+    return id_
+
+
+def test_no_pierde_la_escritura_de_otro_worker_entre_dos_propias(workers):
+    (almacen_a, cache_a), (almacen_b, cache_b) = workers
+    propio = insertar(almacen_a, cache_a, "102")
+    ajeno = insertar(almacen_b, cache_b, "103")
+    otro = insertar(almacen_a, cache_a, "104")
+
+    assert cache_a.get(ajeno) is not None
+    assert [cache_a.get(i) is not None for i in (propio, otro)] == [True, True]
+    pd.testing.assert_frame_equal(cache_a.dataframe(), cache_b.dataframe())
+
+
+def test_sin_escrituras_ajenas_aplica_sin_recargar(workers):
+    (almacen_a, cache_a), _ = workers
+    insertar(almacen_a, cache_a, "102")
+    assert cache_a._mtime == almacen_a.marca()
+
+
+def test_la_consulta_se_construye_sin_bloquear_las_escrituras(workers, monkeypatch):
+    (almacen, cache), _ = workers
+    construir = registry.IndiceConsulta
+    bloqueadas = []
+
+    def construir_mientras_escriben(*args):
+        hilo = threading.Thread(target=insertar, args=(almacen, cache, "102"))
+        hilo.start()
+        hilo.join(5)
+        bloqueadas.append(hilo.is_alive())
+        return construir(*args)
+
+    monkeypatch.setattr(registry, "IndiceConsulta", construir_mientras_escriben)
+    assert len(cache.consulta()) == 1  # Construida sobre la versión de antes de la escritura
+    assert bloqueadas == [False]
+    monkeypatch.undo()
+    assert len(cache.consulta()) == 2  # No se publicó: la siguiente consulta ve la escritura
+
+
+def test_exportar_conserva_los_valores_guardados():
+    df = pd.DataFrame([fila(1, "LT99X", **{"TARJETA DE PROPIEDAD": "T-77"}), fila(2, "102.0")], columns=EXCEL_COLUMNS)
+    consulta = IndiceConsulta(df)
+    _, lotes = consulta.recorrer(["ID", "CEDULA", "TARJETA DE PROPIEDAD"])
+    assert [f for lote in lotes for f in lote] == [("1", "LT99X", "T-77"), ("2", "102.0", "")]
+    # La búsqueda y la vista usan la cédula normalizada
+    assert [f["CEDULA"] for f in consulta.buscar(texto="102")[1]] == ["102"]
@@ -0,0 +1,50 @@
+"""Bitácora de versiones de los validadores sin conexión frente a escrituras que no llegan a anotarse."""
+import pandas as pd
+import pytest
+
+from app.sincronizacion import VersionLog
+from app.storage import EXCEL_COLUMNS, SQLiteStorage
+from conftest import fila
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    almacen = SQLiteStorage(str(tmp_path / "registro.db"))
+    almacen.replace_all(pd.DataFrame([fila(1, "101"), fila(2, "102")], columns=EXCEL_COLUMNS))
+    return almacen
+
+
+@pytest.fixture
+def versiones(tmp_path, almacen):
+    versiones = VersionLog(str(tmp_path / "versiones.db"))
+    versiones.reiniciar(almacen.ultima_escritura())
+    return versiones
+
+
+def test_delta_con_la_bitacora_al_dia(almacen, versiones):
+    inicial = versiones.actual()
+    almacen.update("1", {"PLACA": "AAA111"})
+    versiones.registrar(["1"], marcas=almacen.ultima_escritura())
+    version, ids = versiones.cambios_desde(inicial, almacen.marca())
+    assert version == versiones.actual()
+    assert ids.tolist() == [1]
+
+
+def test_escritura_sin_anotar_pide_la_proyeccion_completa(almacen, versiones):
+    inicial = versiones.actual()
+    almacen.update("1", {"PLACA": "AAA111"})  # El worker se cae antes de anotar la versión
+    assert versiones.cambios_desde(inicial, almacen.marca()) is None
+
+    # La próxima escritura anotada tampoco permite un delta que cruce la perdida
+    almacen.update("2", {"PLACA": "BBB222"})
+    versiones.registrar(["2"], marcas=almacen.ultima_escritura())
+    assert versiones.cambios_desde(inicial, almacen.marca()) is None
+    assert versiones.cambios_desde(versiones.actual(), almacen.marca())[1].tolist() == []
+
+
+def test_escritura_sin_filas_no_cambia_la_marca(almacen, versiones):
+    marca = almacen.marca()
+    assert almacen.update_many({"99": {"PLACA": "ZZZ999"}}) == 0
+    assert almacen.insert_chunks(iter([])) == []
+    assert almacen.marca() == marca
+    assert almacen.ultima_escritura() == (marca, marca)
@@ -0,0 +1,129 @@
+"""Benchmark del arranque en frío de un worker: create_app() y la primera carga del registro.
+
+Cada corrida es un proceso nuevo sobre el mismo directorio temporal con un
+registro sintético. Con el backend Excel la primera corrida no encuentra el
+espejo columnar y parsea el libro (y deja el espejo escrito); las
+siguientes lo leen, que es el caso normal de un worker nuevo. Se reporta
+también qué módulos pesados quedaron sin importar al terminar create_app()
+y cuánto costaría importarlos.
+
+Uso:
+    python -m utils.bench_arranque [--filas 100000] [--corridas 3] [--backend excel|sqlite]
+                                   [--salida resultados.json]
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dependencias que sólo usan algunas rutas y se importan con la primera petición que las necesita
+DIFERIDOS = ("cv2", "qrcode", "openpyxl")
+
+
+def preparar_directorio(filas, backend):
+    from utils.sintetico import escribir_registro_xlsx, registro_sintetico
+
+    directorio = tempfile.mkdtemp(prefix=f"arranque_{filas}_")
+    registro = registro_sintetico(filas)
+    if backend == "excel":
+        escribir_registro_xlsx(registro, os.path.join(directorio, "BASE SOAT.xlsx"))
+    else:
+        from app.storage import SQLiteStorage
+        SQLiteStorage(os.path.join(directorio, "registro.db")).replace_all(registro)
+    # Los usuarios del inicio de sesión también se leen al arrancar
+    if os.path.exists(os.path.join(RAIZ, "ul.xlsx")):
+        shutil.copy(os.path.join(RAIZ, "ul.xlsx"), directorio)
+    return directorio
+
+
+def correr(backend):
+    """Una corrida en frío; se ejecuta en el proceso hijo, con el directorio de trabajo ya elegido."""
+    sys.path.insert(0, RAIZ)
+    os.environ["REGISTRO_BACKEND"] = backend
+    con_espejo = os.path.exists("BASE SOAT.columnas.npz")
+
+    inicio = time.perf_counter()
+    from app import create_app
+    create_app()
+    create_app_s = time.perf_counter() - inicio
+    sin_importar = [m for m in DIFERIDOS if m not in sys.modules]
+
+    from app import routes
+    inicio = time.perf_counter()
+    filas = len(routes.load_database())
+    primera_carga_s = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for modulo in sin_importar:
+        importlib.import_module(modulo)
+    diferidos_s = time.perf_counter() - inicio
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB en Linux
+    return {
+        "filas": filas,
+        "espejo_previo": con_espejo,
+        "create_app_s": round(create_app_s, 3),
+        "primera_carga_s": round(primera_carga_s, 3),
+        "total_s": round(create_app_s + primera_carga_s, 3),
+        "sin_importar": sin_importar,
+        "diferidos_s": round(diferidos_s, 3),
+        "rss_max_mb": round(rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--corridas", type=int, default=3)
+    parser.add_argument("--backend", default="excel", choices=("sqlite", "excel"))
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        json.dump(correr(args.backend), sys.stdout)
+        return
+
+    sys.path.insert(0, RAIZ)
+    print(f"Registro de {args.filas} filas ({args.backend})", file=sys.stderr)
+    directorio = preparar_directorio(args.filas, args.backend)
+    corridas = []
+    for _ in range(args.corridas):
+        # Un proceso por corrida: nada de lo importado o cargado pasa de una a otra
+        proceso = subprocess.run([sys.executable, "-m", "utils.bench_arranque", "--hijo", "--backend", args.backend],
+                                 cwd=directorio, env=dict(os.environ, PYTHONPATH=RAIZ),
+                                 stdout=subprocess.PIPE, check=True)
+        corrida = json.loads(proceso.stdout)
+        corridas.append(corrida)
+        print(f"  espejo previo {'sí' if corrida['espejo_previo'] else 'no':<3} create_app {corrida['create_app_s']:7.3f} s"
+              f"  primera carga {corrida['primera_carga_s']:7.3f} s  total {corrida['total_s']:7.3f} s"
+              f"  (diferidos {corrida['diferidos_s']:.3f} s: {', '.join(corrida['sin_importar']) or '-'})",
+              file=sys.stderr)
+
+    documento = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "corridas": corridas,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(documento, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(documento, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compara la normalización por columnas contra los helpers por celda en columnas de 100k filas.
+
+Uso: python -m utils.bench_normalizacion [filas]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.normalizacion import convert_date, convert_to_int_str, normalizar_enteros, normalizar_fechas
+
+
+def columnas_sinteticas(filas, semilla=0):
+    """Columnas con la mezcla típica de un cargue: texto en dos formatos, fechas de Excel y números como float."""
+    rng = np.random.default_rng(semilla)
+    base = datetime(2020, 1, 1)
+    dias = rng.integers(0, 3650, filas)
+    fechas = [base + timedelta(days=int(d)) for d in dias]
+    texto = np.where(rng.random(filas) < 0.8,
+                     [f.strftime("%d/%m/%Y") for f in fechas],
+                     [f.strftime("%Y-%m-%d") for f in fechas]).astype(object)
+    mixtas = pd.Series(texto, dtype=object)
+    mixtas[rng.random(filas) < 0.05] = "sin fecha"
+    celdas_fecha = rng.random(filas) < 0.1
+    mixtas[celdas_fecha] = pd.Series(fechas, dtype=object)[celdas_fecha]
+    cedulas = pd.Series(rng.integers(10**7, 10**10, filas).astype(float))
+    cedulas[rng.random(filas) < 0.05] = np.nan
+    return mixtas, cedulas
+
+
+def medir(nombre, fn, repeticiones=3):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    print(f"{nombre:<40} {mejor * 1000:10.1f} ms")
+    return mejor
+
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    fechas, cedulas = columnas_sinteticas(filas)
+    print(f"Columnas de {filas} filas")
+
+    antes = medir("convert_date por celda", lambda: fechas.apply(convert_date))
+    despues = medir("normalizar_fechas", lambda: normalizar_fechas(fechas))
+    print(f"{'':<40} {antes / despues:10.1f} x")
+
+    antes = medir("convert_to_int_str por celda", lambda: cedulas.apply(convert_to_int_str))
+    despues = medir("normalizar_enteros", lambda: normalizar_enteros(cedulas))
+    print(f"{'':<40} {antes / despues:10.1f} x")
+
+    # Los resultados deben coincidir con los helpers originales donde éstos leen la fecha
+    esperado = fechas.apply(convert_date)
+    obtenido, invalidas = normalizar_fechas(fechas)
+    comparables = esperado != ""
+    assert (obtenido[comparables] == esperado[comparables]).all()
+    assert (normalizar_enteros(cedulas)[0] == cedulas.apply(convert_to_int_str)).all()
+    print(f"Celdas de fecha inválidas: {int(invalidas.sum())}")
+
+
+if __name__ == "__main__":
+    main()
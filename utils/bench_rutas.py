@@ -0,0 +1,290 @@
+"""Benchmark de las rutas principales sobre registros sintéticos de distintos tamaños.
+
+Cada tamaño corre en un proceso aparte, con su propio directorio temporal
+(registro, clave de firma, bitácora de versiones), y las rutas se llaman con
+el cliente de pruebas de Flask. Por cada ruta se reporta p50/p99 de
+latencia, operaciones (y filas) por segundo y el pico de memoria de Python
+de una llamada, medido con tracemalloc en una pasada aparte para no
+alterar los tiempos.
+
+Uso:
+    python -m utils.bench_rutas [--filas 1000,10000,100000,500000] [--backend sqlite|excel]
+                                [--salida resultados.json] [--comparar anterior.json]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAMANOS = (1000, 10_000, 100_000, 500_000)
+
+
+class Escenario:
+    """Una ruta a medir: `fn(i)` hace la i-ésima llamada y devuelve cuántas filas procesó (o None)."""
+
+    def __init__(self, nombre, fn, repeticiones, calentar=True):
+        self.nombre = nombre
+        self.fn = fn
+        self.repeticiones = repeticiones
+        self.calentar = calentar
+
+
+def medir(escenario):
+    """Corre el escenario y devuelve sus estadísticas; la llamada 0 es de calentamiento."""
+    inicio_i = 0
+    if escenario.calentar:
+        escenario.fn(0)
+        inicio_i = 1
+    tiempos, filas = [], 0
+    for i in range(inicio_i, inicio_i + escenario.repeticiones):
+        inicio = time.perf_counter()
+        procesadas = escenario.fn(i)
+        tiempos.append(time.perf_counter() - inicio)
+        filas += procesadas or 0
+
+    tracemalloc.start()
+    try:
+        escenario.fn(inicio_i + escenario.repeticiones)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    tiempos = np.array(tiempos)
+    total = tiempos.sum()
+    return {
+        "ruta": escenario.nombre,
+        "n": len(tiempos),
+        "p50_ms": round(float(np.percentile(tiempos, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(tiempos, 99)) * 1000, 3),
+        "media_ms": round(float(tiempos.mean()) * 1000, 3),
+        "ops_s": round(len(tiempos) / total, 2) if total else None,
+        "filas_s": round(filas / total, 1) if filas and total else None,
+        "pico_mb": round(pico / 2**20, 2),
+    }
+
+
+def preparar_directorio(filas, backend):
+    """Crea el directorio de trabajo con el registro sintético ya cargado en el backend."""
+    from utils.sintetico import escribir_registro_xlsx, registro_sintetico
+
+    directorio = tempfile.mkdtemp(prefix=f"bench_{filas}_")
+    registro = registro_sintetico(filas)
+    os.chdir(directorio)
+    os.makedirs(os.path.join("temp", "jobs"), exist_ok=True)
+    if backend == "excel":
+        escribir_registro_xlsx(registro, "BASE SOAT.xlsx")
+    else:
+        from app.storage import SQLiteStorage
+        SQLiteStorage("registro.db").replace_all(registro)
+    return directorio, registro
+
+
+def escenarios(app, routes, registro):
+    """Escenarios de todas las rutas, en un orden que deja las escrituras destructivas al final."""
+    from utils.sintetico import cargue_sintetico
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion["username"] = "bench"
+        sesion["role"] = "admin"
+
+    ids = registro["ID"].tolist()
+    filas = len(ids)
+    rng = np.random.default_rng(2)
+    al_azar = [ids[i] for i in rng.integers(0, filas, 5000)]
+    qrs = [routes.firma.firmar(id_, "2099/01/01", "2099/01/01") for id_ in al_azar]
+
+    def ok(respuesta, *codigos):
+        codigos = codigos or (200,)
+        if respuesta.status_code not in codigos:
+            raise RuntimeError(f"{respuesta.request.path}: HTTP {respuesta.status_code}")
+        return respuesta
+
+    def pedir(url):
+        ok(cliente.get(url))
+
+    def load_frio(i):
+        routes.registry.invalidate()
+        return len(routes.load_database())
+
+    def save(i):
+        df = routes.load_database()
+        routes.save_database(df)
+        return len(df)
+
+    def procesar_qr(i):
+        ok(cliente.post("/procesar_qr", json={"qr_data": qrs[i % len(qrs)]}))
+
+    def procesar_lote(i):
+        lote = [{"qr_data": qr, "fecha": "2025-01-01"} for qr in qrs[(i * 500) % 4500:][:500]]
+        ok(cliente.post("/procesar_qr/lote", json={"escaneos": lote}))
+        return len(lote)
+
+    def registrar(i):
+        ok(cliente.post("/registrar", data={
+            "cedula": str(9 * 10**9 + i), "nombre": "BENCH", "empresa": "EMPRESA 00", "transporte": "CARRO",
+            "placa": "BEN001", "tarjeta": "1", "categoria": "B1", "vencimiento": "2030/01/01",
+            "soat": "2099-01-01", "tecnomecanica": "2099-01-01", "observaciones": ""}))
+
+    def editar(i):
+        fila = registro.iloc[(i * 7919) % filas]
+        ok(cliente.post("/editar_usuario", data={
+            "id": fila["ID"], "cedula": fila["CEDULA"], "nombres": fila["NOMBRES Y APELLIDOS"],
+            "empresa": fila["EMPRESA"], "transporte": fila["TIPO DE TRANSPORTE"], "placa": fila["PLACA"],
+            "tarjeta": fila["TARJETA DE PROPIEDAD"], "categoria": fila["CATEGORIA(S)"],
+            "vencimiento": fila["FECHA DE VENCIMIENTO"], "soat": "2099/01/01", "tecnomecanica": "2099/01/01",
+            "observaciones": "EDITADO"}), 302)
+
+    def exportar(i):
+        respuesta = ok(cliente.get("/exportar?formato=csv"))
+        respuesta.get_data()  # El cuerpo se genera al consumirlo
+        return int(respuesta.headers["X-Total-Filas"])
+
+    def cargue(i):
+        contenido = archivos_cargue[i]
+        respuesta = ok(cliente.post("/cargue_masivo", data={"documento": (io.BytesIO(contenido), "cargue.xlsx")},
+                                    content_type="multipart/form-data", headers={"Accept": "application/json"}), 202)
+        job_id = respuesta.get_json()["job_id"]
+        while True:
+            estado = routes.jobs.status(job_id)
+            if estado["estado"] in ("completado", "error"):
+                break
+            time.sleep(0.01)
+        if estado["estado"] == "error":
+            raise RuntimeError(f"cargue_masivo: {estado['errores']}")
+        return estado["total_filas"]
+
+    # Los archivos de cargue se generan antes de medir (son la parte lenta de preparar)
+    filas_cargue = min(filas, int(os.environ["MAX_UPLOAD_ROWS"]))
+    archivos_cargue = [cargue_sintetico(filas_cargue, registro, semilla=10 + i) for i in range(2)]
+
+    # eliminar_usuario y eliminar_varios consumen IDs del final del registro, sin repetir
+    por_eliminar = iter(reversed(ids))
+    por_lote = max(1, min(100, filas // 50))
+
+    def eliminar_usuario(i):
+        ok(cliente.post(f"/eliminar_usuario/{next(por_eliminar)}"), 302)
+
+    def eliminar_varios(i):
+        seleccion = [next(por_eliminar) for _ in range(por_lote)]
+        ok(cliente.post("/eliminar_varios", data={"selected_ids": seleccion}), 302)
+        return len(seleccion)
+
+    pocas = 3 if filas >= 100_000 else 10
+    return [
+        Escenario("load_database (frío)", load_frio, pocas, calentar=False),
+        Escenario("load_database (caché)", lambda i: len(routes.load_database()), 50),
+        Escenario("save_database", save, pocas),
+        Escenario("POST /procesar_qr", procesar_qr, 500),
+        Escenario("POST /procesar_qr/lote", procesar_lote, 20),
+        Escenario("GET /usuarios", lambda i: pedir("/usuarios"), 20),
+        Escenario("GET /api/usuarios", lambda i: pedir(f"/api/usuarios?offset={i * 50}"), 100),
+        Escenario("GET /api/usuarios?q", lambda i: pedir(f"/api/usuarios?q={i % 90 + 10}&empresa=EMPRESA%2001"), 100),
+        Escenario("GET /api/vencimientos", lambda i: pedir("/api/vencimientos?dias=30"), 20),
+        Escenario("GET /api/validacion", lambda i: pedir("/api/validacion"), 20),
+        Escenario("GET /qr/<id>", lambda i: pedir(f"/qr/{al_azar[i]}"), 100),
+        Escenario("GET /exportar (csv)", exportar, pocas),
+        Escenario("POST /registrar", registrar, 50),
+        Escenario("POST /editar_usuario", editar, 50),
+        Escenario("POST /cargue_masivo", cargue, 1, calentar=False),
+        Escenario("POST /eliminar_usuario", eliminar_usuario, 20),
+        Escenario("POST /eliminar_varios", eliminar_varios, pocas),
+    ]
+
+
+def correr_tamano(filas, backend):
+    """Corre todos los escenarios para un tamaño; se ejecuta en el proceso hijo."""
+    sys.path.insert(0, RAIZ)
+    os.environ["REGISTRO_BACKEND"] = backend
+    # El cargue masivo se mide con un archivo del mismo tamaño que el registro
+    os.environ["MAX_UPLOAD_ROWS"] = str(max(filas, 200_000))
+    os.environ["MAX_UPLOAD_BYTES"] = str(512 * 2**20)
+
+    inicio = time.perf_counter()
+    _, registro = preparar_directorio(filas, backend)
+    from app import create_app
+    from app import routes
+    app = create_app()
+    preparacion = time.perf_counter() - inicio
+
+    resultados = []
+    for escenario in escenarios(app, routes, registro):
+        resultado = medir(escenario)
+        resultado["filas"] = filas
+        resultados.append(resultado)
+        print(f"  {escenario.nombre:<28} p50 {resultado['p50_ms']:10.2f} ms  p99 {resultado['p99_ms']:10.2f} ms"
+              f"  pico {resultado['pico_mb']:8.2f} MB", file=sys.stderr)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB en Linux
+    return {"filas": filas, "preparacion_s": round(preparacion, 2), "rss_max_mb": round(rss, 1),
+            "resultados": resultados}
+
+
+def comparar(actual, anterior):
+    """Imprime la razón p50 actual / anterior por tamaño y ruta (< 1 es mejora)."""
+    previos = {(r["filas"], r["ruta"]): r for t in anterior["tamanos"] for r in t["resultados"]}
+    print(f"\n{'filas':>8} {'ruta':<28} {'p50 antes':>12} {'p50 ahora':>12} {'razón':>8}", file=sys.stderr)
+    for tamano in actual["tamanos"]:
+        for r in tamano["resultados"]:
+            previo = previos.get((r["filas"], r["ruta"]))
+            if previo is None or not previo["p50_ms"]:
+                continue
+            razon = r["p50_ms"] / previo["p50_ms"]
+            print(f"{r['filas']:>8} {r['ruta']:<28} {previo['p50_ms']:>10.2f}ms {r['p50_ms']:>10.2f}ms {razon:>8.2f}",
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", default=",".join(map(str, TAMANOS)),
+                        help="tamaños del registro separados por coma")
+    parser.add_argument("--backend", default="sqlite", choices=("sqlite", "excel"))
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--hijo", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo is not None:
+        json.dump(correr_tamano(args.hijo, args.backend), sys.stdout)
+        return
+
+    tamanos = []
+    for filas in (int(f) for f in args.filas.split(",") if f.strip()):
+        print(f"Registro de {filas} filas ({args.backend})", file=sys.stderr)
+        # Un proceso por tamaño: estado del módulo de rutas, cachés y memoria limpios
+        proceso = subprocess.run([sys.executable, "-m", "utils.bench_rutas", "--hijo", str(filas),
+                                  "--backend", args.backend],
+                                 cwd=RAIZ, stdout=subprocess.PIPE, check=True)
+        tamanos.append(json.loads(proceso.stdout))
+
+    documento = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "tamanos": tamanos,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(documento, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(documento, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(documento, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,89 @@
-import pandas as pd
+"""Alta de usuarios del inicio de sesión en ul.xlsx, con la contraseña cifrada con bcrypt.
+
+Sin argumentos pide un usuario por consola, como siempre. Con --archivo da de
+alta en bloque, sin preguntar nada, los usuarios de un CSV o Excel con las
+columnas username, password y role: las contraseñas se cifran en paralelo y
+el archivo se escribe una sola vez. Un username que ya exista se reemplaza.
+
+Uso:
+    python utils/generador.py [--archivo usuarios.csv] [--salida ul.xlsx] [--hilos 8] [--rondas 12]
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
+import pandas as pd
 
-def encrypt_pass(password):
-    salt = bcrypt.gensalt()
+COLUMNAS_USUARIOS = ["username", "password", "role"]
+RONDAS_POR_DEFECTO = 12
+
+
+def encrypt_pass(password, rondas=RONDAS_POR_DEFECTO):
+    salt = bcrypt.gensalt(rondas)
     hashed = bcrypt.hashpw(password.encode(), salt)
     return hashed.decode()
 
-def add_users(excel_path, users):
+
+def add_users(excel_path, users, hilos=None, rondas=RONDAS_POR_DEFECTO):
+    """Agrega (o reemplaza) usuarios (username, password, role) y escribe el Excel una sola vez.
+
+    bcrypt suelta el GIL mientras calcula, así que los hashes se reparten en
+    hilos. El Excel se reemplaza de forma atómica: la aplicación, que lo
+    recarga al cambiar, nunca lo ve a medio escribir.
+    """
     # Cargar el archivo excel si existe, o crear uno nuevo
     try:
-        df = pd.read_excel(excel_path)
+        df = pd.read_excel(excel_path, dtype=str)
     except FileNotFoundError:
-        df = pd.DataFrame(columns=['username','password','role'])
-
-    # Agregar usuarios con contraseñas cifradas
-    for username, password, role in users:
-        if password:  # Verificar que la contraseña no sea None o vacía
-            encrypted_pass = encrypt_pass(password)
-            df = pd.concat([df, pd.DataFrame([[username, encrypted_pass, role]], columns=["username", "password", "role"])], ignore_index=True)
-    
-    #Guardar los cambios en el excel
-    df.to_excel(excel_path, index=False)
-    print('Usuarios agregados correctamente...')
-
-user = input('Ingresa el username: ')
-pw = input('Ingrese el password: ')
-role = input('Ingrese el role: ')
-usuarios = [(user,pw,role)]
-ruta_excel = 'ul.xlsx'
-
-add_users(ruta_excel,usuarios)
\ No newline at end of file
+        df = pd.DataFrame(columns=COLUMNAS_USUARIOS)
+
+    # Se omiten las filas sin contraseña
+    users = [(str(u).strip(), str(p), r) for u, p, r in users if p and not pd.isna(p)]
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        hashes = list(pool.map(lambda p: encrypt_pass(p, rondas), [p for _, p, _ in users]))
+    nuevos = pd.DataFrame([(u, h, r) for (u, _, r), h in zip(users, hashes)], columns=COLUMNAS_USUARIOS)
+
+    # Si un username viene repetido (en el archivo o en el lote), gana la última fila
+    df = pd.concat([df[COLUMNAS_USUARIOS], nuevos], ignore_index=True).drop_duplicates("username", keep="last")
+
+    base, ext = os.path.splitext(excel_path)
+    tmp_path = f"{base}.tmp{ext}"
+    df.to_excel(tmp_path, index=False)
+    os.replace(tmp_path, excel_path)
+    print(f'{len(nuevos)} usuario(s) agregados correctamente...')
+    return len(nuevos)
+
+
+def leer_lote(path):
+    """Filas (username, password, role) de un CSV o Excel."""
+    if path.lower().endswith((".xls", ".xlsx")):
+        df = pd.read_excel(path, dtype=str)
+    else:
+        df = pd.read_csv(path, dtype=str)
+    faltantes = [c for c in COLUMNAS_USUARIOS if c not in df.columns]
+    if faltantes:
+        raise SystemExit(f"Faltan columnas en {path}: {', '.join(faltantes)}")
+    return list(df[COLUMNAS_USUARIOS].itertuples(index=False, name=None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo", help="CSV o Excel con las columnas username, password y role")
+    parser.add_argument("--salida", default="ul.xlsx", help="archivo de usuarios (por defecto ul.xlsx)")
+    parser.add_argument("--hilos", type=int, help="hilos para cifrar (por defecto, según los núcleos)")
+    parser.add_argument("--rondas", type=int, default=RONDAS_POR_DEFECTO, help="costo de bcrypt")
+    args = parser.parse_args()
+
+    if args.archivo:
+        usuarios = leer_lote(args.archivo)
+    else:
+        user = input('Ingresa el username: ')
+        pw = input('Ingrese el password: ')
+        role = input('Ingrese el role: ')
+        usuarios = [(user, pw, role)]
+    add_users(args.salida, usuarios, hilos=args.hilos, rondas=args.rondas)
+
+
+if __name__ == "__main__":
+    main()
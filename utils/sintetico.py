@@ -0,0 +1,134 @@
+"""Registros y archivos de cargue sintéticos con la forma de "BASE SOAT", para benchmarks.
+
+Todo sale de una semilla, así que dos corridas con los mismos parámetros
+generan exactamente los mismos datos.
+"""
+import io
+from datetime import date
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from app.exportacion import xlsx_en_streaming
+
+COLUMNAS = [
+    "ID", "ESTADO", "CEDULA", "NOMBRES Y APELLIDOS", "EMPRESA",
+    "TIPO DE TRANSPORTE", "PLACA", "TARJETA DE PROPIEDAD",
+    "CATEGORIA(S)", "FECHA DE VENCIMIENTO", "SOAT",
+    "TECNOMECANICA", "OBSERVACIONES"
+]
+PRIMER_ID = 8000000
+
+NOMBRES = np.array(["ANA", "CARLOS", "DIANA", "JORGE", "LUISA", "MARIO", "PAULA", "SERGIO", "VALENTINA", "ANDRES"])
+APELLIDOS = np.array(["GOMEZ", "RODRIGUEZ", "MARTINEZ", "LOPEZ", "GARCIA", "PEREZ", "DIAZ", "MORENO", "ROJAS", "TORRES"])
+EMPRESAS = np.array([f"EMPRESA {i:02d}" for i in range(20)])
+TRANSPORTES = np.array(["CARRO", "MOTO", "CAMIONETA", "BUS"])
+CATEGORIAS = np.array(["A2", "B1", "B2", "C1", "C2"])
+LETRAS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+
+def _placas(rng, n):
+    letras = LETRAS[rng.integers(0, 26, (n, 3))]
+    numeros = rng.integers(0, 1000, n)
+    return pd.Series(letras[:, 0]) + letras[:, 1] + letras[:, 2] + pd.Series(numeros).map("{:03d}".format)
+
+
+def _fechas(rng, n, hoy, desde=-365, hasta=730):
+    """Fechas alrededor de hoy; la mayoría vigentes, como en un registro real."""
+    return pd.to_datetime(hoy) + pd.to_timedelta(rng.integers(desde, hasta, n), unit="D")
+
+
+def _personas(rng, n, primera_cedula):
+    """Cédulas únicas (crecientes con saltos al azar), nombres, empresas y vehículos."""
+    cedulas = primera_cedula + np.arange(n, dtype=np.int64) * 1000 + rng.integers(0, 1000, n)
+    nombres = (pd.Series(NOMBRES[rng.integers(0, len(NOMBRES), n)]) + " "
+               + APELLIDOS[rng.integers(0, len(APELLIDOS), n)] + " "
+               + APELLIDOS[rng.integers(0, len(APELLIDOS), n)])
+    return pd.DataFrame({
+        "CEDULA": cedulas,
+        "NOMBRES Y APELLIDOS": nombres,
+        "EMPRESA": EMPRESAS[rng.integers(0, len(EMPRESAS), n)],
+        "TIPO DE TRANSPORTE": TRANSPORTES[rng.integers(0, len(TRANSPORTES), n)],
+        "PLACA": _placas(rng, n),
+        "TARJETA DE PROPIEDAD": rng.integers(10**6, 10**9, n),
+        "CATEGORIA(S)": CATEGORIAS[rng.integers(0, len(CATEGORIAS), n)],
+    })
+
+
+def registro_sintetico(filas, semilla=0, hoy=None):
+    """Registro de `filas` filas ya normalizado (todo texto), como lo guarda la aplicación.
+
+    Un 10 % de las cédulas tiene un segundo vehículo de otro tipo y un 3 %
+    de las filas no tiene placa.
+    """
+    rng = np.random.default_rng(semilla)
+    hoy = hoy or date.today()
+    df = _personas(rng, filas, 10**7)
+    segundo = rng.random(filas) < 0.1
+    segundo[0] = False
+    # El vehículo extra reutiliza la cédula de la fila anterior con otro tipo de transporte
+    anterior = np.flatnonzero(segundo) - 1
+    df.loc[segundo, "CEDULA"] = df["CEDULA"].to_numpy()[anterior]
+    siguiente = dict(zip(TRANSPORTES, np.roll(TRANSPORTES, -1)))
+    df.loc[segundo, "TIPO DE TRANSPORTE"] = df["TIPO DE TRANSPORTE"].iloc[anterior].map(siguiente).to_numpy()
+    df = df.drop_duplicates(["CEDULA", "TIPO DE TRANSPORTE"]).reset_index(drop=True)
+    n = len(df)
+
+    df.loc[rng.random(n) < 0.03, "PLACA"] = ""
+    soat, tecnomecanica = _fechas(rng, n, hoy), _fechas(rng, n, hoy)
+    vigente = (soat.date >= hoy) & (tecnomecanica.date >= hoy)
+    df["ID"] = PRIMER_ID + np.arange(n)
+    df["ESTADO"] = np.where(vigente, "Activo", "Inactivo")
+    df["FECHA DE VENCIMIENTO"] = _fechas(rng, n, hoy, 0, 3650).strftime("%Y/%m/%d")
+    df["SOAT"] = soat.strftime("%Y/%m/%d")
+    df["TECNOMECANICA"] = tecnomecanica.strftime("%Y/%m/%d")
+    df["OBSERVACIONES"] = np.where(rng.random(n) < 0.05, "REVISAR DOCUMENTOS", "")
+    return df[COLUMNAS].astype(str)
+
+
+def cargue_sintetico(filas, registro=None, semilla=1, duplicados=0.05, invalidos=0.01, hoy=None):
+    """Archivo de cargue masivo (.xlsx en bytes) con tipos como los que llegan de Excel.
+
+    Las cédulas son números, el SOAT viene como fecha de Excel y la
+    tecnomecánica como texto en dos formatos. Una fracción `duplicados` de
+    las filas repite una clave de `registro` y una fracción `invalidos` no
+    tiene cédula.
+    """
+    rng = np.random.default_rng(semilla)
+    hoy = hoy or date.today()
+    df = _personas(rng, filas, 5 * 10**9)
+    cedulas = df["CEDULA"].astype(object)
+    if registro is not None and len(registro):
+        repetidas = np.flatnonzero(rng.random(filas) < duplicados)
+        origen = rng.integers(0, len(registro), len(repetidas))
+        cedulas.iloc[repetidas] = registro["CEDULA"].to_numpy()[origen].astype(np.int64)
+        df.loc[repetidas, "TIPO DE TRANSPORTE"] = registro["TIPO DE TRANSPORTE"].to_numpy()[origen]
+    cedulas[rng.random(filas) < invalidos] = None
+    df["CEDULA"] = cedulas
+
+    soat = _fechas(rng, filas, hoy).to_pydatetime()
+    tecnomecanica = _fechas(rng, filas, hoy)
+    df["SOAT"] = soat
+    df["TECNOMECANICA"] = np.where(rng.random(filas) < 0.8, tecnomecanica.strftime("%d/%m/%Y"),
+                                   tecnomecanica.strftime("%Y-%m-%d"))
+    df["FECHA DE VENCIMIENTO"] = _fechas(rng, filas, hoy, 0, 3650).strftime("%Y/%m/%d")
+    df["OBSERVACIONES"] = ""
+    columnas = [c for c in COLUMNAS if c not in ("ID", "ESTADO")]
+
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet("Sheet1")
+    hoja.append(columnas)
+    for fila in df[columnas].itertuples(index=False):
+        hoja.append([None if v is None else int(v) if isinstance(v, np.integer) else v for v in fila])
+    salida = io.BytesIO()
+    libro.save(salida)
+    return salida.getvalue()
+
+
+def escribir_registro_xlsx(df, path, hoja="Sheet1"):
+    """Escribe el registro como libro de Excel (texto en línea), mucho más rápido que DataFrame.to_excel."""
+    with open(path, "wb") as f:
+        filas = (list(lote.itertuples(index=False)) for _, lote in df.groupby(np.arange(len(df)) // 5000))
+        for parte in xlsx_en_streaming(list(df.columns), filas, hoja=hoja):
+            f.write(parte)